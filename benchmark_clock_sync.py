@@ -0,0 +1,116 @@
+'''
+rev 01 - Benchmark the clock_sync estimator against comparing "%H:%M:%S" strings, on a simulated rover clock
+'''
+
+import argparse
+import datetime
+import random
+import threading
+import time
+
+import Pyro5.api
+
+from clock_sync import ClockEstimator, SwarmClock, exchange
+
+@Pyro5.api.expose
+class FakeRover:
+    """A rover clock offset_ms ahead and drifting drift_ppm, behind a link with random queueing delays."""
+    def __init__(self, offset_ms, drift_ppm, delay_ms, spike_ms, spike_rate):
+        self.start = time.time_ns()
+        self.offset_ns = offset_ms * 1e6
+        self.drift = drift_ppm / 1e6
+        self.delay_ms = delay_ms
+        self.spike_ms = spike_ms
+        self.spike_rate = spike_rate
+
+    def true_offset_ns(self, local_ns):
+        return self.offset_ns + self.drift * (local_ns - self.start)
+
+    def rover_ns(self):
+        local = time.time_ns()
+        return int(local + self.true_offset_ns(local))
+
+    def _link(self):
+        # One direction of the Wi-Fi link: some jitter, now and then a long queue
+        delay = random.expovariate(1 / self.delay_ms) if self.delay_ms else 0
+        if random.random() < self.spike_rate:
+            delay += random.uniform(0, self.spike_ms)
+        time.sleep(delay / 1000)
+
+    def get_clock(self):
+        self._link()
+        receive_ns = self.rover_ns()
+        transmit_ns = self.rover_ns()
+        self._link()
+        return receive_ns, transmit_ns
+
+    def get_server_time(self):
+        self._link()
+        now = datetime.datetime.fromtimestamp(self.rover_ns() / 1e9).strftime("%H:%M:%S %p")
+        self._link()
+        return now
+
+def string_offset_ns(proxy):
+    # What MainApp.fetch_time compared: the time of day to the second
+    server = datetime.datetime.strptime(proxy.get_server_time(), "%H:%M:%S %p")
+    local = datetime.datetime.strptime(datetime.datetime.now().strftime("%H:%M:%S %p"), "%H:%M:%S %p")
+    return (server - local).total_seconds() * 1e9
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offset error of the clock sync estimator on a simulated rover.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run, one burst per second")
+    parser.add_argument("--offset-ms", type=float, default=137.0, help="Offset of the rover clock")
+    parser.add_argument("--drift-ppm", type=float, default=40.0, help="Drift of the rover clock")
+    parser.add_argument("--delay-ms", type=float, default=2.0, help="Mean one-way jitter")
+    parser.add_argument("--spike-ms", type=float, default=60.0, help="Largest queueing delay")
+    parser.add_argument("--spike-rate", type=float, default=0.2, help="Share of packets with a queueing delay")
+    args = parser.parse_args()
+
+    rover = FakeRover(args.offset_ms, args.drift_ppm, args.delay_ms, args.spike_ms, args.spike_rate)
+    daemon = Pyro5.api.Daemon(host="127.0.0.1")
+    uri = daemon.register(rover, "server")
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+
+    errors = {"time string": [], "single exchange": [], "estimator": []}
+    inside = 0
+    swarm_clock = SwarmClock()
+    swarm_errors = []
+    estimator = ClockEstimator()
+    with Pyro5.api.Proxy(uri) as proxy:
+        end = time.monotonic() + args.duration
+        print(f"{'s':>4} {'true ms':>10} {'estimate ms':>12} {'+-ms':>7} {'drift ppm':>10} {'rtt ms':>7}")
+        while time.monotonic() < end:
+            errors["time string"].append(abs(string_offset_ns(proxy) - rover.true_offset_ns(time.time_ns())))
+            sample = exchange(proxy.get_clock)
+            errors["single exchange"].append(abs(sample.offset_ns - rover.true_offset_ns(sample.t_ns)))
+
+            estimator.measure(proxy.get_clock)
+            now = time.time_ns()
+            offset_ns, uncertainty_ns = estimator.estimate(now)
+            error = abs(offset_ns - rover.true_offset_ns(now))
+            errors["estimator"].append(error)
+            inside += error <= uncertainty_ns
+            state = estimator.state()
+            print(f"{len(errors['estimator']):4d} {rover.true_offset_ns(now) / 1e6:10.3f} {offset_ns / 1e6:12.3f} "
+                  f"{uncertainty_ns / 1e6:7.3f} {state['drift_ppm']:10.1f} {state['rtt_ms']:7.3f}")
+
+            # The rover's view: swarm time from the estimate, checked against the true offset
+            swarm_clock.update(state['offset_ns'], state['drift_ppm'], uncertainty_ns, state['t_ref_ns'])
+            time.sleep(0.5)
+            local = rover.rover_ns()
+            truth = local - rover.true_offset_ns(local - rover.offset_ns)
+            swarm_errors.append(abs(local - swarm_clock.offset_at(local) - truth))
+            time.sleep(0.5)
+
+    print(f"\n{'method':<20} {'median ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for label, values in errors.items():
+        print(f"{label:<20} {percentile(values, 0.5) / 1e6:10.3f} {percentile(values, 0.95) / 1e6:10.3f} "
+              f"{max(values) / 1e6:10.3f}")
+    print(f"{'SwarmClock.now_ns':<20} {percentile(swarm_errors, 0.5) / 1e6:10.3f} "
+          f"{percentile(swarm_errors, 0.95) / 1e6:10.3f} {max(swarm_errors) / 1e6:10.3f}  (0.5 s after the update)")
+    print(f"estimator error within its uncertainty in {inside} of {len(errors['estimator'])} bursts, "
+          f"{estimator.exchanges} exchanges, true drift {args.drift_ppm} ppm")
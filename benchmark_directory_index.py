@@ -0,0 +1,70 @@
+'''
+rev 01 - Benchmark list_with_metadata() against get_file_list() plus get_file_metadata() per file
+'''
+
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import Pyro5.api
+
+from directory_index import DirectoryIndex
+from server import Server
+
+def per_file(proxy):
+    # What the ground station did: the listing, then one call per file
+    files = proxy.get_file_list()
+    return {name: proxy.get_file_metadata(name) for name in files}, len(files) + 1
+
+def run(label, func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = func()
+    print(f"{label:<40} {(time.perf_counter() - start) / repeats * 1000:8.2f} ms per refresh")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-file metadata calls with the indexed listing.")
+    parser.add_argument("--files", type=int, default=200, help="Files in the rover directory")
+    parser.add_argument("--repeats", type=int, default=20, help="Refreshes per run")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)    # server.py logs at DEBUG
+
+    with tempfile.TemporaryDirectory() as rover_dir:
+        for i in range(args.files):
+            with open(os.path.join(rover_dir, f"Drone {i + 1}.csv"), 'w') as f:
+                f.write("Time,X,Y,Z\n" + "0.0,1.000,2.000,0.000\n" * 2000)
+        for use_inotify in (True, False):
+            server = Server(rover_dir)
+            if not use_inotify:
+                server.index.close()
+                server.index = DirectoryIndex(rover_dir, use_inotify=False)
+            daemon = Pyro5.api.Daemon(host="127.0.0.1")
+            uri = daemon.register(server, "server")
+            threading.Thread(target=daemon.requestLoop, daemon=True).start()
+            mode = "inotify" if server.index.inotify is not None else f"stat every {server.index.rescan_interval:.0f} s"
+            print(f"{args.files} files, index with {mode}")
+
+            with Pyro5.api.Proxy(uri) as proxy:
+                _, calls = run("get_file_list + get_file_metadata", lambda: per_file(proxy), args.repeats)
+                print(f"{'':<40} {calls} calls per refresh")
+                listing = run("list_with_metadata(0)", lambda: proxy.list_with_metadata(0), args.repeats)
+                scans = server.index.scans
+                version = listing["version"]
+                unchanged = run("list_with_metadata(version), no change", lambda: proxy.list_with_metadata(version), args.repeats)
+                print(f"{'':<40} {len(unchanged['files'])} files returned, {server.index.scans - scans} directory scans")
+
+                with open(os.path.join(rover_dir, "Drone 1.csv"), 'a') as f:
+                    f.write("0.1,1.000,2.000,0.000\n")
+                if server.index.inotify is None:
+                    server.index.invalidate("Drone 1.csv")  # Like upload_file() does
+                else:
+                    time.sleep(0.1)     # Seen by the watcher thread
+                changed = proxy.list_with_metadata(version)
+                print(f"{'after one file changed':<40} {[entry['name'] for entry in changed['files']]} returned")
+            server.index.close()
+            daemon.shutdown()
+            print()
@@ -0,0 +1,96 @@
+'''
+rev 01 - Benchmark chunked file transfer against the single pickle/base64 call for 1, 50 and 500 MB
+'''
+
+import argparse
+import base64
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import Pyro5.api
+
+from file_transfer import FileTransferClient, TransferError
+from server import Server
+
+def make_file(path, size_mb):
+    with open(path, 'wb') as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+def legacy_upload(uri, path):
+    # MainApp.transfer_data: whole file, pickled, in one call
+    with open(path, 'rb') as f:
+        data = f.read()
+    with Pyro5.api.Proxy(uri) as proxy:
+        proxy._pyroTimeout = 600
+        proxy.upload_file(os.path.basename(path), pickle.dumps(data))
+
+def legacy_download(uri, name, path):
+    # MainApp.download_selected_file
+    with Pyro5.api.Proxy(uri) as proxy:
+        proxy._pyroTimeout = 600
+        response = proxy.download_file(name)
+    with open(path, 'wb') as f:
+        f.write(pickle.loads(base64.b64decode(response['data'])))
+
+def measure(label, size_mb, func):
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    print(f"{size_mb:5d} MB  {label:<20} {seconds:7.2f} s  {size_mb * 1.048576 / seconds:7.1f} MB/s  "
+          f"peak Python memory {peak / 1e6:8.1f} MB")
+
+def interrupted_upload(client, path, stop_at):
+    def progress(done, size):
+        if done >= stop_at:
+            raise TransferError("simulated disconnect")
+    try:
+        client.upload(path, progress=progress)
+    except TransferError:
+        pass
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chunked and single-call file transfer over Pyro5 on localhost.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 50, 500], help="File sizes [MB]")
+    parser.add_argument("--chunk", type=int, default=1024, help="Chunk size [KiB]")
+    parser.add_argument("--skip-legacy-above", type=int, default=1000, help="Skip the single-call path above this size [MB]")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)    # server.py logs at DEBUG
+
+    with tempfile.TemporaryDirectory() as local_dir, tempfile.TemporaryDirectory() as rover_dir:
+        daemon = Pyro5.api.Daemon(host="127.0.0.1")
+        uri = str(daemon.register(Server(rover_dir), "server"))
+        threading.Thread(target=daemon.requestLoop, daemon=True).start()
+        client = FileTransferClient(uri, chunk_size=args.chunk * 1024)
+        tracemalloc.start()
+
+        for size_mb in args.sizes:
+            path = os.path.join(local_dir, f"test_{size_mb}MB.bin")
+            make_file(path, size_mb)
+            back = os.path.join(local_dir, "downloaded.bin")
+            if size_mb <= args.skip_legacy_above:
+                measure("pickle upload", size_mb, lambda: legacy_upload(uri, path))
+                measure("pickle download", size_mb, lambda: legacy_download(uri, os.path.basename(path), back))
+                os.remove(os.path.join(rover_dir, os.path.basename(path)))
+            measure("chunked upload", size_mb, lambda: client.upload(path))
+            measure("chunked download", size_mb, lambda: client.download(os.path.basename(path), back))
+
+            # Disconnect halfway, the next upload only sends the rest
+            os.remove(os.path.join(rover_dir, os.path.basename(path)))
+            interrupted_upload(client, path, os.path.getsize(path) // 2)
+            result = client.upload(path)
+            print(f"{size_mb:5d} MB  resumed upload       continued at {result.resumed_from / 1e6:.1f} MB, "
+                  f"{result.mb_per_s:.1f} MB/s for the rest")
+            os.remove(path)
+            os.remove(back)
+
+        client.close()
+        daemon.shutdown()
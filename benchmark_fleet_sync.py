@@ -0,0 +1,96 @@
+'''
+rev 01 - Benchmark fleet sync (changed files / changed blocks, all rovers at once) against pushing every file
+'''
+
+import argparse
+import logging
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+
+import Pyro5.api
+
+from fleet_sync import FleetSync
+from server import Server
+
+def write_show(path, rows, seed):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write("Time,X,Y,Z\n")
+        for i in range(rows):
+            f.write(f"{i * 0.1:.1f},{rng.uniform(0, 15):.3f},{rng.uniform(0, 7.5):.3f},{rng.uniform(0, 3):.3f}\n")
+
+def edit_show(path, line, seed):
+    # Moves one waypoint, like a small change to the choreography
+    with open(path) as f:
+        lines = f.readlines()
+    rng = random.Random(seed)
+    lines[line] = f"{(line - 1) * 0.1:.1f},{rng.uniform(0, 15):.3f},{rng.uniform(0, 7.5):.3f},0.000\n"
+    with open(path, 'w') as f:
+        f.writelines(lines)
+
+def push_all(uris, local_dir, names):
+    # One rover after another, every file, like clicking Transfer CSV for every rover
+    start = time.perf_counter()
+    sent = 0
+    for uri in uris:
+        with Pyro5.api.Proxy(uri) as proxy:
+            for name in names:
+                with open(os.path.join(local_dir, name), 'rb') as f:
+                    data = f.read()
+                proxy.upload_file(name, pickle.dumps(data))
+                sent += len(data)
+    return time.perf_counter() - start, sent
+
+def report(label, seconds, sent, total):
+    print(f"{label:<34} {seconds:7.2f} s  {sent / 1e6:8.3f} MB sent  {(total - sent) / 1e6:8.3f} MB saved")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare fleet sync with pushing every show file to every rover.")
+    parser.add_argument("--rovers", type=int, default=8, help="Simulated rovers")
+    parser.add_argument("--files", type=int, default=10, help="Show files")
+    parser.add_argument("--rows", type=int, default=2000, help="Waypoints per show file")
+    parser.add_argument("--large-rows", type=int, default=200000, help="Waypoints of one large show file")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)    # server.py logs at DEBUG
+
+    with tempfile.TemporaryDirectory() as root:
+        local_dir = os.path.join(root, "ground")
+        os.mkdir(local_dir)
+        names = [f"Drone {i + 1}.csv" for i in range(args.files)]
+        for i, name in enumerate(names):
+            write_show(os.path.join(local_dir, name), args.rows, i)
+        names.append("Drone show.csv")
+        write_show(os.path.join(local_dir, names[-1]), args.large_rows, 99)
+        total = sum(os.path.getsize(os.path.join(local_dir, name)) for name in names) * args.rovers
+
+        daemon = Pyro5.api.Daemon(host="127.0.0.1")
+        uris = []
+        for i in range(args.rovers):
+            rover_dir = os.path.join(root, f"rover{i}")
+            os.mkdir(rover_dir)
+            uris.append(str(daemon.register(Server(rover_dir), f"server{i}")))
+        threading.Thread(target=daemon.requestLoop, daemon=True).start()
+        print(f"{args.rovers} rovers, {len(names)} files, {total / args.rovers / 1e6:.2f} MB per rover\n")
+
+        seconds, sent = push_all(uris, local_dir, names)
+        report("push every file, rover by rover", seconds, sent, total)
+
+        fleet = FleetSync(uris)
+        for label in ["sync, nothing changed", "sync, one waypoint moved"]:
+            if label.endswith("moved"):
+                edit_show(os.path.join(local_dir, names[0]), 10, 1)
+                edit_show(os.path.join(local_dir, names[-1]), args.large_rows // 2, 1)
+            start = time.perf_counter()
+            reports = fleet.sync(local_dir, "Drone *.csv")
+            report(label, time.perf_counter() - start, sum(r.bytes_sent for r in reports), total)
+
+        for i in range(args.rovers):
+            os.remove(os.path.join(root, f"rover{i}", "Drone 2.csv"))
+        start = time.perf_counter()
+        reports = fleet.sync(local_dir, "Drone *.csv")
+        report("sync, one file missing", time.perf_counter() - start, sum(r.bytes_sent for r in reports), total)
+        daemon.shutdown()
@@ -0,0 +1,54 @@
+'''
+rev 01 - Benchmark the cached IdentityIndex against scanning identity.csv on every check
+'''
+
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from identity import IdentityIndex
+
+def scan_check(file_path, id_database):
+    # The old check_identity without the prints
+    with open(file_path, 'r') as file:
+        for row in csv.DictReader(file):
+            if row['ID'].strip() == id_database:
+                return 0
+    return 1
+
+def timed(label, func, checks):
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    print(f"{label:<32} {seconds / checks * 1e6:8.2f} us per ID")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare identity checks with and without the cached index.")
+    parser.add_argument("--rows", type=int, default=100, help="IDs in identity.csv")
+    parser.add_argument("--fleet", type=int, default=64, help="Rovers connecting at once")
+    parser.add_argument("--rounds", type=int, default=50, help="Times the fleet connects")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = os.path.join(folder, "identity.csv")
+        with open(file_path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["ID", "Name"])
+            for i in range(args.rows):
+                writer.writerow([str(i + 1), f"Rover {i + 1}"])
+
+        fleet = [str(i % args.rows + 1) for i in range(args.fleet)]
+        checks = args.fleet * args.rounds
+        index = IdentityIndex(file_path)
+        timed("csv scan per check", lambda: [scan_check(file_path, i) for _ in range(args.rounds) for i in fleet], checks)
+        timed("IdentityIndex.check", lambda: [index.check(i) for _ in range(args.rounds) for i in fleet], checks)
+        timed("IdentityIndex.check_many", lambda: [index.check_many(fleet) for _ in range(args.rounds)], checks)
+        print(f"stats: {index.stats()}")
+
+        # An edited file is picked up after check_interval
+        with open(file_path, 'a', newline='') as file:
+            csv.writer(file).writerow(["new", "Rover new"])
+        time.sleep(index.check_interval)
+        print(f"'new' after editing identity.csv: {index.check('new')} (0 = found), stats: {index.stats()}")
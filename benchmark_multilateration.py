@@ -0,0 +1,52 @@
+'''
+rev 01 - Accuracy and cost of the multilateration solver on synthetic ranges
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from multilateration import solve, solve_batch, Multilaterator
+from uwb_parser import UwbFrame
+from uwb_replay import DEFAULT_ANCHORS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-frame and batch multilateration.")
+    parser.add_argument("--samples", type=int, default=5000, help="Number of synthetic fixes")
+    parser.add_argument("--noise", type=float, default=0.05, help="Range noise [m]")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    anchors = np.array([a[1:] for a in DEFAULT_ANCHORS])
+    truth = np.column_stack([rng.uniform(0.5, 4.5, args.samples), rng.uniform(0.5, 7.5, args.samples),
+                             np.zeros(args.samples)])
+    ranges = np.sqrt(((truth[:, None, :] - anchors[None])**2).sum(axis=2)) + rng.normal(0, args.noise, (args.samples, len(anchors)))
+    ranges[rng.random(ranges.shape) < 0.05] = np.nan    # Missing anchors
+
+    anchor_xyz = [tuple(a) for a in anchors]
+    start = time.perf_counter()
+    cold = [solve(anchor_xyz, r) for r in ranges.tolist()]
+    cold_us = (time.perf_counter() - start) / args.samples * 1e6
+
+    # Streaming case: consecutive fixes of a moving rover, warm started
+    path = np.column_stack([2.5 + 2 * np.cos(np.arange(args.samples) / 50), 4 + 3 * np.sin(np.arange(args.samples) / 50),
+                            np.zeros(args.samples)])
+    path_ranges = np.sqrt(((path[:, None, :] - anchors[None])**2).sum(axis=2)) + rng.normal(0, args.noise, ranges.shape)
+    frames = [UwbFrame(0, None, None, None, None, [], anchor_xyz, r) for r in path_ranges.tolist()]
+    solver = Multilaterator()
+    start = time.perf_counter()
+    warm = [solver.update(frame) for frame in frames]
+    warm_us = (time.perf_counter() - start) / args.samples * 1e6
+
+    start = time.perf_counter()
+    pos, residual = solve_batch(anchors, ranges)
+    batch_us = (time.perf_counter() - start) / args.samples * 1e6
+
+    cold_err = np.array([np.hypot(c[0] - t[0], c[1] - t[1]) for c, t in zip(cold, truth) if c is not None])
+    warm_err = np.array([np.hypot(w[0] - t[0], w[1] - t[1]) for w, t in zip(warm, path) if w is not None])
+    batch_err = np.hypot(*(pos[:, :2] - truth[:, :2]).T)
+    print(f"solve() cold start:        {cold_us:7.1f} us/fix ({1e6 / cold_us:8.0f} Hz), median error {np.median(cold_err) * 100:.1f} cm")
+    print(f"Multilaterator warm start: {warm_us:7.1f} us/fix ({1e6 / warm_us:8.0f} Hz), median error {np.median(warm_err) * 100:.1f} cm")
+    print(f"solve_batch():             {batch_us:7.1f} us/fix ({1e6 / batch_us:8.0f} Hz), median error {np.nanmedian(batch_err) * 100:.1f} cm")
+    print(f"Median residual: {np.nanmedian(residual) * 100:.1f} cm")
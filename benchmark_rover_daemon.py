@@ -0,0 +1,131 @@
+'''
+rev 01 - Load test: one Pyro5 daemon per service (old rover.py) against the single RoverDaemon
+'''
+
+import argparse
+import logging
+import tempfile
+import threading
+import time
+
+import Pyro5
+import Pyro5.api
+import Pyro5.errors
+
+from rover_daemon import RoverDaemon
+from server import Server
+from serverclient_rev04 import RoverServer
+
+@Pyro5.api.expose
+class Move:
+    # Stand-in for move_rev02.RoverController, which needs the motor libraries
+    def trigger_start(self):
+        return True
+
+# Service name and the method the clients call on it
+CALLS = [("server", "get_server_time"), ("uwb", "get_coordinates"), ("move", "trigger_start"),
+         ("coordinates", "get_coordinates")]
+
+def make_services(base_path):
+    return {"server": Server(base_path), "uwb": RoverServer("1"), "move": Move(), "coordinates": RoverServer("2")}
+
+def start_separate(services, base_port):
+    # The old layout: a daemon, accept thread and worker pool per service
+    Pyro5.config.SERVERTYPE = "thread"
+    Pyro5.config.THREADPOOL_SIZE = 80   # Pyro5 defaults
+    Pyro5.config.THREADPOOL_SIZE_MIN = 4
+    daemons, uris = [], {}
+    for i, (name, service) in enumerate(services.items()):
+        daemon = Pyro5.api.Daemon(host="127.0.0.1", port=base_port + i)
+        uris[name] = str(daemon.register(service, name))
+        threading.Thread(target=daemon.requestLoop, daemon=True).start()
+        daemons.append(daemon)
+    return daemons, uris
+
+def start_single(services, port, servertype, pool_size):
+    rover_daemon = RoverDaemon("127.0.0.1", port, servertype, pool_size)
+    uris = {name: str(rover_daemon.register(service, name)) for name, service in services.items()}
+    rover_daemon.start()
+    return rover_daemon, uris
+
+def load(uris, clients, duration):
+    """
+    clients ground stations, each with a connection to every service, calling as fast as they can.
+    Returns:
+        tuple: (calls per second, refused connections, sorted latencies [s])
+    """
+    stop = threading.Event()
+    counts, refused, latencies = [], [], []
+    lock = threading.Lock()
+
+    def client(name, method):
+        done, local = 0, []
+        try:
+            with Pyro5.api.Proxy(uris[name]) as proxy:
+                proxy._pyroBind()
+                ready.wait()
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    getattr(proxy, method)()
+                    local.append(time.perf_counter() - start)
+                    done += 1
+        except Pyro5.errors.CommunicationError:
+            ready.wait()
+            with lock:
+                refused.append(name)
+        with lock:
+            counts.append(done)
+            latencies.extend(local)
+
+    ready = threading.Event()
+    threads = [threading.Thread(target=client, args=call) for _ in range(clients) for call in CALLS]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)     # All connected
+    ready.set()
+    start = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return sum(counts) / elapsed, len(refused), sorted(latencies)
+
+def report(label, threads, result):
+    rate, refused, latencies = result
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+    print(f"{label:<34} {rate:8.0f} RPC/s  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  "
+          f"{refused:3d} refused  {threads:3d} threads")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sustained RPC/s of the old per-service daemons and the single daemon.")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 10], help="Ground stations, one connection per service each")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per run")
+    parser.add_argument("--port", type=int, default=47090, help="First port used")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[16, 48], help="Pool sizes of the single daemon")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)    # server.py logs at DEBUG
+
+    with tempfile.TemporaryDirectory() as base_path:
+        for clients in args.clients:
+            print(f"\n{clients} ground station(s), {clients * len(CALLS)} connections")
+            baseline = threading.active_count()
+            daemons, uris = start_separate(make_services(base_path), args.port)
+            result = load(uris, clients, args.duration)
+            report("4 daemons (thread, pool 80 each)", threading.active_count() - baseline, result)
+            for daemon in daemons:
+                daemon.shutdown()
+            time.sleep(0.5)
+
+            configurations = [("thread", size) for size in args.pool_sizes] + [("multiplex", 1)]
+            for servertype, pool_size in configurations:
+                baseline = threading.active_count()
+                rover_daemon, uris = start_single(make_services(base_path), args.port + 10, servertype, pool_size)
+                result = load(uris, clients, args.duration)
+                label = f"1 daemon ({servertype}, pool {pool_size})" if servertype == "thread" else "1 daemon (multiplex)"
+                report(label, threading.active_count() - baseline, result)
+                rover_daemon.shutdown()
+                time.sleep(0.5)
+        print("\nPer-method statistics of the last single daemon run:")
+        rover_daemon.print_stats()
@@ -0,0 +1,129 @@
+'''
+rev 01 - Benchmark the start skew of the swarm: 50 ms polling, go calls one by one, scheduled start with go datagram
+'''
+
+import argparse
+import datetime
+import multiprocessing
+import random
+import threading
+import time
+
+import Pyro5.api
+
+from clock_sync import swarm_clock
+from scheduled_start import ScheduledStart, GoListener, send_go
+
+@Pyro5.api.expose
+class Move:
+    # Stand-in for move_rev02.RoverController.trigger_start
+    def __init__(self, started):
+        self.started = started
+
+    def trigger_start(self):
+        self.started(time.time_ns())
+
+def rover_main(index, conn, go_port, sync_error_ns):
+    """One simulated rover per process, its results go back over conn."""
+    started = lambda t_ns: conn.send(('started', index, t_ns))
+    # All rovers run on this host's clock; the offset they were told is off by sync_error_ns,
+    # like the residual error of clock_sync
+    swarm_clock.update(sync_error_ns, 0.0, abs(sync_error_ns), time.time_ns() - sync_error_ns)
+    scheduled_start = ScheduledStart()
+    listener = GoListener(scheduled_start.on_go, port=go_port, interface='127.0.0.1')
+    listener.start()
+    daemon = Pyro5.api.Daemon(host="127.0.0.1")
+    uri = daemon.register(Move(started), "move")
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+    conn.send(('uri', index, str(uri)))
+    while True:
+        command = conn.recv()
+        if command[0] == 'poll':
+            # turbopi.should_move_now: the time of day to the second, checked every 50 ms
+            t_execute = command[1]
+            time.sleep(random.uniform(0, 0.05))     # The rovers' scripts were not started in step
+            while datetime.datetime.now().time() < t_execute:
+                time.sleep(0.05)
+            started(time.time_ns())
+        elif command[0] == 'schedule':
+            _, start_id, start_ns, require_go = command
+            scheduled_start.schedule(start_id, start_ns, lambda: started(time.time_ns()), require_go)
+        elif command[0] == 'stop':
+            listener.stop()
+            daemon.shutdown()
+            return
+
+def collect(conns, count, timeout=10.0):
+    results = {}
+    end = time.monotonic() + timeout
+    while len(results) < count and time.monotonic() < end:
+        for conn in conns:
+            if conn.poll(0.01):
+                kind, index, value = conn.recv()
+                results[index] = value
+    return results
+
+def report(label, starts, reference_ns, rovers):
+    skews = sorted((t_ns - reference_ns) / 1e6 for t_ns in starts.values())
+    if not skews:
+        print(f"{label:<34} no rover started")
+        return
+    print(f"{label:<34} {len(skews):3d}/{rovers} started  skew {skews[0]:+9.3f} .. {skews[-1]:+9.3f} ms  "
+          f"spread {skews[-1] - skews[0]:8.3f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start skew of the swarm with the old and the scheduled start.")
+    parser.add_argument("--rovers", type=int, default=10, help="Simulated rovers, one process each")
+    parser.add_argument("--sync-error-ms", type=float, default=0.3, help="Std. dev. of the clock_sync error per rover")
+    parser.add_argument("--lead", type=float, default=1.0, help="Seconds between scheduling and the start")
+    parser.add_argument("--go-port", type=int, default=50151, help="UDP port of the go datagram")
+    args = parser.parse_args()
+
+    conns, processes, uris = [], [], {}
+    for i in range(args.rovers):
+        parent, child = multiprocessing.Pipe()
+        error_ns = int(random.gauss(0, args.sync_error_ms * 1e6))
+        process = multiprocessing.Process(target=rover_main, args=(i, child, args.go_port, error_ns), daemon=True)
+        process.start()
+        conns.append(parent)
+        processes.append(process)
+    for conn in conns:
+        _, index, uri = conn.recv()
+        uris[index] = uri
+    time.sleep(0.5)
+
+    # 12flightsoftware / turbopi: a start time to the second, polled every 50 ms
+    t_execute = datetime.datetime.now().replace(microsecond=0) + datetime.timedelta(seconds=2)
+    for conn in conns:
+        conn.send(('poll', t_execute.time()))
+    report("poll every 50 ms", collect(conns, args.rovers), int(t_execute.timestamp() * 1e9), args.rovers)
+
+    # Rover.send_go_signal from a thread per rover, each opening its own connection
+    reference_ns = time.time_ns()
+    threads = []
+    for index in range(args.rovers):
+        def go(uri=uris[index]):
+            with Pyro5.api.Proxy(uri) as proxy:
+                proxy.trigger_start()
+        thread = threading.Thread(target=go)
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report("go call per rover, one by one", collect(conns, args.rovers), reference_ns, args.rovers)
+
+    for label, require_go, go in [("scheduled, timer only", False, False),
+                                  ("scheduled + go datagram", True, True),
+                                  ("scheduled, go datagram missing", True, False)]:
+        start_id = random.getrandbits(32)
+        start_ns = time.time_ns() + int(args.lead * 1e9)
+        for conn in conns:
+            conn.send(('schedule', start_id, start_ns, require_go))
+        if go:
+            send_go(start_id, start_ns, port=args.go_port, interface='127.0.0.1', loopback=True)
+        report(label, collect(conns, args.rovers, timeout=args.lead + 1.5), start_ns, args.rovers)
+
+    for conn in conns:
+        conn.send(('stop',))
+    for process in processes:
+        process.join(timeout=3)
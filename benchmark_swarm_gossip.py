@@ -0,0 +1,98 @@
+'''
+rev 01 - Benchmark swarm-wide network load: Pyro5 polling of every peer against multicast gossip
+'''
+
+import argparse
+import threading
+import time
+
+import Pyro5.api
+
+from serverclient_rev04 import get_coordinates
+from swarm_gossip import SwarmGossip, PACKET_SIZE
+
+UDP_IP_HEADERS = 28
+
+@Pyro5.api.expose
+class SimulatedRover:
+    def get_coordinates(self):
+        return {'x': 1.0, 'y': 2.0, 'z': 0.0}
+
+def loopback_counters():
+    """
+    Returns:
+        tuple: (bytes, packets) sent on the loopback interface, None where /proc/net/dev is missing.
+    """
+    try:
+        with open('/proc/net/dev') as file:
+            for line in file:
+                name, _, fields = line.partition(':')
+                if name.strip() == 'lo':
+                    values = fields.split()
+                    return int(values[8]), int(values[9])
+    except OSError:
+        pass
+    return None
+
+def measure_poll(polls):
+    """Cost of one get_coordinates() as serverclient_rev04 did it: new proxy, connect, call, close."""
+    daemon = Pyro5.api.Daemon(host="127.0.0.1")
+    uri = str(daemon.register(SimulatedRover(), "coordinates"))
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+    get_coordinates(uri)
+
+    before = loopback_counters()
+    start = time.perf_counter()
+    for _ in range(polls):
+        get_coordinates(uri)
+    seconds = (time.perf_counter() - start) / polls
+    after = loopback_counters()
+    daemon.shutdown()
+    if before is None or after is None:
+        return seconds, None, None
+    return seconds, (after[0] - before[0]) / polls, (after[1] - before[1]) / polls
+
+def run_gossip(rovers, rate, duration, port):
+    """Runs the rovers on this host over loopback multicast."""
+    nodes = [SwarmGossip(i + 1, port=port, interface='127.0.0.1', rate=rate, loopback=True) for i in range(rovers)]
+    for i, node in enumerate(nodes):
+        node.update(float(i), float(i), 0.0)
+        node.start()
+    time.sleep(duration)
+    complete = sum(len(node.get_neighbours()) == rovers - 1 for node in nodes)
+    max_age = max((age for node in nodes for _, age in node.get_neighbours()), default=0.0)
+    sent = sum(node.packets_sent for node in nodes)
+    received = sum(node.packets_received for node in nodes)
+    for node in nodes:
+        node.stop()
+    return sent / duration, received / duration, complete, max_age
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare swarm-wide load of peer polling and multicast gossip.")
+    parser.add_argument("--rovers", type=int, nargs="+", default=[4, 16, 64], help="Swarm sizes")
+    parser.add_argument("--rate", type=float, default=5.0, help="Position updates per rover per second (0.2 s poll)")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per gossip run")
+    parser.add_argument("--polls", type=int, default=200, help="Pyro polls measured")
+    parser.add_argument("--port", type=int, default=50150, help="UDP port for the simulated swarm")
+    args = parser.parse_args()
+
+    poll_s, poll_bytes, poll_packets = measure_poll(args.polls)
+    print(f"One Pyro5 poll (connect, call, close): {poll_s * 1000:.2f} ms", end="")
+    if poll_bytes is not None:
+        print(f", {poll_bytes:.0f} bytes in {poll_packets:.1f} packets on loopback")
+    else:
+        print()
+    gossip_bytes = PACKET_SIZE + UDP_IP_HEADERS
+    print(f"One gossip packet: {gossip_bytes} bytes in 1 datagram, delivered to every rover\n")
+
+    print(f"{'rovers':>6} | {'polling: conn/s':>15} {'pkt/s':>9} {'kB/s':>9} {'busy/rover':>10} | "
+          f"{'gossip: sent/s':>14} {'kB/s':>6} {'recv/s':>8} {'complete':>8} {'max age':>8}")
+    for i, rovers in enumerate(args.rovers):
+        connects = rovers * (rovers - 1) * args.rate
+        # Share of every second a rover spends polling its peers one after the other
+        busy = (rovers - 1) * args.rate * poll_s
+        poll_pkts = f"{connects * poll_packets:9.0f}" if poll_packets is not None else f"{'-':>9}"
+        poll_kb = f"{connects * poll_bytes / 1000:9.0f}" if poll_bytes is not None else f"{'-':>9}"
+        sent, received, complete, max_age = run_gossip(rovers, args.rate, args.duration, args.port + i)
+        print(f"{rovers:>6} | {connects:15.0f} {poll_pkts} {poll_kb} {busy * 100:9.0f}% | "
+              f"{sent:14.0f} {sent * gossip_bytes / 1000:6.1f} {received:8.0f} {complete:>4}/{rovers:<3} {max_age * 1000:6.0f} ms")
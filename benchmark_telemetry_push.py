@@ -0,0 +1,100 @@
+'''
+rev 01 - Benchmark pushed telemetry against polling get_coordinates() over Pyro5
+'''
+
+import argparse
+import statistics
+import threading
+import time
+
+import Pyro5.api
+
+from telemetry_push import TelemetryPublisher, TelemetryClient
+from timebase import now_ns
+
+@Pyro5.api.expose
+class SimulatedRover:
+    """Publishes a fix at a fixed rate like the rover services, counts the calls it serves."""
+    def __init__(self):
+        self.telemetry = TelemetryPublisher(max_rate=100.0)
+        self.latest = None
+        self.calls = 0
+
+    def get_coordinates(self):
+        self.calls += 1
+        return self.latest
+
+    def subscribe(self, callback_uri, topic='coordinates', max_rate=10.0):
+        self.calls += 1
+        return self.telemetry.subscribe(callback_uri, topic, max_rate)
+
+    def unsubscribe(self, callback_uri, topic='coordinates'):
+        self.telemetry.unsubscribe(callback_uri, topic)
+
+def produce(rover, rate, stop_event):
+    seq = 0
+    while not stop_event.wait(1.0 / rate):
+        seq += 1
+        # (seq, x, y, t_ns published)
+        rover.latest = (seq, 1.0, 2.0, now_ns())
+        rover.telemetry.publish('coordinates', rover.latest)
+
+def summarize(label, latencies, seen, rpcs, duration):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] / 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] / 1e6
+    print(f"{label:<24} {rpcs / duration:8.0f} RPC/s  {seen / duration:6.1f} new fixes/s  "
+          f"latency mean {statistics.mean(latencies) / 1e6:6.2f} ms p50 {p50:6.2f} ms p99 {p99:6.2f} ms")
+
+def run_poll(uri, rover, duration, interval):
+    latencies = []
+    last_seq = 0
+    seen = 0
+    calls_before = rover.calls
+    with Pyro5.api.Proxy(uri) as proxy:
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            data = proxy.get_coordinates()
+            if data is not None and data[0] != last_seq:
+                last_seq = data[0]
+                seen += 1
+                latencies.append(now_ns() - data[3])
+            if interval:
+                time.sleep(interval)
+    label = "poll, no sleep" if not interval else f"poll every {interval * 1000:.0f} ms"
+    summarize(label, latencies, seen, rover.calls - calls_before, duration)
+
+def run_push(uri, rover, duration, max_rate):
+    latencies = []
+    calls_before = rover.calls
+
+    def on_data(data):
+        latencies.append(now_ns() - data[3])
+
+    client = TelemetryClient(host="127.0.0.1")
+    client.subscribe(uri, 'coordinates', on_data, max_rate=max_rate)
+    time.sleep(duration)
+    sent = sum(s.sent for s in rover.telemetry.subscriptions.values())
+    client.close()
+    summarize(f"push at <= {max_rate:.0f} Hz", latencies, len(latencies), rover.calls - calls_before + sent, duration)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Pyro5 polling with pushed telemetry on localhost.")
+    parser.add_argument("--rate", type=float, default=10.0, help="Fixes per second produced by the rover")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    args = parser.parse_args()
+
+    rover = SimulatedRover()
+    daemon = Pyro5.api.Daemon(host="127.0.0.1")
+    uri = str(daemon.register(rover, "uwb"))
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+    stop_event = threading.Event()
+    threading.Thread(target=produce, args=(rover, args.rate, stop_event), daemon=True).start()
+
+    run_poll(uri, rover, args.duration, 0)
+    run_poll(uri, rover, args.duration, 1.0)
+    run_poll(uri, rover, args.duration, 0.1)
+    run_push(uri, rover, args.duration, args.rate)
+
+    stop_event.set()
+    daemon.shutdown()
@@ -0,0 +1,73 @@
+'''
+rev 01 - Benchmark the binary position records against the six lists of get_coordinates() and the CORD list
+'''
+
+import argparse
+import datetime
+import time
+
+import Pyro5.api
+from Pyro5.serializers import serializers
+
+from telemetry_record import decode_batch, decode_batch_array, encode_batch, make_status
+
+def make_fleet(rovers):
+    t_ns = time.time_ns()
+    return [(i + 1, 1000 + i, t_ns, 1.25 * i, 2.5 + i, 0.75, 90, make_status(True, 4)) for i in range(rovers)]
+
+def encode_lists(fleet):
+    # get_coordinates(): names, x, y, z, time strings and status as six lists
+    return ([f"DW{r[0]:04X}" for r in fleet], [r[3] for r in fleet], [r[4] for r in fleet], [r[5] for r in fleet],
+            [datetime.datetime.fromtimestamp(r[2] / 1e9).strftime('%Y-%m-%d %H:%M:%S.%f') for r in fleet],
+            ['Connected' for _ in fleet])
+
+def decode_lists(data):
+    names, xs, ys, zs, t_tags, status = data
+    return [(n, x, y, z, datetime.datetime.strptime(t, '%Y-%m-%d %H:%M:%S.%f'), s)
+            for n, x, y, z, t, s in zip(names, xs, ys, zs, t_tags, status)]
+
+def encode_cord(fleet):
+    # get_uwb_data(): 'CORD', anchors, count, then id and x, y, z strings per rover
+    data = ['CORD', "4", "0"]
+    for r in fleet:
+        data.extend([f"Rov{r[0]}", f"{r[3]}", f"{r[4]}", f"{r[5]}"])
+    return data
+
+def decode_cord(data):
+    return [(data[i], float(data[i + 1]), float(data[i + 2]), float(data[i + 3])) for i in range(3, len(data), 4)]
+
+def timed(func, arg, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = func(arg)
+    return (time.perf_counter() - start) / repeats * 1e6, result
+
+def wire_size(data, serializer):
+    # Size of the data as a Pyro5 call argument, the way it goes over the network
+    return len(serializers[serializer].dumpsCall("obj", "on_telemetry", ("topic", data), {}))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare encode, decode and wire size of the telemetry shapes.")
+    parser.add_argument("--rovers", type=int, nargs="+", default=[1, 16, 64], help="Rovers per message")
+    parser.add_argument("--repeats", type=int, default=2000, help="Encodes and decodes per measurement")
+    args = parser.parse_args()
+    print(f"Pyro5 {Pyro5.__version__}, wire size is the serialized call to on_telemetry()")
+
+    for rovers in args.rovers:
+        fleet = make_fleet(rovers)
+        print(f"\n{rovers} rovers")
+        print(f"{'shape':<28} {'encode us':>10} {'decode us':>10} {'raw B':>8} {'wire B':>8}")
+        shapes = [
+            ("six lists (serpent)", encode_lists, decode_lists, "serpent", None),
+            ("CORD list (serpent)", encode_cord, decode_cord, "serpent", None),
+            ("records (marshal)", encode_batch, decode_batch, "marshal", len),
+            ("records, numpy decode", encode_batch, decode_batch_array, "marshal", len),
+        ]
+        for label, encode, decode, serializer, raw in shapes:
+            encode_us, data = timed(encode, fleet, args.repeats)
+            decode_us, decoded = timed(decode, data, args.repeats)
+            assert len(decoded) == rovers
+            raw_size = raw(data) if raw else len(repr(data))
+            print(f"{label:<28} {encode_us:10.2f} {decode_us:10.2f} {raw_size:8d} {wire_size(data, serializer):8d}")
+        print(f"{'records as serpent':<28} {'':>10} {'':>10} {'':>8} {wire_size(encode_batch(fleet), 'serpent'):8d}"
+              "  (base64, why the pushes use marshal)")
@@ -0,0 +1,57 @@
+'''
+rev 01 - Ingest throughput and end-to-end latency of UwbUsbReader against the replay pty
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from uwb_replay import UwbReplayDevice, load_track
+from uwb_usb import UwbUsbReader
+
+def synthetic_track(count, rate):
+    t = np.arange(count) / rate
+    return list(zip(t, 2.5 + 2 * np.cos(t / 5), 4 + 3 * np.sin(t / 5), np.full(count, 0.3)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure UwbUsbReader throughput and latency on a replay pty.")
+    parser.add_argument("--file", help="Recorded track, a synthetic circle is used when omitted")
+    parser.add_argument("--samples", type=int, default=2000, help="Samples of the synthetic track")
+    parser.add_argument("--rate", type=float, default=10.0, help="Sample rate of the synthetic track [Hz]")
+    parser.add_argument("--speed", type=float, default=20.0, help="Replay speed factor, 0 = as fast as possible")
+    parser.add_argument("--mode", default="shell", choices=["shell", "tlv"], help="UwbUsbReader transport")
+    args = parser.parse_args()
+
+    track = load_track(args.file) if args.file else synthetic_track(args.samples, args.rate)
+    device = UwbReplayDevice(track, speed=args.speed)
+    device.start()
+
+    received_ns = []
+    reader = UwbUsbReader(device.port, mode=args.mode)
+    start_cpu = time.process_time()
+    start = time.monotonic()
+    if args.mode == 'shell':
+        reader.activate_shell_mode()
+    else:
+        reader.request_loc_get()    # Starts the replay clock
+        time.sleep(0.1)
+        reader.serial_connection.reset_input_buffer()
+    reader.start_reader(callback=lambda frame: received_ns.append(frame.t_ns))
+
+    device.finished.wait()
+    time.sleep(0.5)
+    elapsed = time.monotonic() - start
+    cpu = time.process_time() - start_cpu
+    stats = reader.get_stats()
+    reader.close()
+    device.stop()
+
+    print(f"Mode: {args.mode}, {len(received_ns)} frames in {elapsed:.2f} s "
+          f"({len(received_ns) / elapsed:.0f} frames/s), CPU {cpu / elapsed * 100:.1f}% of one core")
+    print(f"Reader stats: {stats}")
+    if args.mode == 'shell':
+        count = min(len(device.sent_ns), len(received_ns))
+        latency_us = (np.array(received_ns[:count]) - np.array(device.sent_ns[:count])) / 1000
+        print(f"Latency pty write -> UwbFrame: p50 {np.percentile(latency_us, 50):.0f} us, "
+              f"p99 {np.percentile(latency_us, 99):.0f} us, max {latency_us.max():.0f} us")
@@ -0,0 +1,86 @@
+'''
+rev 01 - Benchmark uwb_parser against the split-based parsing used by the read_uwb loops
+'''
+
+import argparse
+import random
+import time
+
+from uwb_parser import parse_frame, parse_log, format_frame
+
+ANCHORS = [(0x1151, 0.0, 0.0, 2.25), (0x0CA8, 0.0, 8.0, 2.25), (0x111C, 5.0, 8.0, 2.25), (0x1150, 5.0, 0.0, 2.25)]
+
+def make_lines(count):
+    lines = []
+    for _ in range(count):
+        x, y, z = random.uniform(0, 5), random.uniform(0, 8), 0.3
+        anchors = [(anchor_id, ax, ay, az, ((x - ax)**2 + (y - ay)**2 + (z - az)**2) ** 0.5)
+                   for anchor_id, ax, ay, az in ANCHORS]
+        lines.append((format_frame(x, y, z, random.randint(40, 100), anchors) + "\r\n").encode('ascii'))
+    return lines
+
+def parse_split(raw_line):
+    # Same steps as read_uwb() in uwb_movement_rev08 / serverclient_rev04
+    data = raw_line.decode('utf-8').strip()
+    data_split = data.split(",")
+    if data_split[0] == "DIST":
+        if 'POS' in data_split:
+            pos_index = data_split.index('POS')
+            pos_x = float(data_split[pos_index + 1])
+            pos_y = float(data_split[pos_index + 2])
+            pos_z = float(data_split[pos_index + 3])
+            return pos_x, pos_y, pos_z
+    return None
+
+def parse_split_anchors(raw_line):
+    # Split-based parsing that also keeps every anchor ID/distance pair
+    data = raw_line.decode('utf-8').strip()
+    data_split = data.split(",")
+    if data_split[0] != "DIST":
+        return None
+    anchors = []
+    for i, field in enumerate(data_split):
+        if field.startswith('AN'):
+            anchors.append((int(data_split[i + 1], 16), float(data_split[i + 5])))
+    if 'POS' in data_split:
+        pos_index = data_split.index('POS')
+        return (float(data_split[pos_index + 1]), float(data_split[pos_index + 2]),
+                float(data_split[pos_index + 3]), anchors)
+    return None
+
+def parse_position(raw_line):
+    return parse_frame(raw_line, anchors=False)
+
+def time_it(label, func, lines, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            func(line)
+        best = min(best, time.perf_counter() - start)
+    per_line_us = best / len(lines) * 1e6
+    print(f"{label:<40} {per_line_us:8.2f} us/line {len(lines) / best:12.0f} lines/s")
+    return per_line_us
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare uwb_parser with the split-based DIST/POS parsing.")
+    parser.add_argument("--lines", type=int, default=20000, help="Number of synthetic lines")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions, the best run is reported")
+    args = parser.parse_args()
+
+    random.seed(1)
+    lines = make_lines(args.lines)
+    text_lines = [line.decode('ascii') for line in lines]
+
+    legacy = time_it("split (position only)", parse_split, lines, args.repeat)
+    fast = time_it("parse_frame bytes (position only)", parse_position, lines, args.repeat)
+    print(f"Speed-up, position only: {legacy / fast:.2f}x")
+    legacy = time_it("split (position + anchors)", parse_split_anchors, lines, args.repeat)
+    fast = time_it("parse_frame bytes (position + anchors)", parse_frame, lines, args.repeat)
+    time_it("parse_frame str (position + anchors)", parse_frame, text_lines, args.repeat)
+    print(f"Speed-up, position + anchors: {legacy / fast:.2f}x")
+
+    start = time.perf_counter()
+    arrays = parse_log(lines)
+    elapsed = time.perf_counter() - start
+    print(f"parse_log: {len(arrays['x'])} frames in {elapsed * 1000:.1f} ms")
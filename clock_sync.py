@@ -0,0 +1,184 @@
+'''
+rev 01 - NTP-style clock offset between the ground station and the rovers: best-RTT filtering, drift tracking
+'''
+
+import threading
+import time
+from collections import deque, namedtuple
+
+# t_ns: local time of the exchange midpoint; offset_ns: remote clock minus local clock
+ClockSample = namedtuple('ClockSample', ['t_ns', 'offset_ns', 'rtt_ns'])
+
+SYNC_TOLERANCE_NS = 5000000     # A rover counts as synchronized below 5 ms uncertainty
+
+def exchange(get_clock):
+    """
+    One request/response, like an NTP packet.
+    Args:
+        get_clock (callable): Returns (receive_ns, transmit_ns) of the remote clock, e.g. Server.get_clock.
+    Returns:
+        ClockSample: Offset of the remote clock and the round trip without the remote processing time.
+    """
+    t0 = time.time_ns()
+    t1, t2 = get_clock()
+    t3 = time.time_ns()
+    offset = ((t1 - t0) + (t2 - t3)) // 2
+    rtt = (t3 - t0) - (t2 - t1)
+    return ClockSample((t0 + t3) // 2, offset, rtt)
+
+class ClockEstimator:
+    """
+    Offset and drift of one remote clock. Every measure() does a burst of exchanges and keeps
+    only the one with the shortest round trip, the one least delayed by queues on the way.
+    Of the last window bursts, those within popcorn times the best round trip seen are
+    fitted with a line, its slope is the drift. A jump larger than step_ns (the remote
+    clock was set) starts over.
+    """
+    def __init__(self, burst=8, window=32, popcorn=2.0, min_span=5.0, step_ns=50000000):
+        """
+        Args:
+            burst (int, optional): Exchanges per measure().
+            window (int, optional): Bursts kept for the drift fit.
+            popcorn (float, optional): Bursts with a round trip above popcorn x the best are ignored.
+            min_span (float, optional): Seconds of history before the drift is estimated.
+            step_ns (int, optional): Deviation from the prediction treated as a clock step.
+        """
+        self.burst = burst
+        self.popcorn = popcorn
+        self.min_span_ns = int(min_span * 1e9)
+        self.step_ns = step_ns
+        self.lock = threading.Lock()
+        self.history = deque(maxlen=window)
+        self.exchanges = 0
+        self.steps = 0
+        self._fit = None    # (t_ref_ns, offset_ns, drift, uncertainty_ns, rtt_ns)
+
+    def measure(self, get_clock):
+        """
+        Returns:
+            tuple: (offset_ns, uncertainty_ns) after adding the best of a burst.
+        """
+        samples = [exchange(get_clock) for _ in range(self.burst)]
+        self.exchanges += len(samples)
+        self.add(min(samples, key=lambda sample: sample.rtt_ns))
+        return self.estimate()
+
+    def add(self, sample):
+        with self.lock:
+            if self._fit is not None:
+                predicted = self._offset_at(sample.t_ns)
+                if abs(sample.offset_ns - predicted) > self.step_ns + sample.rtt_ns:
+                    self.history.clear()
+                    self.steps += 1
+            self.history.append(sample)
+            self._refit()
+
+    def _refit(self):
+        best_rtt = min(sample.rtt_ns for sample in self.history)
+        good = [sample for sample in self.history if sample.rtt_ns <= best_rtt * self.popcorn]
+        latest = good[-1]
+        drift = 0.0
+        residual = 0.0
+        if len(good) >= 3 and good[-1].t_ns - good[0].t_ns >= self.min_span_ns:
+            # Least squares line through (t, offset), relative to the latest sample for precision
+            ts = [sample.t_ns - latest.t_ns for sample in good]
+            offsets = [sample.offset_ns - latest.offset_ns for sample in good]
+            mean_t = sum(ts) / len(ts)
+            mean_offset = sum(offsets) / len(offsets)
+            var_t = sum((t - mean_t) ** 2 for t in ts)
+            drift = sum((t - mean_t) * (o - mean_offset) for t, o in zip(ts, offsets)) / var_t
+            intercept = mean_offset - drift * mean_t
+            residual = (sum((o - intercept - drift * t) ** 2 for t, o in zip(ts, offsets)) / len(ts)) ** 0.5
+            offset = latest.offset_ns + intercept
+        else:
+            offset = latest.offset_ns
+        # Half the round trip bounds the error of an exchange, the residual adds the jitter
+        uncertainty = latest.rtt_ns / 2 + residual
+        self._fit = (latest.t_ns, offset, drift, uncertainty, latest.rtt_ns)
+
+    def _offset_at(self, t_ns):
+        t_ref, offset, drift = self._fit[:3]
+        return offset + drift * (t_ns - t_ref)
+
+    def estimate(self, t_ns=None):
+        """
+        Args:
+            t_ns (int, optional): Local time.time_ns() to extrapolate to, defaults to now.
+        Returns:
+            tuple: (offset_ns, uncertainty_ns), (None, None) before the first measure().
+        """
+        with self.lock:
+            if self._fit is None:
+                return None, None
+            t_ns = time.time_ns() if t_ns is None else t_ns
+            return int(self._offset_at(t_ns)), int(self._fit[3])
+
+    def state(self):
+        """
+        Returns:
+            dict: offset_ms, uncertainty_ms, drift_ppm, rtt_ms, exchanges and steps; None before the first measure().
+        """
+        with self.lock:
+            if self._fit is None:
+                return None
+            t_ref, offset, drift, uncertainty, rtt = self._fit
+            return {'t_ref_ns': t_ref, 'offset_ns': int(offset), 'offset_ms': offset / 1e6,
+                    'uncertainty_ms': uncertainty / 1e6, 'drift_ppm': drift * 1e6, 'rtt_ms': rtt / 1e6,
+                    'exchanges': self.exchanges, 'steps': self.steps}
+
+class SwarmClock:
+    """
+    The ground station's clock on the rover. The ground station measures the rover's offset
+    and sends it with set_clock_offset(); schedulers on the rover use now_ns() and
+    to_local_ns() instead of the rover's own time.time_ns().
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.offset_ns = 0          # Rover clock minus swarm clock at ref_ns
+        self.drift = 0.0
+        self.uncertainty_ns = None  # None until the first update
+        self.ref_ns = 0             # Local time the offset was measured at
+        self.updated = None         # time.monotonic() of the last update
+
+    def update(self, offset_ns, drift_ppm, uncertainty_ns, ref_ns):
+        """
+        Args:
+            offset_ns (int): This rover's clock minus the ground station's at ref_ns.
+            drift_ppm (float): Change of the offset [us per s].
+            uncertainty_ns (int): Error bound of offset_ns.
+            ref_ns (int): Ground station time the estimate belongs to.
+        """
+        with self.lock:
+            self.offset_ns = int(offset_ns)
+            self.drift = float(drift_ppm) / 1e6
+            self.uncertainty_ns = int(uncertainty_ns)
+            self.ref_ns = int(ref_ns) + int(offset_ns)
+            self.updated = time.monotonic()
+
+    def offset_at(self, local_ns):
+        with self.lock:
+            return self.offset_ns + self.drift * (local_ns - self.ref_ns)
+
+    def now_ns(self):
+        """Swarm (ground station) time in ns since the epoch."""
+        local = time.time_ns()
+        return int(local - self.offset_at(local))
+
+    def to_local_ns(self, swarm_ns):
+        """time.time_ns() of this rover at which the swarm clock shows swarm_ns."""
+        return int(swarm_ns + self.offset_at(swarm_ns + self.offset_ns))
+
+    def is_synced(self, max_age=10.0, max_uncertainty_ns=SYNC_TOLERANCE_NS):
+        with self.lock:
+            return (self.updated is not None and time.monotonic() - self.updated <= max_age
+                    and self.uncertainty_ns <= max_uncertainty_ns)
+
+    def status(self):
+        with self.lock:
+            age = time.monotonic() - self.updated if self.updated is not None else None
+            uncertainty_ms = self.uncertainty_ns / 1e6 if self.uncertainty_ns is not None else None
+            return {'offset_ms': self.offset_ns / 1e6, 'drift_ppm': self.drift * 1e6,
+                    'uncertainty_ms': uncertainty_ms, 'age': age}
+
+# Shared by the services of the rover process, e.g. the move service of rover.py
+swarm_clock = SwarmClock()
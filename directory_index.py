@@ -0,0 +1,180 @@
+'''
+rev 01 - In-memory index of the rover's show directory: size, mtime and SHA-256 per file, with a version counter
+rev 02 - Removals are forgotten after removed_ttl, clients older than that get the whole listing
+'''
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+from file_transfer import file_sha256
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None  # Falls back to stat checks every rescan_interval seconds
+
+# version is the index version in which the file last changed
+FileEntry = namedtuple('FileEntry', ['name', 'size', 'mtime', 'sha256', 'version'])
+
+EXCLUDED_SUFFIXES = (".part", ".part.json")  # Unfinished chunked or delta uploads
+
+class DirectoryIndex:
+    """
+    Keeps the listing of base_path in memory. Files are hashed only when their size or
+    mtime changed. With inotify (inotify_simple installed, Linux) a refresh touches the
+    disk only for the files that changed; without it the directory is stat'ed at most
+    every rescan_interval seconds. Every change raises the version, so a client that
+    passes the version it has gets only what changed since then.
+    """
+    def __init__(self, base_path, rescan_interval=2.0, use_inotify=True, removed_ttl=600.0):
+        """
+        Args:
+            base_path (str): Directory to index, not recursive.
+            rescan_interval (float, optional): Seconds between stat checks without inotify.
+            use_inotify (bool, optional): Watch the directory when inotify_simple is available.
+            removed_ttl (float, optional): Seconds a removal is remembered for list(). A client
+                whose version is older than a forgotten removal gets the whole listing instead.
+                Defaults to 10 minutes.
+        """
+        self.base_path = base_path
+        self.rescan_interval = rescan_interval
+        self.removed_ttl = removed_ttl
+        self.lock = threading.Lock()
+        # Versions continue from the start time, so a version a client got before the rover
+        # restarted is older than base_version and gets the whole listing again
+        self.base_version = time.time_ns() // 1000000
+        self.version = self.base_version
+        self.entries = {}
+        self.removed = {}       # name -> (version it was removed in, time.monotonic() of the removal)
+        self.trimmed_version = 0    # Newest removal forgotten, older versions get the whole listing
+        self.stat_keys = {}     # name -> (size, mtime_ns) the hash belongs to
+        self.dirty = set()
+        self.full_scan = True
+        self.last_scan = 0.0
+        self.scans = 0
+        self.stop_event = threading.Event()
+        self.inotify = None
+        if use_inotify and INotify is None:
+            print(f"WARNING: inotify_simple is not installed, {base_path} is stat'ed every "
+                  f"{rescan_interval} s instead of watched (pip install inotify_simple)")
+        if use_inotify and INotify is not None:
+            try:
+                self.inotify = INotify()
+                self.inotify.add_watch(base_path, flags.CREATE | flags.DELETE | flags.MODIFY | flags.CLOSE_WRITE |
+                                       flags.MOVED_FROM | flags.MOVED_TO | flags.ATTRIB | flags.DELETE_SELF)
+                threading.Thread(target=self._watch, name="directory-index", daemon=True).start()
+            except OSError as e:
+                print(f"inotify not available for {base_path}, checking mtimes instead: {e}")
+                self.inotify = None
+
+    def _watch(self):
+        while not self.stop_event.is_set():
+            try:
+                events = self.inotify.read(timeout=1000)
+            except (OSError, ValueError):
+                break   # Closed
+            with self.lock:
+                for event in events:
+                    if event.mask & (flags.Q_OVERFLOW | flags.DELETE_SELF) or not event.name:
+                        self.full_scan = True
+                    else:
+                        self.dirty.add(event.name)
+
+    def invalidate(self, name=None):
+        """Marks a file (or, without name, everything) for a check on the next refresh."""
+        with self.lock:
+            if name is None:
+                self.full_scan = True
+            else:
+                self.dirty.add(os.path.basename(name))
+
+    def _update(self, name):
+        # Called with the lock held. Returns True if the entry changed.
+        if name.endswith(EXCLUDED_SUFFIXES):
+            return False
+        file_path = os.path.join(self.base_path, name)
+        try:
+            st = os.stat(file_path)
+            exists = os.path.isfile(file_path)
+        except OSError:
+            exists = False
+        if not exists:
+            if self.entries.pop(name, None) is None:
+                return False
+            self.stat_keys.pop(name, None)
+            self.version += 1
+            self.removed[name] = (self.version, time.monotonic())
+            return True
+        key = (st.st_size, st.st_mtime_ns)
+        if self.stat_keys.get(name) == key:
+            return False
+        self.version += 1
+        self.entries[name] = FileEntry(name, st.st_size, st.st_mtime, file_sha256(file_path), self.version)
+        self.stat_keys[name] = key
+        self.removed.pop(name, None)
+        return True
+
+    def refresh(self):
+        """Brings the index up to date, only the changed files are read."""
+        with self.lock:
+            now = time.monotonic()
+            if self.inotify is None and now - self.last_scan >= self.rescan_interval:
+                self.full_scan = True
+            if self.full_scan:
+                self.full_scan = False
+                self.dirty.clear()
+                self.last_scan = now
+                self.scans += 1
+                names = set(os.listdir(self.base_path))
+                for name in names | set(self.entries):
+                    self._update(name)
+            elif self.dirty:
+                dirty, self.dirty = self.dirty, set()
+                for name in dirty:
+                    self._update(name)
+            if self.removed:
+                self._trim_removed(now)
+
+    def _trim_removed(self, now):
+        # Called with the lock held
+        for name, (version, removed_at) in list(self.removed.items()):
+            if now - removed_at > self.removed_ttl:
+                del self.removed[name]
+                self.trimmed_version = max(self.trimmed_version, version)
+
+    def list(self, since_version=0):
+        """
+        Args:
+            since_version (int, optional): Version the caller already has, 0 for everything.
+        Returns:
+            dict: {"version": current version, "files": [FileEntry as dict] changed after
+            since_version, "removed": [names] removed after it, "full": True if files is the
+            whole listing}. A version from before a restart of the rover, or older than a
+            removal that was already forgotten, gets the whole listing.
+        """
+        self.refresh()
+        with self.lock:
+            full = (since_version < self.base_version or since_version < self.trimmed_version
+                    or since_version > self.version)
+            if full:
+                since_version = 0
+            files = [entry._asdict() for entry in sorted(self.entries.values()) if entry.version > since_version]
+            removed = [name for name, (version, _) in self.removed.items() if version > since_version and not full]
+            return {"version": self.version, "files": files, "removed": removed, "full": full}
+
+    def get(self, name):
+        """Returns the FileEntry of a file, or None."""
+        self.refresh()
+        return self.entries.get(os.path.basename(name))
+
+    def names(self):
+        self.refresh()
+        with self.lock:
+            return sorted(self.entries)
+
+    def close(self):
+        self.stop_event.set()
+        if self.inotify is not None:
+            self.inotify.close()
@@ -0,0 +1,164 @@
+'''
+rev 01 - Chunked, resumable file transfer to and from the rover Server (server.py)
+'''
+
+import hashlib
+import os
+import time
+import zlib
+from collections import namedtuple
+
+import Pyro5.api
+import Pyro5.errors
+
+CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024    # Largest chunk the server accepts or returns
+
+# resumed_from is the number of bytes a previous, interrupted transfer had already moved
+TransferResult = namedtuple('TransferResult', ['filename', 'size', 'seconds', 'mb_per_s', 'resumed_from', 'sha256'])
+
+def file_sha256(file_path, block_size=CHUNK_SIZE):
+    """SHA-256 hex digest of a file, read one block at a time."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TransferError(Exception):
+    pass
+
+class FileTransferClient:
+    """
+    Moves files in fixed-size binary chunks, each checked with CRC-32 and the whole file
+    with SHA-256. Memory use is one chunk no matter the file size. When the connection
+    drops the transfer reconnects and continues where it stopped, also in a later run.
+    """
+    def __init__(self, uri, chunk_size=CHUNK_SIZE, timeout=10.0, retries=5, retry_delay=1.0):
+        """
+        Args:
+            uri (str): Rover server, e.g. "PYRO:server@192.168.50.141:9090".
+            chunk_size (int, optional): Bytes per call, at most MAX_CHUNK_SIZE. Defaults to 1 MiB.
+            timeout (float, optional): Seconds per chunk call.
+            retries (int, optional): Failed calls in a row before the transfer gives up.
+            retry_delay (float, optional): Seconds before the first retry, doubled each time.
+        """
+        self.uri = uri
+        self.chunk_size = min(chunk_size, MAX_CHUNK_SIZE)
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.proxy = None
+
+    def call(self, method, *args):
+        """Calls a Server method, reconnecting with backoff on connection errors."""
+        failures = 0
+        while True:
+            if self.proxy is None:
+                self.proxy = Pyro5.api.Proxy(self.uri)
+                # marshal sends bytes as they are, serpent would base64 encode every chunk
+                self.proxy._pyroSerializer = "marshal"
+                self.proxy._pyroTimeout = self.timeout
+            try:
+                return getattr(self.proxy, method)(*args)
+            except Pyro5.errors.CommunicationError as e:
+                self.close()
+                failures += 1
+                if failures > self.retries:
+                    raise TransferError(f"{method} failed {failures} times: {e}")
+                delay = self.retry_delay * 2 ** (failures - 1)
+                print(f"{method} failed ({e}), retrying in {delay:.1f} s")
+                time.sleep(delay)
+
+    def call_checked(self, method, *args):
+        """Like call(), raises TransferError for an {"error": ...} reply."""
+        reply = self.call(method, *args)
+        if "error" in reply:
+            raise TransferError(reply["error"])
+        return reply
+
+    def upload(self, local_path, remote_name=None, progress=None):
+        """
+        Args:
+            local_path (str): File to send.
+            remote_name (str, optional): Name on the rover, defaults to the local file name.
+            progress (callable, optional): Called as progress(bytes_done, size) after each chunk.
+        Returns:
+            TransferResult
+        """
+        remote_name = remote_name or os.path.basename(local_path)
+        size = os.path.getsize(local_path)
+        sha256 = file_sha256(local_path)
+        start = time.perf_counter()
+        offset = resumed_from = self.call_checked("open_upload", remote_name, size, sha256)["offset"]
+        with open(local_path, 'rb') as f:
+            while offset < size:
+                f.seek(offset)
+                data = f.read(self.chunk_size)
+                reply = self.call("write_chunk", remote_name, offset, data, zlib.crc32(data))
+                if "error" in reply and "offset" not in reply:
+                    raise TransferError(reply["error"])
+                # On a CRC mismatch or gap the server says where to continue
+                offset = reply["offset"]
+                if progress is not None:
+                    progress(offset, size)
+        self.call_checked("finish_upload", remote_name)
+        return self._result(remote_name, size, start, resumed_from, sha256)
+
+    def download(self, remote_name, local_path=None, progress=None):
+        """
+        Continues a partial download in local_path + '.part' if the rover file is unchanged.
+        Returns:
+            TransferResult
+        """
+        local_path = local_path or os.path.basename(remote_name)
+        part_path = local_path + ".part"
+        info = self.call_checked("stat_file", remote_name)
+        size, sha256 = info["size"], info["sha256"]
+        # The expected hash is stored next to the partial file to detect a changed source
+        hash_path = part_path + ".sha256"
+        offset = 0
+        if os.path.exists(part_path) and os.path.exists(hash_path):
+            with open(hash_path, 'r') as f:
+                if f.read().strip() == sha256:
+                    offset = min(os.path.getsize(part_path), size)
+        if offset == 0:
+            with open(hash_path, 'w') as f:
+                f.write(sha256)
+        resumed_from = offset
+        start = time.perf_counter()
+        bad_chunks = 0
+        with open(part_path, 'r+b' if offset else 'wb') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            while offset < size:
+                reply = self.call_checked("read_chunk", remote_name, offset, self.chunk_size)
+                data = reply["data"]
+                if zlib.crc32(data) != reply["crc"]:
+                    bad_chunks += 1
+                    if bad_chunks > self.retries:
+                        raise TransferError(f"CRC mismatch at offset {offset}")
+                    continue
+                if not data:
+                    raise TransferError(f"{remote_name} shrank to {offset} bytes during the download")
+                f.write(data)
+                offset += len(data)
+                if progress is not None:
+                    progress(offset, size)
+        if file_sha256(part_path) != sha256:
+            os.remove(part_path)
+            os.remove(hash_path)
+            raise TransferError("SHA-256 mismatch, download discarded")
+        os.replace(part_path, local_path)
+        os.remove(hash_path)
+        return self._result(remote_name, size, start, resumed_from, sha256)
+
+    def _result(self, filename, size, start, resumed_from, sha256):
+        seconds = time.perf_counter() - start
+        moved = size - resumed_from
+        return TransferResult(filename, size, seconds, moved / 1e6 / seconds if seconds > 0 else 0.0, resumed_from, sha256)
+
+    def close(self):
+        if self.proxy is not None:
+            self.proxy._pyroRelease()
+            self.proxy = None
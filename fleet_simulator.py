@@ -0,0 +1,408 @@
+'''
+rev 01 - Simulated rover fleet on localhost: the rover Pyro5 services with synthetic motion, latency and failures
+rev 02 - The uwb service is the real pyro_coordinates_rev04.RoverServer over simulated 'RovN' tags
+'''
+
+import argparse
+import csv
+import functools
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import Pyro5.api
+import Pyro5.errors
+
+from pyro_coordinates_rev04 import RoverServer as UwbServer
+from rover_daemon import RoverDaemon, ROVER_PORT
+from scheduled_start import ScheduledStart
+from server import Server
+from telemetry_push import TelemetryPublisher
+from telemetry_record import encode_batch, make_status
+from timebase import now_ns, to_wall_ns
+
+# DeviceStateTable, the tag table of the real uwb service, lives with the BLE modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flightsoftware'))
+from device_state import DeviceStateTable
+
+NUM_ANCHORS = 4
+
+def rover_address(index):
+    """
+    Loopback address of simulated rover index (0-based): 127.0.1.1, 127.0.1.2, ...
+    Linux routes all of 127.0.0.0/8 to lo, so every rover gets its own address and the
+    ground station reaches it on the usual port, as it would a Pi listed in ip.csv.
+    """
+    return f"127.0.{1 + index // 250}.{1 + index % 250}"
+
+class Faults:
+    """Latency and failures injected in front of every exposed method of one simulated rover."""
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, failure_rate=0.0):
+        """
+        Args:
+            latency_ms (float, optional): Added to every call.
+            jitter_ms (float, optional): Mean of an exponentially distributed extra delay.
+            failure_rate (float, optional): Share of calls that fail with a CommunicationError.
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.offline_until = 0.0
+        self.failures = 0
+        self.outages = 0
+
+    def is_offline(self):
+        return time.monotonic() < self.offline_until
+
+    def go_offline(self, seconds):
+        # Calls fail and pushes stop, like a rover that dropped off the Wi-Fi
+        self.offline_until = time.monotonic() + seconds
+        self.outages += 1
+
+    def before_call(self):
+        if self.is_offline():
+            raise Pyro5.errors.CommunicationError("simulated outage")
+        delay = self.latency_ms + (random.expovariate(1 / self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay:
+            time.sleep(delay / 1000)
+        if self.failure_rate and random.random() < self.failure_rate:
+            self.failures += 1
+            raise Pyro5.errors.CommunicationError("simulated failure")
+
+    def wrap(self, obj):
+        """Puts before_call() in front of the exposed methods of obj, like RoverDaemon times them."""
+        for attr in dir(type(obj)):
+            if attr.startswith("_") or isinstance(getattr(type(obj), attr, None), property):
+                continue
+            method = getattr(obj, attr, None)
+            if callable(method) and getattr(method, "_pyroExposed", False):
+                setattr(obj, attr, self._faulty(method))
+
+    def _faulty(self, method):
+        @functools.wraps(method)
+        def faulty(*args, **kwargs):
+            self.before_call()
+            return method(*args, **kwargs)
+        return faulty
+
+class SimTags:
+    """
+    Stands in for BLEDeviceManager behind the real pyro_coordinates_rev04.RoverServer: the
+    rover's one tag, named 'RovN' like the BLE tags, in a DeviceStateTable.
+    """
+    def __init__(self, name):
+        self.states = DeviceStateTable(capacity=1)
+        self.slot = self.states.slot(name)
+        self.states.set_status(name, 'Connected')
+        self.listeners = []
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def start_connection(self, id_rover):
+        pass    # The simulated tag is always connected
+
+    def update(self, x, y, z, t_ns):
+        self.states.update(self.slot, x, y, z, t_ns)
+
+    def notify(self):
+        # Like a BLE notification arriving, RoverServer publishes the new fix
+        sample = self.states.rows[self.slot]
+        for callback in self.listeners:
+            callback(sample)
+
+    def snapshot(self):
+        return self.states.snapshot()
+
+    def is_connected(self):
+        return True
+
+@Pyro5.api.expose
+class SimCoordinates:
+    """The "coordinates" service, like serverclient_rev04.RoverServer; the neighbours are the other simulated rovers."""
+    def __init__(self, rover):
+        self.rover = rover
+        self.telemetry = TelemetryPublisher()
+
+    def _position(self):
+        t_ns, x, y, z = self.rover.fix
+        return {'x': x, 'y': y, 'z': z}
+
+    def _uwb_data(self):
+        t_ns, x, y, z = self.rover.fix
+        uwb_data = ['CORD', f"{NUM_ANCHORS}", "0", f"Rov{self.rover.rover_id}", f"{x}", f"{y}", f"{z}"]
+        for other in self.rover.fleet.neighbours(self.rover):
+            t_ns, x, y, z = other.fix
+            uwb_data.extend([f"Rov{other.rover_id}", f"{x}", f"{y}", f"{z}"])
+        return uwb_data
+
+    def _uwb_packed(self):
+        status = make_status(True, NUM_ANCHORS)
+        records = []
+        for rover in [self.rover] + self.rover.fleet.neighbours(self.rover):
+            t_ns, x, y, z = rover.fix
+            records.append((rover.rover_id, rover.seq, to_wall_ns(t_ns), x, y, z, 100, status))
+        return encode_batch(records)
+
+    def get_coordinates(self):
+        return self._position()
+
+    def get_uwb_data(self):
+        return self._uwb_data()
+
+    def get_uwb_data_packed(self):
+        return self._uwb_packed()
+
+    def subscribe(self, callback_uri, topic='coordinates', max_rate=10.0):
+        return self.telemetry.subscribe(callback_uri, topic, max_rate)
+
+    def unsubscribe(self, callback_uri, topic='coordinates'):
+        self.telemetry.unsubscribe(callback_uri, topic)
+
+    def _publish(self, uwb_tick):
+        if self.telemetry.has_subscribers('coordinates'):
+            self.telemetry.publish('coordinates', self._position())
+        # serverclient_rev04 publishes the neighbour table every 0.2 s
+        if uwb_tick and self.telemetry.has_subscribers('uwb_data'):
+            self.telemetry.publish('uwb_data', self._uwb_data())
+        if uwb_tick and self.telemetry.has_subscribers('uwb_packed'):
+            self.telemetry.publish('uwb_packed', self._uwb_packed())
+
+@Pyro5.api.expose
+class SimMove:
+    """The "move" service, like move_rev02.RoverController; arming takes arm_delay instead of loading the show."""
+    def __init__(self, rover, arm_delay=1.0):
+        self.rover = rover
+        self.arm_delay = arm_delay
+        self.armed_at = None
+        self.moving = threading.Event()
+        # All simulated rovers share this host's clock, so the shared clock_sync.swarm_clock fits them all
+        self.scheduled_start = ScheduledStart()
+
+    def start_movement(self, id_rover):
+        self.moving.clear()
+        self.armed_at = time.monotonic() + self.arm_delay
+
+    def is_armed(self):
+        return self.armed_at is not None and time.monotonic() >= self.armed_at and not self.moving.is_set()
+
+    def trigger_start(self):
+        self.moving.set()
+
+    def schedule_start(self, start_id, start_ns, require_go=False):
+        return self.scheduled_start.schedule(start_id, start_ns, self.moving.set, require_go)
+
+    def cancel_start(self):
+        self.scheduled_start.cancel()
+
+    def get_start_report(self):
+        report = self.scheduled_start.report()
+        report['armed'] = self.is_armed()
+        return report
+
+class SimRover:
+    """One simulated rover: its four services on one RoverDaemon and a position moving on a circle."""
+    def __init__(self, index, fleet, base_path, port, faults, servertype, pool_size):
+        self.rover_id = index + 1
+        self.tag = f"Rov{self.rover_id}"
+        self.address = rover_address(index)
+        self.fleet = fleet
+        self.faults = faults
+        # A circle around a grid point, every rover with its own radius, speed and phase
+        self.center = (2.0 * (index % 10), 2.0 * (index // 10))
+        self.radius = random.uniform(0.3, 0.9)
+        self.speed = random.uniform(0.2, 0.6)      # [rad/s]
+        self.phase = random.uniform(0, 2 * math.pi)
+        self.seq = 0
+        self.fix = None
+        self.tags = SimTags(self.tag)
+        self.step(0.0)
+
+        self.server = Server(base_path)
+        # The real uwb service, its payloads are built by records_from_snapshot() as on a Pi
+        self.uwb = UwbServer(self.tags)
+        self.move = SimMove(self)
+        self.coordinates = SimCoordinates(self)
+        self.daemon = RoverDaemon(self.address, port, servertype, pool_size)
+        for name, service in (("server", self.server), ("uwb", self.uwb), ("move", self.move),
+                              ("coordinates", self.coordinates)):
+            faults.wrap(service)
+            self.daemon.register(service, name, announce=False)
+
+    def step(self, t):
+        angle = self.phase + self.speed * t
+        x = self.center[0] + self.radius * math.cos(angle) + random.gauss(0, 0.02)
+        y = self.center[1] + self.radius * math.sin(angle) + random.gauss(0, 0.02)
+        self.seq += 1
+        self.fix = (now_ns(), round(x, 3), round(y, 3), 0.0)
+        self.tags.update(self.fix[1], self.fix[2], self.fix[3], self.fix[0])
+
+    def publish(self, uwb_tick):
+        # A rover in an outage sends nothing, its subscribers only see the pushes stop
+        if not self.faults.is_offline():
+            self.tags.notify()
+            self.coordinates._publish(uwb_tick)
+
+    def close(self):
+        for publisher in (self.uwb.telemetry, self.coordinates.telemetry):
+            publisher.close()
+        self.server.index.close()
+        self.daemon.shutdown()
+
+class FleetSimulator:
+    """
+    Hosts the given number of simulated rovers in this process, rover i on rover_address(i):port, with
+    the same Pyro objects and methods as a real rover started by rover.py. Positions move
+    at rate fixes per second and are pushed to subscribers like the real services do.
+    """
+    def __init__(self, rovers, port=ROVER_PORT, rate=10.0, latency_ms=0.0, jitter_ms=0.0, failure_rate=0.0,
+                 outage_rate=0.0, outage_s=5.0, servertype="thread", pool_size=16, files=3, base_path=None):
+        """
+        Args:
+            rovers (int): Number of rovers.
+            port (int, optional): Port of every rover, defaults to ROVER_PORT (9090).
+            rate (float, optional): Position fixes per second and rover.
+            latency_ms, jitter_ms, failure_rate (float, optional): See Faults.
+            outage_rate (float, optional): Outages per rover and hour.
+            outage_s (float, optional): Length of an outage.
+            servertype (str, optional): Pyro5 server type of the rover daemons.
+            pool_size (int, optional): Worker threads per rover daemon.
+            files (int, optional): Show files created in every rover's directory.
+            base_path (str, optional): Directory for the rovers' show directories, a temporary one by default.
+        """
+        self.count = rovers
+        self.port = port
+        self.rate = rate
+        self.faults = [Faults(latency_ms, jitter_ms, failure_rate) for _ in range(rovers)]
+        self.outage_rate = outage_rate
+        self.outage_s = outage_s
+        self.servertype = servertype
+        self.pool_size = pool_size
+        self.files = files
+        self.temp_dir = None
+        self.base_path = base_path
+        self.rovers = []
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.ticks = 0
+        self.late_ticks = 0
+
+    def start(self):
+        if self.base_path is None:
+            self.temp_dir = tempfile.TemporaryDirectory(prefix="fleet_")
+            self.base_path = self.temp_dir.name
+        for i in range(self.count):
+            rover_path = os.path.join(self.base_path, f"rover{i + 1}")
+            os.makedirs(rover_path, exist_ok=True)
+            for n in range(self.files):
+                with open(os.path.join(rover_path, f"Drone {n + 1}.csv"), 'w') as f:
+                    f.write("Time,x [m],y [m],z [m],Red,Green,Blue\n" + "0.25,0.100,0.200,0.000,255,0,0\n" * 400)
+            self.rovers.append(SimRover(i, self, rover_path, self.port, self.faults[i], self.servertype, self.pool_size))
+        for rover in self.rovers:
+            rover.daemon.start()
+        self.thread = threading.Thread(target=self._run, name="fleet-motion", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        uwb_every = max(1, round(0.2 * self.rate))
+        outage_p = self.outage_rate / 3600 * interval
+        start = time.monotonic()
+        next_tick = start
+        while not self.stop_event.is_set():
+            t = time.monotonic() - start
+            uwb_tick = self.ticks % uwb_every == 0
+            for rover in self.rovers:
+                if outage_p and random.random() < outage_p:
+                    rover.faults.go_offline(self.outage_s)
+                rover.step(t)
+                rover.publish(uwb_tick)
+            self.ticks += 1
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                self.late_ticks += 1
+                next_tick = time.monotonic()
+            elif self.stop_event.wait(delay):
+                break
+
+    def neighbours(self, rover):
+        # What the rover's gossip table would hold: every other rover that is online
+        return [other for other in self.rovers if other is not rover and not other.faults.is_offline()]
+
+    def write_csv(self, directory):
+        """Writes ip.csv and rovers.csv for the ground station, so MainApp connects to the fleet."""
+        with open(os.path.join(directory, "ip.csv"), 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["ID", "IP"])
+            for rover in self.rovers:
+                writer.writerow([rover.rover_id, rover.address])
+        with open(os.path.join(directory, "rovers.csv"), 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["ID", "IP", "Port"])
+            for rover in self.rovers:
+                writer.writerow([rover.rover_id, rover.address, self.port])
+
+    def stats(self):
+        """
+        Returns:
+            dict: calls, errors (incl. injected), injected failures, outages, pushes sent,
+            motion ticks and ticks that ran late.
+        """
+        calls = errors = pushes = 0
+        for rover in self.rovers:
+            for entry in rover.daemon.stats().values():
+                calls += entry['calls']
+                errors += entry['errors']
+            for publisher in (rover.uwb.telemetry, rover.coordinates.telemetry):
+                pushes += sum(subscription.sent for subscription in list(publisher.subscriptions.values()))
+        return {'rovers': len(self.rovers), 'calls': calls, 'errors': errors,
+                'failures': sum(faults.failures for faults in self.faults),
+                'outages': sum(faults.outages for faults in self.faults),
+                'pushes': pushes, 'ticks': self.ticks, 'late_ticks': self.late_ticks}
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        for rover in self.rovers:
+            rover.close()
+        if self.temp_dir is not None:
+            self.temp_dir.cleanup()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated rovers on localhost for load testing the ground station.")
+    parser.add_argument("--rovers", type=int, default=10, help="Number of rovers")
+    parser.add_argument("--port", type=int, default=ROVER_PORT, help="Port of every rover")
+    parser.add_argument("--rate", type=float, default=10.0, help="Position fixes per second and rover")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Mean random extra latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of calls that fail")
+    parser.add_argument("--outage-rate", type=float, default=0.0, help="Outages per rover and hour")
+    parser.add_argument("--outage-s", type=float, default=5.0, help="Length of an outage")
+    parser.add_argument("--servertype", choices=["thread", "multiplex"], default="thread", help="Pyro5 server type")
+    parser.add_argument("--pool-size", type=int, default=16, help="Worker threads per rover daemon")
+    parser.add_argument("--csv-dir", help="Write ip.csv and rovers.csv for the ground station here")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)    # server.py logs at DEBUG
+
+    fleet = FleetSimulator(args.rovers, args.port, args.rate, args.latency_ms, args.jitter_ms, args.failure_rate,
+                           args.outage_rate, args.outage_s, args.servertype, args.pool_size)
+    fleet.start()
+    if args.csv_dir:
+        fleet.write_csv(args.csv_dir)
+    print(f"Fleet ready: {args.rovers} rovers on {rover_address(0)} .. {rover_address(args.rovers - 1)} "
+          f"port {args.port}", flush=True)
+    try:
+        while True:
+            time.sleep(10)
+            print(fleet.stats(), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.stop()
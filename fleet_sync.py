@@ -0,0 +1,234 @@
+'''
+rev 01 - Sync show files to every rover at once, only changed files and, for large files, only changed blocks
+'''
+
+import fnmatch
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from file_transfer import FileTransferClient, TransferError, file_sha256
+
+BLOCK_SIZE = 8192
+DELTA_MIN_SIZE = 64 * 1024  # Smaller files are sent whole, the signatures would not pay off
+BATCH_SIZE = 1024 * 1024    # Literal bytes per write_delta call
+SEGMENT_SIZE = 1024 * 1024  # Offsets searched per numpy pass
+FILTER_BITS = 20
+FILTER_MASK = (1 << FILTER_BITS) - 1
+
+SyncReport = namedtuple('SyncReport', ['uri', 'files', 'sent', 'bytes_sent', 'bytes_saved', 'seconds', 'errors'])
+
+def weak_checksum(block):
+    """rsync's weak checksum of one block: a = sum of bytes, b = sum of (len - i) * byte, both mod 2**16."""
+    x = np.frombuffer(block, dtype=np.uint8).astype(np.int64)
+    n = len(x)
+    a = int(x.sum()) & 0xFFFF
+    b = int(((n - np.arange(n)) * x).sum()) & 0xFFFF
+    return a | (b << 16)
+
+def rolling_checksums(data, block_size):
+    """
+    Weak checksum of the block starting at every offset, computed from prefix sums instead
+    of rolling one byte at a time in Python.
+    Returns:
+        numpy.ndarray: (len(data) - block_size + 1,) checksums, same values as weak_checksum().
+    """
+    x = np.frombuffer(data, dtype=np.uint8).astype(np.int64)
+    if len(x) < block_size:
+        return np.zeros(0, dtype=np.int64)
+    s = np.concatenate(([0], np.cumsum(x)))
+    t = np.concatenate(([0], np.cumsum(x * np.arange(len(x)))))
+    k = np.arange(len(x) - block_size + 1)
+    a = s[k + block_size] - s[k]
+    # b = sum over the window of (k + block_size - j) * x[j]
+    b = (k + block_size) * a - (t[k + block_size] - t[k])
+    return (a & 0xFFFF) | ((b & 0xFFFF) << 16)
+
+def block_signatures(file_path, block_size=BLOCK_SIZE):
+    """
+    Returns:
+        list: (weak, md5 digest) of every block of the file, the last one may be short.
+    """
+    signatures = []
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            signatures.append((weak_checksum(block), hashlib.md5(block).digest()))
+    return signatures
+
+def compute_delta(data, signatures, block_size=BLOCK_SIZE):
+    """
+    Describes data as blocks of the rover's copy plus literal bytes.
+    Args:
+        data (bytes): New file content.
+        signatures (list): block_signatures() of the rover's copy.
+    Returns:
+        list: ('c', first block, block count) and ('d', bytes) operations in file order.
+    """
+    weak_index = {}
+    for i, (weak, strong) in enumerate(signatures):
+        weak_index.setdefault(weak, []).append((i, strong))
+    # Bitmap over the low bits of the weak checksums, rules out almost every offset in one
+    # numpy lookup. Offsets that pass are checked against the dict.
+    candidate = np.zeros(1 << FILTER_BITS, dtype=bool)
+    candidate[np.array(list(weak_index), dtype=np.int64) & FILTER_MASK] = True
+
+    ops = []
+    def copy(i):
+        if ops and ops[-1][0] == 'c' and ops[-1][1] + ops[-1][2] == i:
+            ops[-1] = ('c', ops[-1][1], ops[-1][2] + 1)
+        else:
+            ops.append(('c', i, 1))
+
+    def literal(start, end):
+        if end > start:
+            ops.append(('d', bytes(data[start:end])))
+
+    pos = 0
+    # Weak checksums are computed for one segment of offsets at a time to bound the memory
+    for segment in range(0, max(len(data) - block_size + 1, 0), SEGMENT_SIZE):
+        weak = rolling_checksums(data[segment:segment + SEGMENT_SIZE + block_size - 1], block_size)
+        for offset in np.flatnonzero(candidate[weak & FILTER_MASK]):
+            start = segment + int(offset)
+            if start < pos:
+                continue
+            entries = weak_index.get(int(weak[offset]))
+            if entries is None:
+                continue
+            strong = hashlib.md5(data[start:start + block_size]).digest()
+            match = next((i for i, s in entries if s == strong), None)
+            if match is None:
+                continue
+            literal(pos, start)
+            copy(match)
+            pos = start + block_size
+    # A short last block only matches the end of the file
+    if signatures and pos < len(data):
+        tail = data[pos:]
+        tail_match = [i for i, s in weak_index.get(weak_checksum(tail), []) if s == hashlib.md5(tail).digest()]
+        if tail_match:
+            copy(tail_match[0])
+            pos = len(data)
+    literal(pos, len(data))
+    return ops
+
+def local_files(local_dir, pattern):
+    """
+    Returns:
+        dict: name -> (path, size, sha256) of the files to sync, hashed once for every rover.
+    """
+    files = {}
+    for name in sorted(os.listdir(local_dir)):
+        path = os.path.join(local_dir, name)
+        if os.path.isfile(path) and fnmatch.fnmatch(name, pattern):
+            files[name] = (path, os.path.getsize(path), file_sha256(path))
+    return files
+
+class FleetSync:
+    """
+    Brings the show files of every rover in line with a local directory. Files whose hash
+    already matches are skipped, small or new files are sent whole in chunks, large
+    changed files as a delta against the rover's copy, rsync-style. All rovers run at once.
+    """
+    def __init__(self, uris, block_size=BLOCK_SIZE, delta_min_size=DELTA_MIN_SIZE, timeout=10.0):
+        """
+        Args:
+            uris (list): Rover servers, e.g. [rover_uri(ip) for ip in ...].
+            block_size (int, optional): Bytes per delta block. Defaults to 8 KiB.
+            delta_min_size (int, optional): Changed files at least this large are sent as a delta.
+            timeout (float, optional): Seconds per call.
+        """
+        self.uris = list(uris)
+        self.block_size = block_size
+        self.delta_min_size = delta_min_size
+        self.timeout = timeout
+        self.lock = threading.Lock()     # Guards delta_locks only
+        self.deltas = {}    # (name, rover sha256, local sha256) -> ops, rovers with the same copy share one delta
+        self.delta_locks = {}   # Same keys, one lock each
+
+    def sync(self, local_dir='.', pattern='*.csv'):
+        """
+        Returns:
+            list: SyncReport of every rover, in the order of uris.
+        """
+        start = time.perf_counter()
+        files = local_files(local_dir, pattern)
+        self.deltas.clear()
+        self.delta_locks.clear()
+        with ThreadPoolExecutor(max_workers=max(1, len(self.uris))) as executor:
+            reports = list(executor.map(lambda uri: self.sync_rover(uri, files), self.uris))
+        seconds = time.perf_counter() - start
+        total = sum(size for _, size, _ in files.values()) * len(self.uris)
+        sent = sum(report.bytes_sent for report in reports)
+        print(f"Synced {len(files)} files to {len(self.uris)} rovers in {seconds:.2f} s: "
+              f"{sent / 1e6:.2f} MB sent, {(total - sent) / 1e6:.2f} MB saved")
+        return reports
+
+    def sync_rover(self, uri, files):
+        start = time.perf_counter()
+        sent = 0
+        bytes_sent = 0
+        errors = []
+        transfer = FileTransferClient(uri, timeout=self.timeout)
+        try:
+            remote = transfer.call("get_file_hashes")
+            for name, (path, size, sha256) in files.items():
+                info = remote.get(name)
+                if info is not None and info["sha256"] == sha256:
+                    continue
+                try:
+                    if info is not None and size >= self.delta_min_size:
+                        bytes_sent += self._send_delta(transfer, name, path, size, sha256, info["sha256"])
+                    else:
+                        transfer.upload(path, name)
+                        bytes_sent += size
+                    sent += 1
+                except TransferError as e:
+                    errors.append(f"{name}: {e}")
+        except Exception as e:
+            errors.append(str(e))
+        finally:
+            transfer.close()
+        total = sum(size for _, size, _ in files.values())
+        report = SyncReport(uri, len(files), sent, bytes_sent, total - bytes_sent, time.perf_counter() - start, errors)
+        for error in errors:
+            print(f"{uri}: {error}")
+        return report
+
+    def _delta(self, name, remote_sha256, path, sha256, signatures):
+        key = (name, remote_sha256, sha256)
+        with self.lock:
+            key_lock = self.delta_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Held while computing, the other rovers with this copy of the file wait for the
+            # result, deltas of other files or other copies are computed at the same time
+            ops = self.deltas.get(key)
+            if ops is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                ops = self.deltas[key] = compute_delta(data, signatures, self.block_size)
+        return ops
+
+    def _send_delta(self, transfer, name, path, size, sha256, remote_sha256):
+        signatures = transfer.call_checked("get_block_signatures", name, self.block_size)["signatures"]
+        ops = self._delta(name, remote_sha256, path, sha256, signatures)
+        transfer.call_checked("open_delta", name, size, sha256)
+        # Signatures received count too, 4 + 16 bytes per block
+        bytes_sent = len(signatures) * 20
+        batch, batch_bytes = [], 0
+        for op in ops:
+            batch.append(op)
+            batch_bytes += len(op[1]) if op[0] == 'd' else 12
+            if batch_bytes >= BATCH_SIZE:
+                transfer.call_checked("write_delta", name, self.block_size, batch)
+                bytes_sent += batch_bytes
+                batch, batch_bytes = [], 0
+        if batch:
+            transfer.call_checked("write_delta", name, self.block_size, batch)
+            bytes_sent += batch_bytes
+        transfer.call_checked("finish_upload", name)
+        return bytes_sent
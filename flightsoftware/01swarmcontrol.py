@@ -8,13 +8,17 @@ import pandas as pd
 import threading
 import time
 import datetime
-import pickle
 import Pyro5.api
-import base64
 import pygame
 import numpy as np
 import math
 from rover09 import Rover
+import repo_root  # noqa: F401 - imported for its side effect, the repository root on sys.path
+from telemetry_push import TelemetryClient
+from proxy_pool import ProxyPool, rover_uri
+from file_transfer import FileTransferClient
+from telemetry_record import decode_batch, is_valid, rover_name
+from clock_sync import ClockEstimator, SYNC_TOLERANCE_NS
 
 class MainApp:
     def __init__(self, root, window_title):
@@ -24,6 +28,9 @@ class MainApp:
         self.is_streaming = False
         self.rovers = {}  # Dictionary to keep track of rover connections by ID
         self.rover_ids = {} 
+        self.proxy_pool = ProxyPool()  # Keeps the connections to the rovers' servers open
+        self.clocks = {}  # ClockEstimator per rover ID
+        self.rover_listings = {}  # circle index -> (listing version, {filename: metadata})
 
         # Load the image
         logo_img = Image.open("G7_logo.jpg")
@@ -437,25 +444,39 @@ class MainApp:
 
     def fetch_time(self, circle_index, ip_address, rover_id):
         try:
-            # Create a new proxy inside the thread
-            time_service = Pyro5.api.Proxy(f"PYRO:server@{ip_address}:9090")
-            #print(f"Connected to time service on {ip_address}.")
+            # Pooled connection, reconnected with backoff when the rover drops out
+            time_service_uri = rover_uri(ip_address)
             
-            while True:
-                # Fetch the server time from the rover
-                server_time = time_service.get_server_time()
-                current_time = datetime.datetime.now().strftime("%H:%M:%S %p")
+            # Offset of the rover's clock from this computer's, from bursts of get_clock() exchanges
+            clock = self.clocks.setdefault(rover_id, ClockEstimator())
+            get_clock = lambda: self.proxy_pool.call(time_service_uri, 'get_clock', timeout=2.0)
 
-                # Update the time label with the server time
-                self.time_labels[circle_index].config(text=f"Time: {server_time}")
+            while True:
+                try:
+                    offset_ns, uncertainty_ns = clock.measure(get_clock)
+                    state = clock.state()
+                    # The rover's schedulers run on this computer's clock with it
+                    self.proxy_pool.call(time_service_uri, 'set_clock_offset', state['offset_ns'], state['drift_ppm'],
+                                         uncertainty_ns, state['t_ref_ns'], timeout=2.0)
+                except AttributeError:
+                    # Rover script without get_clock(): only the time of day, to the second
+                    server_time = self.proxy_pool.call(time_service_uri, 'get_server_time', timeout=2.0)
+                    self.time_labels[circle_index].config(text=f"Time: {server_time}")
+                    self.canvas.itemconfig(self.small_circles[circle_index], fill='red')
+                    time.sleep(1)
+                    continue
+                except Pyro5.errors.CommunicationError as ce:
+                    print(f"Communication error with time service for Rover {rover_id}: {str(ce)}")
+                    self.canvas.itemconfig(self.small_circles[circle_index], fill='red')
+                    time.sleep(1)
+                    continue
 
-                # Convert both times to datetime objects for comparison
-                current_time_obj = datetime.datetime.strptime(current_time, "%H:%M:%S %p")
-                server_time_obj = datetime.datetime.strptime(server_time, "%H:%M:%S %p")
+                # Offset and uncertainty of the rover's clock
+                self.time_labels[circle_index].config(
+                    text=f"Offset: {state['offset_ms']:+.1f} ms \u00b1{state['uncertainty_ms']:.1f} ms")
 
-                # Compare hours and minutes (seconds can be ignored for exact match)
-                #if current_time_obj.hour == server_time_obj.hour and current_time_obj.minute == server_time_obj.minute:
-                if current_time_obj == server_time_obj:
+                # Green once the offset is known to within a few milliseconds
+                if uncertainty_ns <= SYNC_TOLERANCE_NS:
                     self.canvas.itemconfig(self.small_circles[circle_index], fill='green')
                 else:
                     self.canvas.itemconfig(self.small_circles[circle_index], fill='red')
@@ -484,12 +505,14 @@ class MainApp:
             # Get the IP address for the specific circle index
             ip_address = self.get_ip_address_for_rover(circle_index)
             if ip_address:
-                # Create proxy for FileService
-                file_service = Pyro5.api.Proxy(f"PYRO:server@{ip_address}:9090")
                 print(f"fetching file list for Rover {rover_id}")
                 
-                # Get file list from server
-                files = file_service.get_file_list()
+                # Get file list from server, with the metadata of every file
+                listing = self.fetch_listing_for_rover(circle_index, ip_address)
+                if listing is not None:
+                    files = sorted(listing)
+                else:
+                    files = self.proxy_pool.call(rover_uri(ip_address), 'get_file_list')
                 self.server_file_comboboxes[circle_index]["values"] = files
                 
                 # Fetch file list from client directory (if needed)
@@ -502,6 +525,22 @@ class MainApp:
         except Exception as e:
             print(f"Error fetching file list for Rover {rover_id}: {e}")
 
+    def fetch_listing_for_rover(self, circle_index, ip_address):
+        # Only the files changed since the previous refresh are sent
+        version, files = self.rover_listings.get(circle_index, (0, {}))
+        try:
+            listing = self.proxy_pool.call(rover_uri(ip_address), 'list_with_metadata', version)
+        except AttributeError:
+            return None  # Older server.py without the listing call
+        if listing["full"]:
+            files = {}
+        for entry in listing["files"]:
+            files[entry["name"]] = entry
+        for name in listing["removed"]:
+            files.pop(name, None)
+        self.rover_listings[circle_index] = (listing["version"], files)
+        return files
+
     def transfer_data(self, circle_index):
         try:
             source_file = self.client_file_comboboxes[circle_index].get()
@@ -512,26 +551,26 @@ class MainApp:
             self.message_label.config(text="")
             
             file_path = os.path.join('.', source_file)
-            with open(file_path, 'rb') as f:
-                data = f.read()
-                                
-            # Serialize the column data using pickle
-            serialized_data = pickle.dumps(data)
+            if not os.path.isfile(file_path):
+                raise FileNotFoundError(file_path)
             
             rover_id = circle_index + 1
             # Get the IP address for the specific circle index
             ip_address = self.get_ip_address_for_rover(circle_index)
             if ip_address:
-                # Send the serialized data to the server
+                # Send the file in chunks, an interrupted upload continues on the next attempt
                 filename = os.path.basename(file_path)
-                file_service = Pyro5.api.Proxy(f"PYRO:server@{ip_address}:9090")
-                result = file_service.upload_file(filename, serialized_data)
+                transfer = FileTransferClient(rover_uri(ip_address))
+                try:
+                    result = transfer.upload(file_path, filename)
+                finally:
+                    transfer.close()
                     
                 # Optionally print or log the result
-                print(result)
+                print(f"{filename}: {result.size} bytes in {result.seconds:.1f} s, {result.mb_per_s:.1f} MB/s")
                 
                 # Show success message
-                success_message = f"{filename} successfully uploaded to Rover {rover_id}."
+                success_message = f"{filename} successfully uploaded to Rover {rover_id} ({result.mb_per_s:.1f} MB/s)."
                 print(success_message)  # Optionally print the message
                 self.message_label.config(text=success_message)
                 # Move the message label to the left
@@ -572,15 +611,21 @@ class MainApp:
             # Get the IP address for the specific circle index
             ip_address = self.get_ip_address_for_rover(circle_index)
             if ip_address:
-                # Get file metadata from the server
-                file_service = Pyro5.api.Proxy(f"PYRO:server@{ip_address}:9090")
-                metadata = file_service.get_file_metadata(selected_file)
-                if "error" in metadata:
-                    print(metadata["error"])
-                    return
+                entry = self.rover_listings.get(circle_index, (0, {}))[1].get(selected_file)
+                if entry is not None:
+                    # Metadata came with the last refresh of the file list
+                    file_date_time = datetime.datetime.fromtimestamp(entry["mtime"])
+                    file_date = file_date_time.strftime("%Y-%m-%d")
+                    file_time = file_date_time.strftime("%H:%M:%S")
+                else:
+                    # Get file metadata from the server
+                    metadata = self.proxy_pool.call(rover_uri(ip_address), 'get_file_metadata', selected_file)
+                    if "error" in metadata:
+                        print(metadata["error"])
+                        return
 
-                file_date = metadata["date"]
-                file_time = metadata["time"]
+                    file_date = metadata["date"]
+                    file_time = metadata["time"]
 
                 # Clear existing metadata texts for the current circle index
                 for text_obj in self.metadata_texts[circle_index]:
@@ -611,23 +656,14 @@ class MainApp:
             # Get the IP address (example)
             ip_address = self.get_ip_address_for_rover(circle_index)
             if ip_address:
-                # Create proxy for FileService
-                file_service = Pyro5.api.Proxy(f"PYRO:server@{ip_address}:9090")
-                
-                # Request the file content
-                response = file_service.download_file(selected_file)
                 
-                if "error" in response:
-                    self.message_label.config(text=f"Error downloading file: {response['error']}")
-                else:
-                    # Decode the file content
-                    decoded_data = base64.b64decode(response['data'])
-                    file_data = pickle.loads(decoded_data)
-
-                    # Save the file locally
-                    with open(selected_file, 'wb') as f:
-                        f.write(file_data)
-                    self.message_label.config(text=f"File '{selected_file}' downloaded and saved successfully.")
+                # Fetch the file in chunks straight to disk, an interrupted download continues on the next attempt
+                transfer = FileTransferClient(rover_uri(ip_address))
+                try:
+                    result = transfer.download(selected_file, selected_file)
+                finally:
+                    transfer.close()
+                self.message_label.config(text=f"File '{selected_file}' downloaded and saved successfully ({result.mb_per_s:.1f} MB/s).")
             else:
                 self.message_label.config(text="IP address not found for selected Rover.")
                 
@@ -651,6 +687,8 @@ class MainApp:
         self.rover_ids.clear()
     
     def on_closing(self):
+        self.proxy_pool.print_stats()
+        self.proxy_pool.close()
         self.window.destroy()
         
 class RoverVisualization:
@@ -669,6 +707,8 @@ class RoverVisualization:
         self.target_pos = [1000, 200]
         self.canvas = canvas
         self.stop_event = threading.Event()
+        # Receives the fixes the rovers push, instead of polling get_coordinates()
+        self.telemetry = TelemetryClient()
 
         # Initialize Pygame and set up the screen
         pygame.init()
@@ -678,14 +718,34 @@ class RoverVisualization:
         
         self.running = True
 
+    def coordinates_from_records(self, data):
+        # telemetry_record batch -> the six lists of get_coordinates(), t_tag as wall-clock ns
+        records = decode_batch(data) or []
+        return ([rover_name(r.id) for r in records], [r.x for r in records], [r.y for r in records],
+                [r.z for r in records], [r.t_ns for r in records],
+                ['Connected' if is_valid(r.status) else 'Disconnected' for r in records])
+
     def fetch_device_info(self, uri):
+        def on_coordinates(data):
+            if isinstance(data, (bytes, bytearray)):
+                data = self.coordinates_from_records(data)
+            with self.lock:
+                self.result_dict[uri] = tuple(data)
+
         try:
+            # Binary records if the rover has them, the lists otherwise
+            for topic in ('coordinates_packed', 'coordinates'):
+                if self.telemetry.subscribe(uri, topic, on_coordinates, max_rate=10.0) is not None:
+                    print(f"Subscribed to {topic} from {uri}")
+                    return
+
+            # Rover script without subscribe(): poll at the same rate instead
             with Pyro5.api.Proxy(uri) as proxy:
                 while not self.stop_event.is_set():
                     name, x, y, z, t_tag, status = proxy.get_coordinates()
-                    print(f"Data fetched from {uri}: {name}, {status}, {x}, {y}, {z}, {t_tag}")
                     with self.lock:
                         self.result_dict[uri] = (name, x, y, z, t_tag, status)
+                    self.stop_event.wait(0.1)
         except Exception as e:
             print(f"Error fetching data from server {uri}: {e}")
             with self.lock:
@@ -697,7 +757,7 @@ class RoverVisualization:
         for index, row in df.iterrows():
             rover_id = row['ID']
             ip_address = row['IP']
-            uri = f"PYRO:uwb@{ip_address}:9091"
+            uri = rover_uri(ip_address, "uwb")  # rover.py serves everything on 9090
             print(f"Starting thread for {rover_id} with URI {uri}")
             thread = threading.Thread(target=self.fetch_device_info, args=(uri,))
             threads.append(thread)
@@ -837,6 +897,7 @@ class RoverVisualization:
     def stop_pygame(self):
         self.running = False
         self.stop_event.set()
+        self.telemetry.close()
         
 def main():
     pygame.init()
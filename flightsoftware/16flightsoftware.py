@@ -8,10 +8,17 @@ import pandas as pd
 import threading
 import time
 import datetime
-import pickle
 import Pyro5.api
-import base64
+from concurrent.futures import ThreadPoolExecutor
 from rover11 import Rover
+import repo_root  # noqa: F401 - imported for its side effect, the repository root on sys.path
+from telemetry_push import TelemetryClient
+from proxy_pool import ProxyPool, rover_uri
+from file_transfer import FileTransferClient
+from fleet_sync import FleetSync
+from telemetry_record import decode_batch, is_valid, rover_name, num_anchors as record_anchors
+from clock_sync import ClockEstimator, SYNC_TOLERANCE_NS
+from scheduled_start import send_go
 
 class MainApp:
     def __init__(self, root, window_title):
@@ -25,6 +32,10 @@ class MainApp:
         self.time_service = None
         self.ble_services = {}  
         self.lock = threading.Lock()
+        self.telemetry = TelemetryClient()  # Receives the UWB data the rovers push
+        self.proxy_pool = ProxyPool()  # Keeps the connections to the rovers' servers open
+        self.clocks = {}  # ClockEstimator per rover ID
+        self.rover_listings = {}  # circle index -> (listing version, {filename: metadata})
 
         # Load the image
         logo_img = Image.open("G7_logo.jpg")
@@ -176,6 +187,13 @@ class MainApp:
 
         self.execute_btn = ttk.Button(root, text="Execute", style='W.TButton', bootstyle='dark', command=self.start_execution)
         self.execute_btn.place(x=1200, y=480, width=150, height=50)
+
+        self.sync_btn = ttk.Button(root, text="Sync All", style='W.TButton', command=self.sync_all_rovers)
+        self.sync_btn.place(x=1200, y=680, width=150, height=50)
+
+        # Starts every armed rover at the same time, after Execute has loaded the show
+        self.start_all_btn = ttk.Button(root, text="Start All", style='W.TButton', command=self.start_all_rovers)
+        self.start_all_btn.place(x=1200, y=780, width=150, height=50)
         
         # Label to display messages
         self.message_label = tk.Label(root, text="", font=("Times", 10), fg="red", bg='white')
@@ -304,25 +322,39 @@ class MainApp:
 
     def fetch_time(self, circle_index, ip_address, rover_id):
         try:
-            # Create a new proxy inside the thread
-            time_service = Pyro5.api.Proxy(f"PYRO:server@{ip_address}:9090")
-            #print(f"Connected to time service on {ip_address}.")
+            # Pooled connection, reconnected with backoff when the rover drops out
+            time_service_uri = rover_uri(ip_address)
             
-            while True:
-                # Fetch the server time from the rover
-                server_time = time_service.get_server_time()
-                current_time = datetime.datetime.now().strftime("%H:%M:%S %p")
+            # Offset of the rover's clock from this computer's, from bursts of get_clock() exchanges
+            clock = self.clocks.setdefault(rover_id, ClockEstimator())
+            get_clock = lambda: self.proxy_pool.call(time_service_uri, 'get_clock', timeout=2.0)
 
-                # Update the time label with the server time
-                self.time_labels[circle_index].config(text=f"Time: {server_time}")
+            while True:
+                try:
+                    offset_ns, uncertainty_ns = clock.measure(get_clock)
+                    state = clock.state()
+                    # The rover's schedulers run on this computer's clock with it
+                    self.proxy_pool.call(time_service_uri, 'set_clock_offset', state['offset_ns'], state['drift_ppm'],
+                                         uncertainty_ns, state['t_ref_ns'], timeout=2.0)
+                except AttributeError:
+                    # Rover script without get_clock(): only the time of day, to the second
+                    server_time = self.proxy_pool.call(time_service_uri, 'get_server_time', timeout=2.0)
+                    self.time_labels[circle_index].config(text=f"Time: {server_time}")
+                    self.canvas.itemconfig(self.small_circles[circle_index], fill='red')
+                    time.sleep(1)
+                    continue
+                except Pyro5.errors.CommunicationError as ce:
+                    print(f"Communication error with time service for Rover {rover_id}: {str(ce)}")
+                    self.canvas.itemconfig(self.small_circles[circle_index], fill='red')
+                    time.sleep(1)
+                    continue
 
-                # Convert both times to datetime objects for comparison
-                current_time_obj = datetime.datetime.strptime(current_time, "%H:%M:%S %p")
-                server_time_obj = datetime.datetime.strptime(server_time, "%H:%M:%S %p")
+                # Offset and uncertainty of the rover's clock
+                self.time_labels[circle_index].config(
+                    text=f"Offset: {state['offset_ms']:+.1f} ms \u00b1{state['uncertainty_ms']:.1f} ms")
 
-                # Compare hours and minutes (seconds can be ignored for exact match)
-                #if current_time_obj.hour == server_time_obj.hour and current_time_obj.minute == server_time_obj.minute:
-                if current_time_obj == server_time_obj:
+                # Green once the offset is known to within a few milliseconds
+                if uncertainty_ns <= SYNC_TOLERANCE_NS:
                     self.canvas.itemconfig(self.small_circles[circle_index], fill='green')
                 else:
                     self.canvas.itemconfig(self.small_circles[circle_index], fill='red')
@@ -351,12 +383,14 @@ class MainApp:
             # Get the IP address for the specific circle index
             ip_address = self.get_ip_address_for_rover(circle_index)
             if ip_address:
-                # Create proxy for FileService
-                file_service = Pyro5.api.Proxy(f"PYRO:server@{ip_address}:9090")
                 print(f"fetching file list for Rover {rover_id}")
                 
-                # Get file list from server
-                files = file_service.get_file_list()
+                # Get file list from server, with the metadata of every file
+                listing = self.fetch_listing_for_rover(circle_index, ip_address)
+                if listing is not None:
+                    files = sorted(listing)
+                else:
+                    files = self.proxy_pool.call(rover_uri(ip_address), 'get_file_list')
                 self.server_file_comboboxes[circle_index]["values"] = files
                 
                 # Fetch file list from client directory (if needed)
@@ -369,6 +403,22 @@ class MainApp:
         except Exception as e:
             print(f"Error fetching file list for Rover {rover_id}: {e}")
 
+    def fetch_listing_for_rover(self, circle_index, ip_address):
+        # Only the files changed since the previous refresh are sent
+        version, files = self.rover_listings.get(circle_index, (0, {}))
+        try:
+            listing = self.proxy_pool.call(rover_uri(ip_address), 'list_with_metadata', version)
+        except AttributeError:
+            return None  # Older server.py without the listing call
+        if listing["full"]:
+            files = {}
+        for entry in listing["files"]:
+            files[entry["name"]] = entry
+        for name in listing["removed"]:
+            files.pop(name, None)
+        self.rover_listings[circle_index] = (listing["version"], files)
+        return files
+
     def transfer_data(self, circle_index):
         try:
             source_file = self.client_file_comboboxes[circle_index].get()
@@ -379,26 +429,26 @@ class MainApp:
             self.message_label.config(text="")
             
             file_path = os.path.join('.', source_file)
-            with open(file_path, 'rb') as f:
-                data = f.read()
-                                
-            # Serialize the column data using pickle
-            serialized_data = pickle.dumps(data)
+            if not os.path.isfile(file_path):
+                raise FileNotFoundError(file_path)
             
             rover_id = circle_index + 1
             # Get the IP address for the specific circle index
             ip_address = self.get_ip_address_for_rover(circle_index)
             if ip_address:
-                # Send the serialized data to the server
+                # Send the file in chunks, an interrupted upload continues on the next attempt
                 filename = os.path.basename(file_path)
-                file_service = Pyro5.api.Proxy(f"PYRO:server@{ip_address}:9090")
-                result = file_service.upload_file(filename, serialized_data)
+                transfer = FileTransferClient(rover_uri(ip_address))
+                try:
+                    result = transfer.upload(file_path, filename)
+                finally:
+                    transfer.close()
                     
                 # Optionally print or log the result
-                print(result)
+                print(f"{filename}: {result.size} bytes in {result.seconds:.1f} s, {result.mb_per_s:.1f} MB/s")
                 
                 # Show success message
-                success_message = f"{filename} successfully uploaded to Rover {rover_id}."
+                success_message = f"{filename} successfully uploaded to Rover {rover_id} ({result.mb_per_s:.1f} MB/s)."
                 print(success_message)  # Optionally print the message
                 self.message_label.config(text=success_message)
                 # Move the message label to the left
@@ -439,15 +489,21 @@ class MainApp:
             # Get the IP address for the specific circle index
             ip_address = self.get_ip_address_for_rover(circle_index)
             if ip_address:
-                # Get file metadata from the server
-                file_service = Pyro5.api.Proxy(f"PYRO:server@{ip_address}:9090")
-                metadata = file_service.get_file_metadata(selected_file)
-                if "error" in metadata:
-                    print(metadata["error"])
-                    return
+                entry = self.rover_listings.get(circle_index, (0, {}))[1].get(selected_file)
+                if entry is not None:
+                    # Metadata came with the last refresh of the file list
+                    file_date_time = datetime.datetime.fromtimestamp(entry["mtime"])
+                    file_date = file_date_time.strftime("%Y-%m-%d")
+                    file_time = file_date_time.strftime("%H:%M:%S")
+                else:
+                    # Get file metadata from the server
+                    metadata = self.proxy_pool.call(rover_uri(ip_address), 'get_file_metadata', selected_file)
+                    if "error" in metadata:
+                        print(metadata["error"])
+                        return
 
-                file_date = metadata["date"]
-                file_time = metadata["time"]
+                    file_date = metadata["date"]
+                    file_time = metadata["time"]
 
                 # Clear existing metadata texts for the current circle index
                 for text_obj in self.metadata_texts[circle_index]:
@@ -478,29 +534,45 @@ class MainApp:
             # Get the IP address (example)
             ip_address = self.get_ip_address_for_rover(circle_index)
             if ip_address:
-                # Create proxy for FileService
-                file_service = Pyro5.api.Proxy(f"PYRO:server@{ip_address}:9090")
-                
-                # Request the file content
-                response = file_service.download_file(selected_file)
                 
-                if "error" in response:
-                    self.message_label.config(text=f"Error downloading file: {response['error']}")
-                else:
-                    # Decode the file content
-                    decoded_data = base64.b64decode(response['data'])
-                    file_data = pickle.loads(decoded_data)
-
-                    # Save the file locally
-                    with open(selected_file, 'wb') as f:
-                        f.write(file_data)
-                    self.message_label.config(text=f"File '{selected_file}' downloaded and saved successfully.")
+                # Fetch the file in chunks straight to disk, an interrupted download continues on the next attempt
+                transfer = FileTransferClient(rover_uri(ip_address))
+                try:
+                    result = transfer.download(selected_file, selected_file)
+                finally:
+                    transfer.close()
+                self.message_label.config(text=f"File '{selected_file}' downloaded and saved successfully ({result.mb_per_s:.1f} MB/s).")
             else:
                 self.message_label.config(text="IP address not found for selected Rover.")
                 
         except Exception as e:
             self.message_label.config(text=f"Error downloading file: {e}")
             
+    def sync_all_rovers(self):
+        # Runs in the background, every rover at once
+        self.sync_btn.config(state=tk.DISABLED)
+        self.message_label.config(text="Syncing show files...")
+        thread = threading.Thread(target=self.sync_show_files, daemon=True)
+        thread.start()
+
+    def sync_show_files(self, pattern="Drone *.csv"):
+        try:
+            ip_addresses = pd.read_csv('ip.csv')['IP'].tolist()
+            start = time.perf_counter()
+            reports = FleetSync([rover_uri(ip_address) for ip_address in ip_addresses]).sync('.', pattern)
+            seconds = time.perf_counter() - start
+            sent = sum(report.sent for report in reports)
+            saved = sum(report.bytes_saved for report in reports)
+            failed = [report.uri for report in reports if report.errors]
+            message = f"Synced in {seconds:.1f} s: {sent} files sent, {saved / 1e6:.2f} MB saved."
+            if failed:
+                message += f" Failed: {', '.join(failed)}"
+            self.message_label.config(text=message)
+        except Exception as e:
+            self.message_label.config(text=f"Error syncing show files: {e}")
+        finally:
+            self.sync_btn.config(state=tk.NORMAL)
+
     # Function to send the Go signal
     def send_go_signal_for_rover(self, circle_index):
        
@@ -519,52 +591,92 @@ class MainApp:
             
     def fetch_uwb_data_from_rover(self, circle_index):
         ip_address, port = self.get_ip_and_port_for_rover(circle_index)
+        uri = f"PYRO:coordinates@{ip_address}:{port}"
         
         try:
-            # Use both IP address and port in the Pyro5 Proxy connection
-            with Pyro5.api.Proxy(f"PYRO:coordinates@{ip_address}:{port}") as proxy:
+            # The rover pushes its UWB data as soon as it changes, as binary records if it can
+            for topic in ('uwb_packed', 'uwb_data'):
+                if self.telemetry.subscribe(uri, topic, lambda uwb_data: self.handle_uwb_data(circle_index, uwb_data),
+                                            max_rate=10.0) is not None:
+                    print(f"Rover {circle_index + 1}: subscribed to {topic}")
+                    return
+
+            # Rover script without subscribe(): poll instead
+            with Pyro5.api.Proxy(uri) as proxy:
+                proxy._pyroSerializer = "marshal"  # Raw bytes for get_uwb_data_packed()
+                packed = True
                 while self.is_streaming:
                     # Fetch the UWB data from the server (rover)
-                    uwb_data = proxy.get_uwb_data()  # Fetch the UWB data generated by the rover
-
-                    if uwb_data:
-                        print(f"Rover {circle_index + 1} UWB Data received: {uwb_data}")
-
+                    if packed:
                         try:
-                            # Step 1: Extract num_anchors and fetched_rover_count from the data
-                            num_anchors = int(uwb_data[1])
-                            fetched_rover_count = int(uwb_data[2])
+                            uwb_data = proxy.get_uwb_data_packed()
+                        except AttributeError:
+                            # Older rover script without binary records
+                            packed = False
+                            proxy._pyroSerializer = None
+                            continue
+                    else:
+                        uwb_data = proxy.get_uwb_data()  # Fetch the UWB data generated by the rover
+                    self.handle_uwb_data(circle_index, uwb_data)
+                    time.sleep(1)
 
-                            print(f"Rover {circle_index + 1}: Number of anchors: {num_anchors}, Fetched Rover Count: {fetched_rover_count}")
+        except Exception as e:
+            print(f"Error fetching UWB data for rover {circle_index + 1}: {e}")
 
-                            # Step 2: Process data for each rover
-                            index = 3
-                            for _ in range(fetched_rover_count):  # Process each rover's data
-                                rover_id = uwb_data[index]  # Rover ID
-                                x = float(uwb_data[index + 1])
-                                y = float(uwb_data[index + 2])
-                                z = float(uwb_data[index + 3])
+    def handle_uwb_data(self, circle_index, uwb_data):
+        if not self.is_streaming or not uwb_data:
+            return
+        if isinstance(uwb_data, (bytes, bytearray)):
+            self.handle_uwb_records(circle_index, uwb_data)
+            return
+        print(f"Rover {circle_index + 1} UWB Data received: {uwb_data}")
 
-                                # Find the corresponding circle index using rover_id
-                                if rover_id in self.rover_ids:
-                                    rover_circle_index = self.rover_ids[rover_id]
+        try:
+            # Step 1: Extract num_anchors and fetched_rover_count from the data
+            num_anchors = int(uwb_data[1])
+            fetched_rover_count = int(uwb_data[2])
 
-                                    # Log which rover's data was received by which rover
-                                    print(f"Rover {circle_index + 1} received data from Rover {rover_id}: Pos({x}, {y}, {z})")
+            print(f"Rover {circle_index + 1}: Number of anchors: {num_anchors}, Fetched Rover Count: {fetched_rover_count}")
 
-                                    # Update the UI to display the rover and source
-                                    self.window.after(0, self.update_rover_position, rover_circle_index, rover_id, x, y, z, circle_index + 1)
+            # Step 2: Process data for each rover
+            index = 3
+            for _ in range(fetched_rover_count):  # Process each rover's data
+                rover_id = uwb_data[index]  # Rover ID
+                x = float(uwb_data[index + 1])
+                y = float(uwb_data[index + 2])
+                z = float(uwb_data[index + 3])
 
-                                # Move to the next rover's data block
-                                index += 4
+                # Find the corresponding circle index using rover_id
+                if rover_id in self.rover_ids:
+                    rover_circle_index = self.rover_ids[rover_id]
 
-                        except Exception as e:
-                            print(f"Error displaying UWB data for rover {circle_index + 1}: {str(e)}")
+                    # Log which rover's data was received by which rover
+                    print(f"Rover {circle_index + 1} received data from Rover {rover_id}: Pos({x}, {y}, {z})")
 
-                    time.sleep(1)
+                    # Update the UI to display the rover and source
+                    self.window.after(0, self.update_rover_position, rover_circle_index, rover_id, x, y, z, circle_index + 1)
+
+                # Move to the next rover's data block
+                index += 4
 
         except Exception as e:
-            print(f"Error fetching UWB data for rover {circle_index + 1}: {e}")
+            print(f"Error displaying UWB data for rover {circle_index + 1}: {str(e)}")
+
+    def handle_uwb_records(self, circle_index, data):
+        # telemetry_record batch: the rover's own record first, then its neighbours
+        records = decode_batch(data)
+        if not records:
+            print(f"Rover {circle_index + 1}: invalid UWB records ({len(data)} bytes)")
+            return
+        print(f"Rover {circle_index + 1}: Number of anchors: {record_anchors(records[0].status)}, "
+              f"Rovers received: {len(records)}")
+        for record in records:
+            rover_id = rover_name(record.id)
+            if not is_valid(record.status) or rover_id not in self.rover_ids:
+                continue
+            rover_circle_index = self.rover_ids[rover_id]
+            self.window.after(0, self.update_rover_position, rover_circle_index, rover_id,
+                              record.x, record.y, record.z, circle_index + 1)
 
     # Define a method to update the UI for the rover's position and the source
     def update_rover_position(self, circle_index, rover_id, x, y, z, source_rover_id):
@@ -579,8 +691,61 @@ class MainApp:
             threads.append(thread)
             thread.start()
             
+    def start_all_rovers(self):
+        self.start_all_btn.config(state=tk.DISABLED)
+        thread = threading.Thread(target=self.run_swarm_start, daemon=True)
+        thread.start()
+
+    def run_swarm_start(self, lead=3.0, log_path="start_skew.csv"):
+        try:
+            # This computer's clock is the swarm clock, the rovers convert with their clock_sync offset
+            start_id = int(time.time()) & 0xFFFFFFFF
+            start_ns = time.time_ns() + int(lead * 1e9)
+            uris = {rover_id: rover_uri(rover.ip_address, "move") for rover_id, rover in self.rovers.items()}
+            with ThreadPoolExecutor(max_workers=max(len(uris), 1)) as executor:
+                futures = {rover_id: executor.submit(self.proxy_pool.call, uri, 'schedule_start', start_id, start_ns, True,
+                                                     timeout=2.0)
+                           for rover_id, uri in uris.items()}
+                for rover_id, future in futures.items():
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Rover {rover_id}: start not scheduled: {e}")
+            # Confirms the start; a rover that does not hear it stays put
+            send_go(start_id, start_ns)
+            self.message_label.config(text=f"Start {start_id} in {(start_ns - time.time_ns()) / 1e9:.1f} s")
+
+            time.sleep(max(0.0, (start_ns - time.time_ns()) / 1e9) + 1.0)
+            rows = []
+            for rover_id, uri in uris.items():
+                try:
+                    report = self.proxy_pool.call(uri, 'get_start_report', timeout=2.0)
+                except Exception as e:
+                    report = {'state': f"error: {e}"}
+                rows.append({'start_id': start_id, 'rover_id': rover_id, 'state': report.get('state'),
+                             'skew_ms': report.get('skew_ms'), 'clock_uncertainty_ms': report.get('clock_uncertainty_ms'),
+                             'go_received': report.get('go_received')})
+            # Kept so the skew of every show can be checked afterwards
+            pd.DataFrame(rows).to_csv(log_path, mode='a', index=False, header=not os.path.exists(log_path))
+
+            started = [row for row in rows if row['state'] == 'started']
+            if started:
+                skews = [row['skew_ms'] for row in started]
+                bound = max(abs(row['skew_ms']) + (row['clock_uncertainty_ms'] or 0) for row in started)
+                message = (f"Started {len(started)}/{len(rows)} rovers, skew {min(skews):+.2f} to {max(skews):+.2f} ms, "
+                           f"worst case with clock uncertainty {bound:.2f} ms")
+            else:
+                message = f"No rover started: {', '.join(str(row['state']) for row in rows)}"
+            self.message_label.config(text=message)
+        except Exception as e:
+            self.message_label.config(text=f"Error starting the rovers: {e}")
+        finally:
+            self.start_all_btn.config(state=tk.NORMAL)
+
     def stop_stream(self):
         self.is_streaming = False
+        self.telemetry.close()
+        self.telemetry = TelemetryClient()
         self.connect_btn.config(state=tk.NORMAL)
         self.execute_btn.config(state=tk.NORMAL)
 
@@ -591,6 +756,8 @@ class MainApp:
             
     def on_closing(self):
         self.stop_stream()
+        self.proxy_pool.print_stats()
+        self.proxy_pool.close()
         self.window.destroy()
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+'''
+rev 01 - Benchmark ble_location against the hex-string decoding of ble_manager_rev06
+'''
+
+import argparse
+import random
+import time
+
+from ble_location import decode_position, decode_location, decode_batch, encode_location
+
+def decode_hex(value):
+    # Same steps as read_characteristic() in ble_manager_rev02..rev06
+    value = bytes(value)
+    hex_values = [f'{byte:02x}' for byte in value]
+    x_coord = '0x' + str(hex_values[2]) + str(hex_values[1])
+    y_coord = '0x' + str(hex_values[6]) + str(hex_values[5])
+    z_coord = '0x' + str(hex_values[10]) + str(hex_values[9])
+    return int(x_coord, 16), int(y_coord, 16), int(z_coord, 16)
+
+def make_payloads(count, distances=False):
+    payloads = []
+    for _ in range(count):
+        x, y, z = random.randint(-2000, 70000), random.randint(-2000, 9000), random.randint(0, 500)
+        anchors = [(0x1151 + i, random.randint(100, 70000), 100) for i in range(4)] if distances else None
+        payloads.append(bytearray(encode_location(x, y, z, random.randint(40, 100), anchors)))
+    return payloads
+
+def time_it(label, func, payloads, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            func(payload)
+        best = min(best, time.perf_counter() - start)
+    per_payload_us = best / len(payloads) * 1e6
+    print(f"{label:<40} {per_payload_us:8.3f} us/payload")
+    return per_payload_us
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare ble_location with the hex-string location decoding.")
+    parser.add_argument("--payloads", type=int, default=50000, help="Number of synthetic payloads")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions, the best run is reported")
+    args = parser.parse_args()
+
+    random.seed(1)
+    payloads = make_payloads(args.payloads)
+    with_distances = make_payloads(args.payloads, distances=True)
+
+    wrong = sum(decode_hex(p) != decode_position(p)[:3] for p in payloads)
+    print(f"Hex path wrong for {wrong} of {len(payloads)} payloads (values above 65535 mm or negative)")
+
+    legacy = time_it("hex strings (x, y, z)", decode_hex, payloads, args.repeat)
+    fast = time_it("decode_position", decode_position, payloads, args.repeat)
+    print(f"Speed-up: {legacy / fast:.1f}x")
+    time_it("decode_location (position)", decode_location, payloads, args.repeat)
+    time_it("decode_location (position + 4 distances)", decode_location, with_distances, args.repeat)
+
+    for label, data in (("position", payloads), ("position + distances", with_distances)):
+        start = time.perf_counter()
+        arrays = decode_batch(data)
+        elapsed = time.perf_counter() - start
+        print(f"decode_batch ({label}): {len(arrays['x'])} payloads in {elapsed * 1000:.1f} ms "
+              f"({elapsed / len(data) * 1e6:.3f} us/payload)")
@@ -0,0 +1,164 @@
+'''
+rev 01 - Benchmark BLEDeviceManager with simulated tags: one thread + loop per tag vs one shared loop
+rev 02 - Cold (scan) and warm (cached address) time to first fix
+'''
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import statistics
+import struct
+import threading
+import tempfile
+import time
+from types import SimpleNamespace
+
+from ble_manager_rev06 import BLEDeviceManager, CHARACTERISTIC_UUID, LOC_DATA_UUID
+
+class SimulatedTag:
+    """Stands in for BleakClient: notifies a location payload at a fixed rate."""
+    def __init__(self, address, rate=10.0):
+        self.address = address
+        self.period = 1.0 / rate
+        self.is_connected = False
+        self.latencies = []     # Seconds from the due time until the manager has stored the update
+        self.task = None
+
+    async def connect(self, timeout=60.0):
+        await asyncio.sleep(0.01)
+        self.is_connected = True
+
+    async def disconnect(self):
+        if self.task is not None:
+            self.task.cancel()
+        self.is_connected = False
+
+    async def start_notify(self, uuid, callback):
+        self.task = asyncio.ensure_future(self._notify(callback))
+
+    async def stop_notify(self, uuid):
+        self.task.cancel()
+
+    async def read_gatt_char(self, uuid):
+        return bytearray(struct.pack('<BiiiB', 0, 1000, 2000, 300, 100))
+
+    async def _notify(self, callback):
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        i = 0
+        while self.is_connected:
+            due += self.period
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            start = time.perf_counter()
+            late = loop.time() - due
+            i += 1
+            callback(LOC_DATA_UUID, bytearray(struct.pack('<BiiiB', 0, 1000 + i % 500, 2000, 300, 100)))
+            self.latencies.append(late + time.perf_counter() - start)
+
+class SimulatedScanner:
+    """Stands in for BleakScanner: each simulated tag advertises after a random delay."""
+    def __init__(self, detection_callback, tags, advertising_interval=1.0):
+        self.detection_callback = detection_callback
+        self.tags = tags
+        self.advertising_interval = advertising_interval
+        self.handles = []
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        for address, name in self.tags:
+            device = SimpleNamespace(name=name, address=address)
+            advertisement = SimpleNamespace(local_name=name)
+            self.handles.append(loop.call_later(random.uniform(0.05, self.advertising_interval),
+                                                self.detection_callback, device, advertisement))
+
+    async def stop(self):
+        for handle in self.handles:
+            handle.cancel()
+
+def run_discovery(cache_path, tags, rate):
+    names = [(f"00:00:00:00:01:{i:02X}", f"Rov{i + 1}") for i in range(tags)]
+    manager = BLEDeviceManager(client_factory=lambda address: SimulatedTag(address, rate), cache_path=cache_path,
+                               scanner_factory=lambda detection_callback: SimulatedScanner(detection_callback, names))
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(tags):
+            manager.start_connection(i + 1, wait=False)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and \
+                not all('first_fix_s' in manager.get_metrics(name) for _, name in names):
+            time.sleep(0.01)
+        manager.stop_connection()
+    metrics = [manager.get_metrics(name) for _, name in names]
+    first_fix = [m['first_fix_s'] for m in metrics if 'first_fix_s' in m]
+    path = metrics[0].get('path')
+    print(f"{'cold' if path == 'scan' else 'warm'} start ({path}) {tags:>3} tags  "
+          f"time to first fix mean {statistics.mean(first_fix):5.2f} s max {max(first_fix):5.2f} s")
+
+def run(mode, tags, duration, rate):
+    clients = []
+
+    def client_factory(address):
+        client = SimulatedTag(address, rate)
+        clients.append(client)
+        return client
+
+    manager = BLEDeviceManager(client_factory=client_factory, cache_path=None)
+    tag_threads = []
+    names = [(f"00:00:00:00:00:{i:02X}", f"Rov{i + 1}") for i in range(tags)]
+    threads_before = threading.active_count()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+
+    # The handlers print the device table on every update
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'threads':
+            # What start_connection did before: one OS thread and one asyncio.run() per tag
+            for address, name in names:
+                thread = threading.Thread(target=lambda address=address, name=name: asyncio.run(
+                    manager.read_characteristic(address, name, CHARACTERISTIC_UUID, LOC_DATA_UUID)), daemon=True)
+                tag_threads.append(thread)
+                thread.start()
+        else:
+            for address, name in names:
+                manager.connect_device(address, name)
+        time.sleep(duration)
+        threads = threading.active_count() - threads_before
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+        manager.stop_event.set()
+        for client in clients:
+            client.is_connected = False
+        manager.stop_connection()
+        for thread in tag_threads:
+            thread.join(2)
+
+    latencies = sorted(l for client in clients for l in client.latencies)
+    updates = sum(manager.update_count.values())
+    p50 = latencies[len(latencies) // 2] * 1e3 if latencies else float('nan')
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e3 if latencies else float('nan')
+    rates = list(manager.get_update_rate().values())
+    print(f"{mode:<8} {tags:>4} tags {threads:>3} threads  CPU {cpu / wall * 100:5.1f} %  "
+          f"{updates / wall:7.0f} updates/s  {statistics.mean(rates) if rates else 0:5.1f} Hz/tag  "
+          f"latency p50 {p50:6.2f} ms p99 {p99:6.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare thread-per-tag and shared-loop BLE connections.")
+    parser.add_argument("--tags", type=int, nargs="+", default=[1, 4, 16], help="Numbers of simulated tags")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    parser.add_argument("--rate", type=float, default=10.0, help="Notifications per second per tag")
+    parser.add_argument("--discovery", action="store_true", help="Measure cold/warm time to first fix instead")
+    args = parser.parse_args()
+
+    if args.discovery:
+        random.seed(1)
+        print("Before: every start scanned the full 5.0 s before connecting")
+        for tags in args.tags:
+            cache_path = os.path.join(tempfile.mkdtemp(), 'ble_cache.csv')
+            run_discovery(cache_path, tags, args.rate)
+            run_discovery(cache_path, tags, args.rate)
+    else:
+        for tags in args.tags:
+            for mode in ('threads', 'shared'):
+                run(mode, tags, args.duration, args.rate)
@@ -0,0 +1,220 @@
+'''
+rev 01 - Load test of the ground station against the simulated rover fleet: CPU, UI frame rate, telemetry latency
+'''
+
+import argparse
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+import Pyro5
+import Pyro5.errors
+
+import repo_root  # noqa: F401 - imported for its side effect, the repository root on sys.path
+from proxy_pool import ProxyPool, rover_uri
+from telemetry_push import TelemetryClient
+from telemetry_record import decode_batch, is_valid, rover_name
+from clock_sync import ClockEstimator
+from fleet_simulator import rover_address
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fleet_simulator.py")
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else float('nan')
+
+def process_cpu_s(pid):
+    # utime + stime of another process, from /proc (Linux only)
+    with open(f"/proc/{pid}/stat") as file:
+        fields = file.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+class HeadlessStation:
+    """
+    Does per rover what MainApp does once connected, without Tk: a fetch_time thread with
+    clock sync every second, the 'uwb_packed' subscription to the coordinates service,
+    and a file listing refresh every few seconds. Like 01swarmcontrol it also subscribes
+    to 'coordinates_packed' of the uwb service and counts the distinct rovers named there. window.after() is a queue drained by a
+    frame loop at fps, like the Tk main loop; the frame time is the UI cost.
+    """
+    def __init__(self, rovers, port, fps=30.0, listing_every=5.0):
+        self.addresses = [rover_address(i) for i in range(rovers)]
+        self.port = port
+        self.fps = fps
+        self.listing_every = listing_every
+        self.proxy_pool = ProxyPool()
+        self.telemetry = TelemetryClient(host="127.0.0.1")
+        self.clocks = {}
+        self.rover_ids = {rover_name(i + 1): i for i in range(rovers)}
+        self.labels = [""] * rovers
+        self.ui_queue = queue.SimpleQueue()
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.latencies_ms = []
+            self.frame_ms = []
+            self.frames = 0
+            self.updates = 0
+            self.pushes = 0
+            self.errors = 0
+            self.synced = 0
+            self.uwb_names = set()
+
+    def start(self):
+        self.callbacks = []
+        for circle_index, address in enumerate(self.addresses):
+            threading.Thread(target=self.fetch_time, args=(address, circle_index + 1), daemon=True).start()
+            threading.Thread(target=self.refresh_listing, args=(address,), daemon=True).start()
+            uri = rover_uri(address, "coordinates", self.port)
+            self.callbacks.append(self.telemetry.subscribe(
+                uri, 'uwb_packed', lambda data, circle_index=circle_index: self.handle_uwb_records(circle_index, data),
+                max_rate=10.0))
+            self.telemetry.subscribe(rover_uri(address, "uwb", self.port), 'coordinates_packed',
+                                     self.handle_uwb_coordinates, max_rate=10.0)
+        threading.Thread(target=self.frame_loop, daemon=True).start()
+
+    def fetch_time(self, address, rover_id):
+        uri = rover_uri(address, "server", self.port)
+        clock = self.clocks.setdefault(rover_id, ClockEstimator())
+        get_clock = lambda: self.proxy_pool.call(uri, 'get_clock', timeout=2.0)
+        while not self.stop_event.is_set():
+            try:
+                offset_ns, uncertainty_ns = clock.measure(get_clock)
+                state = clock.state()
+                self.proxy_pool.call(uri, 'set_clock_offset', state['offset_ns'], state['drift_ppm'],
+                                     uncertainty_ns, state['t_ref_ns'], timeout=2.0)
+                with self.lock:
+                    self.synced += 1
+            except Pyro5.errors.CommunicationError:
+                with self.lock:
+                    self.errors += 1
+            self.stop_event.wait(1.0)
+
+    def refresh_listing(self, address):
+        uri = rover_uri(address, "server", self.port)
+        version = 0
+        while not self.stop_event.wait(self.listing_every):
+            try:
+                version = self.proxy_pool.call(uri, 'list_with_metadata', version, timeout=2.0)["version"]
+            except Pyro5.errors.CommunicationError:
+                with self.lock:
+                    self.errors += 1
+
+    def handle_uwb_records(self, circle_index, data):
+        records = decode_batch(data)
+        if not records:
+            return
+        with self.lock:
+            self.pushes += 1
+        for record in records:
+            rover_id = rover_name(record.id)
+            if not is_valid(record.status) or rover_id not in self.rover_ids:
+                continue
+            self.ui_queue.put((self.rover_ids[rover_id], rover_id, record.x, record.y, record.z,
+                               circle_index + 1, record.t_ns))
+
+    def handle_uwb_coordinates(self, data):
+        # 01swarmcontrol.coordinates_from_records keys the rovers by these names
+        names = {rover_name(record.id) for record in decode_batch(data) or []}
+        with self.lock:
+            self.uwb_names.update(names)
+
+    def frame_loop(self):
+        interval = 1.0 / self.fps
+        next_frame = time.monotonic()
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            latencies = []
+            # Like Tk, callbacks queued while the frame runs wait for the next frame
+            for _ in range(self.ui_queue.qsize()):
+                try:
+                    circle_index, rover_id, x, y, z, source, t_ns = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                # update_rover_position: one label text per record
+                self.labels[circle_index] = f"From Rover {source}: {rover_id}: Pos({x:.2f}, {y:.2f}, {z:.2f})"
+                latencies.append((time.time_ns() - t_ns) / 1e6)
+            with self.lock:
+                self.frames += 1
+                self.frame_ms.append((time.perf_counter() - start) * 1000)
+                self.updates += len(latencies)
+                self.latencies_ms.extend(latencies)
+            next_frame += interval
+            delay = next_frame - time.monotonic()
+            if delay < 0:
+                next_frame = time.monotonic()
+            else:
+                self.stop_event.wait(delay)
+
+    def receiving(self):
+        # Subscriptions with a push in the last 2 s
+        now = time.monotonic()
+        return sum(1 for callback in self.callbacks if callback is not None and now - callback.last_received < 2.0)
+
+    def close(self):
+        self.stop_event.set()
+        self.telemetry.close()
+        self.proxy_pool.close()
+
+def run(rovers, args):
+    command = [sys.executable, SIMULATOR, "--rovers", str(rovers), "--port", str(args.port),
+               "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+               "--failure-rate", str(args.failure_rate), "--outage-rate", str(args.outage_rate)]
+    simulator = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in simulator.stdout:
+        if line.startswith("Fleet ready"):
+            break
+    # Keep reading, a full pipe would block the simulator
+    threading.Thread(target=simulator.stdout.read, daemon=True).start()
+
+    station = HeadlessStation(rovers, args.port, args.fps)
+    try:
+        station.start()
+        time.sleep(args.warmup)
+        station.reset()
+        wall, cpu, sim_cpu = time.monotonic(), time.process_time(), process_cpu_s(simulator.pid)
+        time.sleep(args.duration)
+        wall = time.monotonic() - wall
+        cpu = time.process_time() - cpu
+        sim_cpu = process_cpu_s(simulator.pid) - sim_cpu
+        with station.lock:
+            result = {'rovers': rovers, 'gs_cpu': 100 * cpu / wall, 'sim_cpu': 100 * sim_cpu / wall,
+                      'fps': station.frames / wall, 'frame_p99': percentile(station.frame_ms, 0.99),
+                      'lat_p50': percentile(station.latencies_ms, 0.5), 'lat_p99': percentile(station.latencies_ms, 0.99),
+                      'pushes': station.pushes / wall, 'updates': station.updates / wall,
+                      'syncs': station.synced / wall, 'errors': station.errors, 'receiving': station.receiving(),
+                      'uwb_names': len(station.uwb_names & set(station.rover_ids)),
+                      'threads': threading.active_count()}
+    finally:
+        station.close()
+        simulator.terminate()
+        simulator.wait(timeout=10)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ground station load against 10, 50, 200 simulated rovers.")
+    parser.add_argument("--rovers", type=int, nargs="+", default=[10, 50, 200], help="Fleet sizes to run")
+    parser.add_argument("--port", type=int, default=9090, help="Port of the simulated rovers")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds measured per fleet size")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds before measuring")
+    parser.add_argument("--fps", type=float, default=30.0, help="Target UI frame rate")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Simulated mean extra latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of simulated calls that fail")
+    parser.add_argument("--outage-rate", type=float, default=0.0, help="Simulated outages per rover and hour")
+    args = parser.parse_args()
+
+    print(f"{'rovers':>6} {'GS cpu%':>8} {'sim cpu%':>9} {'fps':>6} {'frame p99':>10} {'lat p50':>8} {'lat p99':>8} "
+          f"{'pushes/s':>9} {'updates/s':>10} {'syncs/s':>8} {'errors':>7} {'receiving':>10} {'uwb names':>10} {'threads':>8}")
+    for rovers in args.rovers:
+        r = run(rovers, args)
+        print(f"{r['rovers']:6d} {r['gs_cpu']:8.1f} {r['sim_cpu']:9.1f} {r['fps']:6.1f} {r['frame_p99']:8.2f}ms "
+              f"{r['lat_p50']:6.1f}ms {r['lat_p99']:6.1f}ms {r['pushes']:9.1f} {r['updates']:10.1f} {r['syncs']:8.1f} "
+              f"{r['errors']:7d} {r['receiving']:6d}/{r['rovers']:<3d} {r['uwb_names']:6d}/{r['rovers']:<3d} "
+              f"{r['threads']:8d}", flush=True)
@@ -0,0 +1,60 @@
+'''
+rev 01 - Benchmark a fresh Pyro5 proxy per call against the pooled proxies of ProxyPool
+'''
+
+import argparse
+import threading
+import time
+
+import Pyro5.api
+
+from proxy_pool import ProxyPool, rover_uri
+
+@Pyro5.api.expose
+class SimulatedServer:
+    def get_server_time(self):
+        return time.strftime("%H:%M:%S %p")
+
+def run_fresh(uri, calls):
+    # What the ground station handlers did: new proxy, connect, handshake, call
+    start = time.perf_counter()
+    for _ in range(calls):
+        proxy = Pyro5.api.Proxy(uri)
+        proxy.get_server_time()
+        proxy._pyroRelease()
+    return (time.perf_counter() - start) / calls
+
+def run_pooled(pool, uri, calls, threads):
+    def worker():
+        for _ in range(calls // threads):
+            pool.call(uri, 'get_server_time')
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    return (time.perf_counter() - start) / (calls // threads * threads)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a new Pyro5 proxy per call with ProxyPool on localhost.")
+    parser.add_argument("--calls", type=int, default=2000, help="Calls per run")
+    parser.add_argument("--threads", type=int, default=4, help="Threads sharing the pool")
+    args = parser.parse_args()
+
+    daemon = Pyro5.api.Daemon(host="127.0.0.1")
+    daemon.register(SimulatedServer(), "server")
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+    uri = rover_uri("127.0.0.1", port=daemon.locationStr.split(":")[1])
+
+    pool = ProxyPool()
+    fresh = run_fresh(uri, args.calls)
+    pooled = run_pooled(pool, uri, args.calls, 1)
+    pooled_threads = run_pooled(pool, uri, args.calls, args.threads)
+    print(f"fresh proxy per call      {fresh * 1000:6.3f} ms/call")
+    print(f"pooled, 1 thread          {pooled * 1000:6.3f} ms/call  ({fresh / pooled:.1f}x)")
+    print(f"pooled, {args.threads} threads         {pooled_threads * 1000:6.3f} ms/call")
+    pool.print_stats()
+    pool.close()
+    daemon.shutdown()
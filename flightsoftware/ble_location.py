@@ -0,0 +1,161 @@
+'''
+rev 01 - Decoder for the DWM1001 BLE location characteristic (position, distances or both)
+'''
+
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# First byte of the payload
+LOCATION_POSITION = 0       # x, y, z [mm] int32 + quality uint8
+LOCATION_DISTANCES = 1      # count uint8 + count * (node ID uint16, distance [mm] uint32, quality uint8)
+LOCATION_BOTH = 2           # position followed by distances
+
+_POSITION = struct.Struct('<iiiB')
+_DISTANCE = struct.Struct('<HIB')
+_COUNT = struct.Struct('<B')
+
+# distances is a list of (node_id, distance_mm, quality), position fields are None for LOCATION_DISTANCES
+BleLocation = namedtuple('BleLocation', ['x', 'y', 'z', 'quality', 'distances'])
+
+def decode_position(payload):
+    """
+    Decodes only the position, the per-sample path of BLEDeviceManager.
+    Args:
+        payload (bytes | bytearray | memoryview): Location characteristic value.
+    Returns:
+        tuple: (x, y, z, quality) in mm, or None if the payload has no position.
+    """
+    if len(payload) < 14 or payload[0] == LOCATION_DISTANCES:
+        return None
+    return _POSITION.unpack_from(payload, 1)
+
+def decode_location(payload):
+    """
+    Decodes every layout of the location characteristic.
+    Returns:
+        BleLocation: Position and/or distances, or None if the payload is truncated.
+    """
+    size = len(payload)
+    if size < 1:
+        return None
+    kind = payload[0]
+    offset = 1
+    x = y = z = quality = None
+    if kind != LOCATION_DISTANCES:
+        if size < offset + _POSITION.size:
+            return None
+        x, y, z, quality = _POSITION.unpack_from(payload, offset)
+        offset += _POSITION.size
+    distances = []
+    if kind != LOCATION_POSITION and size > offset:
+        count = _COUNT.unpack_from(payload, offset)[0]
+        offset += 1
+        if size < offset + count * _DISTANCE.size:
+            return None
+        for i in range(count):
+            distances.append(_DISTANCE.unpack_from(payload, offset + i * _DISTANCE.size))
+    return BleLocation(x, y, z, quality, distances)
+
+def _record_dtype(kind, count):
+    fields = [('type', 'u1')]
+    if kind != LOCATION_DISTANCES:
+        fields += [('x', '<i4'), ('y', '<i4'), ('z', '<i4'), ('quality', 'u1')]
+    if kind != LOCATION_POSITION:
+        fields += [('count', 'u1'), ('distances', [('id', '<u2'), ('distance', '<u4'), ('quality', 'u1')], (count,))]
+    return np.dtype(fields)
+
+def _decode_uniform(payloads, max_anchors, scale):
+    # Payloads with the same layout and anchor count decode in one frombuffer call
+    first = payloads[0] if payloads else None
+    if first is None or len(first) < 1:
+        return None
+    kind = first[0]
+    count = 0
+    if kind != LOCATION_POSITION:
+        offset = 1 if kind == LOCATION_DISTANCES else 1 + _POSITION.size
+        if len(first) <= offset:
+            return None
+        count = first[offset]
+    dtype = _record_dtype(kind, count)
+    size = dtype.itemsize
+    if any(len(p) != size or p[0] != kind for p in payloads):
+        return None
+    records = np.frombuffer(b''.join(payloads), dtype=dtype)
+    n = len(records)
+    if kind != LOCATION_POSITION and np.any(records['count'] != count):
+        return None
+
+    arrays = {
+        'x': np.full(n, np.nan),
+        'y': np.full(n, np.nan),
+        'z': np.full(n, np.nan),
+        'quality': np.full(n, np.nan),
+        'num_anchors': np.full(n, count, dtype=np.int32),
+        'anchor_ids': np.zeros((n, max_anchors), dtype=np.int32),
+        'distances': np.full((n, max_anchors), np.nan),
+    }
+    if kind != LOCATION_DISTANCES:
+        arrays['x'] = records['x'] * scale
+        arrays['y'] = records['y'] * scale
+        arrays['z'] = records['z'] * scale
+        arrays['quality'] = records['quality'].astype(np.float64)
+    kept = min(count, max_anchors)
+    if kept:
+        arrays['anchor_ids'][:, :kept] = records['distances']['id'][:, :kept]
+        arrays['distances'][:, :kept] = records['distances']['distance'][:, :kept] * scale
+    return arrays
+
+def decode_batch(payloads, max_anchors=4, scale=1.0):
+    """
+    Decodes captured payloads into arrays, e.g. a whole session for analysis.
+    Args:
+        payloads (list): Location characteristic values.
+        max_anchors (int, optional): Distance columns kept per sample. Defaults to 4.
+        scale (float, optional): Multiplier for the millimeter values, 0.001 gives meters.
+    Returns:
+        dict: x, y, z, quality (n,), num_anchors (n,), anchor_ids (n, max_anchors) and
+        distances (n, max_anchors). Missing values are NaN, missing IDs are 0.
+        A capture with a single layout and anchor count is decoded without a Python loop.
+    """
+    n = len(payloads)
+    arrays = _decode_uniform(payloads, max_anchors, scale)
+    if arrays is not None:
+        return arrays
+
+    arrays = {
+        'x': np.full(n, np.nan),
+        'y': np.full(n, np.nan),
+        'z': np.full(n, np.nan),
+        'quality': np.full(n, np.nan),
+        'num_anchors': np.zeros(n, dtype=np.int32),
+        'anchor_ids': np.zeros((n, max_anchors), dtype=np.int32),
+        'distances': np.full((n, max_anchors), np.nan),
+    }
+    for i, payload in enumerate(payloads):
+        location = decode_location(payload)
+        if location is None:
+            continue
+        if location.x is not None:
+            arrays['x'][i] = location.x * scale
+            arrays['y'][i] = location.y * scale
+            arrays['z'][i] = location.z * scale
+            arrays['quality'][i] = location.quality
+        arrays['num_anchors'][i] = len(location.distances)
+        for j, (node_id, distance, _) in enumerate(location.distances[:max_anchors]):
+            arrays['anchor_ids'][i, j] = node_id
+            arrays['distances'][i, j] = distance * scale
+    return arrays
+
+def encode_location(x=None, y=None, z=None, quality=100, distances=None):
+    """
+    Builds a payload, for simulated tags. Position only when distances is None,
+    distances only when x is None.
+    """
+    if distances is None:
+        return bytes([LOCATION_POSITION]) + _POSITION.pack(int(x), int(y), int(z), quality)
+    body = _COUNT.pack(len(distances)) + b''.join(_DISTANCE.pack(node_id, int(d), q) for node_id, d, q in distances)
+    if x is None:
+        return bytes([LOCATION_DISTANCES]) + body
+    return bytes([LOCATION_BOTH]) + _POSITION.pack(int(x), int(y), int(z), quality) + body
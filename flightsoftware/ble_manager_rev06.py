@@ -1,134 +1,437 @@
 import asyncio
+import csv
+import os
 import threading
 import time
-import pandas as pd
 import numpy as np
 import datetime
-import pygame
 import math
 from bleak import BleakClient, BleakScanner
 from collections import deque
 from filterpy.kalman import KalmanFilter
 from scipy.signal import butter, filtfilt, savgol_filter
+import repo_root  # noqa: F401 - imported for its side effect, the repository root on sys.path
+from ble_location import decode_position
+from device_state import DeviceStateTable
+from position_source import BleSource, SerialSource, PositionMux
+from timebase import now_ns
+
+CHARACTERISTIC_UUID = '680c21d9-c946-4c1f-9c11-baa1c21329e7'
+LOC_DATA_UUID = '003bbdf2-c634-4b3d-ab56-7ec889b89a37'
+# Tag name -> MAC address of every tag found so far, known tags are connected without scanning
+BLE_CACHE_PATH = 'ble_cache.csv'
+
+def load_address_cache(file_path=BLE_CACHE_PATH):
+    """
+    Returns:
+        dict: Tag name -> address, empty if the cache file does not exist yet.
+    """
+    try:
+        with open(file_path, mode='r', newline='') as file:
+            return {row['Name']: row['Address'] for row in csv.DictReader(file)}
+    except (OSError, KeyError):
+        return {}
+
+def save_address_cache(cache, file_path=BLE_CACHE_PATH):
+    with open(file_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Name', 'Address'])
+        for name, address in sorted(cache.items()):
+            writer.writerow([name, address])
 
 class BLEDeviceManager:
-    def __init__(self):
+    def __init__(self, use_notify=True, notify_timeout=5.0, client_factory=BleakClient, scale=1.0, record=False,
+                 cache_path=BLE_CACHE_PATH, scanner_factory=BleakScanner):
+        """
+        Scanning and every tag connection run as tasks on one asyncio loop owned by a
+        background thread. Synchronous callers use start_connection(), connect_device(),
+        submit() and stop_connection().
+        Args:
+            use_notify (bool, optional): Subscribe to location notifications instead of polling
+                read_gatt_char. Tags that do not notify fall back to polling. Defaults to True.
+            notify_timeout (float, optional): Seconds without a notification after which the
+                connection falls back to polling. Defaults to 5.0.
+            client_factory (callable, optional): Creates the client for an address, BleakClient
+                unless simulated tags are used.
+            scale (float, optional): Multiplier for the tag's millimeters, 0.001 gives meters. Defaults to 1.0.
+            record (bool, optional): Keep every sample for get_history() / save_to_csv(). Defaults to False.
+            cache_path (str, optional): CSV of known tag addresses, None disables the cache.
+            scanner_factory (callable, optional): Creates the scanner from a detection callback,
+                BleakScanner unless simulated tags are used.
+        """
         self.filtered_devices = []
-        self.device_info = pd.DataFrame(columns=['Name', 'Status', 'X', 'Y', 'Z', 'Time'])
-        self.num_connected = 0
+        self.states = DeviceStateTable(record=record)
+        self.scale = scale
         self.lock = threading.Lock()
         self.connected = False
         self.xr = 0
         self.yr = 0
-
-    async def scan_for_devices(self, scan_time=5.0, name_filters=''):
-        print("Scanning for devices...")
-        scanner = BleakScanner()
-
+        self.use_notify = use_notify
+        self.notify_timeout = notify_timeout
+        # Per device: 'notify' or 'poll', update counters and the achieved update rate [Hz]
+        self.update_mode = {}
+        self.update_count = {}
+        self.update_rate = {}
+        self._rate_window = {}
+        self.client_factory = client_factory
+        self.loop = None
+        self.loop_thread = None
+        self.tasks = {}
+        self.stop_event = threading.Event()
+        self.scanner_factory = scanner_factory
+        self.cache_path = cache_path
+        self.address_cache = load_address_cache(cache_path) if cache_path else {}
+        # Per tag: discovery path ('cache' or 'scan'), scan time and time to first fix [s]
+        self.metrics = {}
+        self._connect_start = {}
+        self.listeners = []
+
+    async def find_devices(self, name_filters, timeout=5.0, exact=False):
+        """
+        Scans until a tag matching one of name_filters advertises, instead of always
+        waiting the full scan time.
+        Args:
+            name_filters (list): Tag names, or parts of names unless exact is True.
+            timeout (float, optional): Give up after this many seconds. Defaults to 5.0.
+            exact (bool, optional): Match whole names only, so Rov1 does not match Rov12.
+        Returns:
+            list: The matching devices seen, empty on timeout.
+        """
+        found = asyncio.Event()
+        devices = []
+
+        def detection_callback(device, advertisement_data):
+            name = device.name or advertisement_data.local_name
+            if not name or found.is_set():
+                return
+            if any(name == name_filter if exact else name_filter in name for name_filter in name_filters):
+                devices.append(device)
+                found.set()
+
+        scanner = self.scanner_factory(detection_callback=detection_callback)
         await scanner.start()
-        await asyncio.sleep(scan_time)
-        await scanner.stop()
+        try:
+            await asyncio.wait_for(found.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await scanner.stop()
+        return devices
+
+    async def scan_for_devices(self, name_filters, scan_time=5.0):
+        """
+        Scans for the first tag matching name_filters and adds it to filtered_devices.
+        Args:
+            name_filters (list): Tag names or parts of names, e.g. ['Rov4'].
+            scan_time (float, optional): Give up after this many seconds. Defaults to 5.0.
+        Returns:
+            bool: True if a tag was found.
+        """
+        print("Scanning for devices...")
+        devices = await self.find_devices(name_filters, timeout=scan_time)
+        if not devices:
+            print("=" * 50)
+            return False
+        device = devices[0]
+        print(f"Found device: {device.name} ({device.address})")
+        self.filtered_devices.append(device)
+        return True
+
+    def _cache_address(self, device_name, device_address):
+        if self.cache_path is None or self.address_cache.get(device_name) == device_address:
+            return
+        self.address_cache[device_name] = device_address
+        try:
+            save_address_cache(self.address_cache, self.cache_path)
+        except OSError as e:
+            print(f"Could not write {self.cache_path}: {e}")
+
+    def _first_fix(self, device_name):
+        start = self._connect_start.get(device_name)
+        metrics = self.metrics.setdefault(device_name, {'path': 'direct', 'scan_s': 0.0})
+        if start is None or 'first_fix_s' in metrics:
+            return
+        metrics['first_fix_s'] = (now_ns() - start) / 1e9
+        print(f"{device_name} first fix after {metrics['first_fix_s']:.2f} s "
+              f"({'warm, cached address' if metrics['path'] == 'cache' else 'cold, ' + metrics['path']})")
+
+    def get_metrics(self, device_name=None):
+        """
+        Returns:
+            dict: Discovery metrics of one tag, or of every tag by name: path ('cache' = warm
+            start, 'scan' = cold start), scan_s and first_fix_s, the seconds from
+            start_connection() to the first position.
+        """
+        if device_name is None:
+            return {name: dict(metrics) for name, metrics in self.metrics.items()}
+        return dict(self.metrics.get(device_name, {}))
+
+    def handle_location(self, device_name, value):
+        """Stores one location characteristic value, from a notification or a read."""
+        self._count_update(device_name)
+        position = decode_position(value)
+        if position is None:
+            # Distances-only layout, the tag has no position of its own
+            return
+        x_dec, y_dec, z_dec, quality = position
+
+        if self.scale != 1.0:
+            x_dec *= self.scale
+            y_dec *= self.scale
+            z_dec *= self.scale
+       
+        self.xr = x_dec
+        self.yr = y_dec
+        #print("xr", self.xr)
+        #print("yr", self.yr)
+
+        slot = self.states.slot(device_name)
+        if self.states.rows[slot].count == 0:
+            self._first_fix(device_name)
+        self.states.update(slot, x_dec, y_dec, z_dec, now_ns())
+        for listener in self.listeners:
+            listener(self.states.rows[slot])
+
+    def add_listener(self, callback):
+        """
+        Calls callback(DeviceSample) for every new position, from the BLE loop thread.
+        The callback must not block, e.g. only hand the sample to a TelemetryPublisher.
+        """
+        self.listeners.append(callback)
+
+    def _count_update(self, device_name):
+        now = now_ns()
+        self.update_count[device_name] = self.update_count.get(device_name, 0) + 1
+        window_start, window_count = self._rate_window.get(device_name, (now, 0))
+        window_count += 1
+        if now - window_start >= 1_000_000_000:
+            self.update_rate[device_name] = window_count * 1e9 / (now - window_start)
+            window_start, window_count = now, 0
+        self._rate_window[device_name] = (window_start, window_count)
+
+    def get_update_rate(self, device_name=None):
+        """
+        Returns:
+            float | dict: Achieved updates per second of one device, or of every device by name.
+        """
+        if device_name is None:
+            return dict(self.update_rate)
+        return self.update_rate.get(device_name, 0.0)
+
+    async def _notify_locations(self, client, device_name, locData_uuid):
+        """Receives location notifications until the link drops. Returns False if the tag does not notify."""
+        try:
+            await client.start_notify(locData_uuid, lambda sender, data: self.handle_location(device_name, data))
+        except Exception as e:
+            print(f"{device_name} does not support notifications ({e}), polling instead")
+            return False
+
+        self.update_mode[device_name] = 'notify'
+        last_count = self.update_count.get(device_name, 0)
+        last_update = time.monotonic()
+        while client.is_connected:
+            await asyncio.sleep(0.5)
+            count = self.update_count.get(device_name, 0)
+            if count != last_count:
+                last_count, last_update = count, time.monotonic()
+            elif time.monotonic() - last_update > self.notify_timeout:
+                print(f"No notifications from {device_name} for {self.notify_timeout} s, polling instead")
+                try:
+                    await client.stop_notify(locData_uuid)
+                except Exception:
+                    pass
+                return False
+        return True
+
+    async def _poll_locations(self, client, device_name, locData_uuid):
+        """Reads the location characteristic in a loop until the link drops."""
+        self.update_mode[device_name] = 'poll'
+        while client.is_connected:
+            try:
+                value = await client.read_gatt_char(locData_uuid)
+                self.handle_location(device_name, value)
+                await asyncio.sleep(0.05)
 
-        devices = scanner.discovered_devices_and_advertisement_data
-        for info, advertisement_data in devices.items():
-            device = advertisement_data[0]
-            if device.name and any(name_filter in device.name for name_filter in name_filters):
-                print(f"Found device: {device.name} ({device.address})")
-                self.filtered_devices.append(device)
-               
-                return True
-               
-        print("=" * 50)
+            except Exception as e:
+                print(f"Error reading from {device_name}: {e}")
+                break
 
     async def read_characteristic(self, device_address, device_name, characteristic_uuid, locData_uuid):
-        while True:
-            client = BleakClient(device_address)
+        while not self.stop_event.is_set():
+            client = self.client_factory(device_address)
+            # A cached address may be stale, do not wait the full minute before scanning
+            from_cache = self.address_cache.get(device_name) == device_address and \
+                self.metrics.get(device_name, {}).get('path') == 'cache' and 'first_fix_s' not in self.metrics[device_name]
             try:
-                await client.connect(timeout=60.0)
+                await client.connect(timeout=10.0 if from_cache else 60.0)
                 print(f"Connected to {device_name} at {device_address}")
 
-                with self.lock:
-                    if device_name not in self.device_info['Name'].values:
-                        self.device_info.loc[self.num_connected, 'Name'] = device_name
-                        self.num_connected += 1
-                    self.device_info.loc[self.device_info['Name'] == device_name, 'Status'] = 'Connected'
-                   
+                self.states.set_status(device_name, 'Connected')
                 self.connected = True
 
-                while client.is_connected:
-                    try:
-                        value = bytes(await client.read_gatt_char(locData_uuid))
-                        hex_values = [f'{byte:02x}' for byte in value]
-                        x_coord = '0x' + str(hex_values[2]) + str(hex_values[1])
-                        y_coord = '0x' + str(hex_values[6]) + str(hex_values[5])
-                        z_coord = '0x' + str(hex_values[10]) + str(hex_values[9])
-
-                        x_dec = int(x_coord, 16)
-                        y_dec = int(y_coord, 16)
-                        z_dec = int(z_coord, 16)
-                       
-                        self.xr = x_dec
-                        self.yr = y_dec
-                        #print("xr", self.xr)
-                        #print("yr", self.yr)
-                       
-                        with self.lock:
-                            self.device_info.loc[self.device_info['Name'] == device_name, 'X'] = x_dec
-                            self.device_info.loc[self.device_info['Name'] == device_name, 'Y'] = y_dec
-                            self.device_info.loc[self.device_info['Name'] == device_name, 'Z'] = z_dec
-                            self.device_info.loc[self.device_info['Name'] == device_name, 'Time'] = datetime.datetime.now()
-
-                        print(f"Updated device_info:\n{self.device_info}")
-
-                        await asyncio.sleep(0.05)
-
-                    except Exception as e:
-                        print(f"Error reading from {device_name}: {e}")
-                        break
+                notified = self.use_notify and await self._notify_locations(client, device_name, locData_uuid)
+                if not notified and client.is_connected:
+                    await self._poll_locations(client, device_name, locData_uuid)
 
             except Exception as e:
                 print(f"Failed to connect to {device_name} at {device_address}: {e}")
+                if from_cache:
+                    print(f"Cached address of {device_name} did not connect, scanning")
+                    address = await self._scan_for_tag(device_name)
+                    if address is not None:
+                        device_address = address
+                        continue
 
             finally:
                 await client.disconnect()
                 print(f"Disconnected from {device_name} at {device_address}")
-                with self.lock:
-                    self.device_info.loc[self.device_info['Name'] == device_name, 'Status'] = 'Disconnected'
+                self.states.set_status(device_name, 'Disconnected')
 
+            if self.stop_event.is_set():
+                break
             await asyncio.sleep(10)
 
-    def start_connection(self, id_rover):
-        async def inner():
-            #name_filters = ["Anc", "Rov"]
-            rover_id = "Rov" + str(id_rover)
+    def start_loop(self):
+        """Starts the loop thread if it is not running yet and returns the loop."""
+        with self.lock:
+            if self.loop is not None:
+                return self.loop
+            ready = threading.Event()
+
+            def run():
+                self.loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self.loop)
+                ready.set()
+                self.loop.run_forever()
+                self.loop.close()
+
+            self.stop_event.clear()
+            self.loop_thread = threading.Thread(target=run, name="ble-loop", daemon=True)
+            self.loop_thread.start()
+            ready.wait()
+            return self.loop
+
+    def submit(self, coro):
+        """
+        Runs a coroutine on the manager loop from any thread.
+        Returns:
+            concurrent.futures.Future: Call .result() to wait for it.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.start_loop())
+
+    def _add_task(self, device_address, device_name):
+        # Runs on the loop thread, one connection task per tag
+        task = self.tasks.get(device_name)
+        if task is not None and not task.done():
+            return
+        self.tasks[device_name] = self.loop.create_task(
+            self.read_characteristic(device_address, device_name, CHARACTERISTIC_UUID, LOC_DATA_UUID))
+
+    def connect_device(self, device_address, device_name):
+        """Starts the connection task for a known tag without scanning. Thread-safe."""
+        self.start_loop().call_soon_threadsafe(self._add_task, device_address, device_name)
+
+    async def _scan_for_tag(self, rover_id, scan_time=5.0):
+        # Scans until the tag shows up, records the scan time and caches the address
+        start = now_ns()
+        while not self.stop_event.is_set():
+            devices = await self.find_devices([rover_id], timeout=scan_time, exact=True)
+            if devices:
+                device = devices[0]
+                print(f"Found device: {device.name} ({device.address})")
+                self.filtered_devices.append(device)
+                metrics = self.metrics.setdefault(rover_id, {})
+                metrics['path'] = 'scan'
+                metrics['scan_s'] = (now_ns() - start) / 1e9
+                self._cache_address(rover_id, device.address)
+                return device.address
+            print("=" * 50)
+        return None
+
+    async def _find_and_connect(self, id_rover):
+        rover_id = "Rov" + str(id_rover)
+        self._connect_start[rover_id] = now_ns()
+        address = self.address_cache.get(rover_id)
+        if address is not None:
+            print(f"Connecting to {rover_id} at cached address {address}")
+            self.metrics[rover_id] = {'path': 'cache', 'scan_s': 0.0}
+        else:
             print("Searching for", rover_id)
-            name_filters = [rover_id]
-            isFound = False
-            while not isFound:
-                isFound = await self.scan_for_devices(name_filters=name_filters)
-
-            characteristic_uuid = '680c21d9-c946-4c1f-9c11-baa1c21329e7'
-            locData_uuid = '003bbdf2-c634-4b3d-ab56-7ec889b89a37'
-            data_threads = []
-
-            for device in self.filtered_devices:
-                device_name = device.name
-                device_address = device.address
-               
-                data_thread = threading.Thread(target=lambda: asyncio.run(
-                    self.read_characteristic(device_address, device_name, characteristic_uuid, locData_uuid)), daemon=True)
-                data_threads.append(data_thread)
-                data_thread.start()
-
-        asyncio.run(inner())
+            address = await self._scan_for_tag(rover_id)
+            if address is None:
+                return
+        self._add_task(address, rover_id)
+    def start_connection(self, id_rover, wait=True):
+        """
+        Scans for RovN and connects to it on the manager loop.
+        Args:
+            id_rover (int): Rover number, the tag is named "Rov<id_rover>".
+            wait (bool, optional): Block until the tag was found. Defaults to True.
+        Returns:
+            concurrent.futures.Future: The scan, already finished when wait is True.
+        """
+        future = self.submit(self._find_and_connect(id_rover))
+        if wait:
+            future.result()
+        return future
+
+    async def _cancel_tasks(self):
+        tasks = [task for task in self.tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        # Let every task run its finally block so the tags are disconnected
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks.clear()
+
+    def stop_connection(self, timeout=5.0):
+        """Disconnects every tag and stops the loop thread."""
+        if self.loop is None:
+            return
+        self.stop_event.set()
+        try:
+            self.submit(self._cancel_tasks()).result(timeout)
+        except Exception as e:
+            print(f"Error stopping BLE tasks: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join(timeout)
+        self.loop = None
+        self.loop_thread = None
+
+    def get_position(self, device_name):
+        """
+        Latest sample of one tag. Lock-free, cheap enough to call every control cycle.
+        Returns:
+            DeviceSample: (name, status, x, y, z, t_ns, count), or None before the tag was seen.
+            x/y/z are None until the first position arrived.
+        """
+        return self.states.get(device_name)
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: Latest DeviceSample of every tag.
+        """
+        return self.states.snapshot()
 
     def get_device_info(self):
-        with self.lock:
-            return self.device_info.copy()
+        """Exports the latest samples as a pandas DataFrame. Slow, meant for saving and debugging."""
+        return self.states.to_dataframe()
+
+    def get_history(self):
+        """Every sample received since start as a DataFrame, needs record=True."""
+        return self.states.history_dataframe()
+
+    def save_to_csv(self, file_path):
+        history = self.get_history()
+        history.to_csv(file_path, header=True, index=False)
+        print(f"Saved {len(history)} entries to {file_path}")
+
+    def get_latest_coordinates(self):
+        return self.xr, self.yr
 
     def is_connected(self):
-        with self.lock:
-            return self.connected, self.device_info.copy()
+        """True while at least one tag is connected."""
+        return any(row.status == 'Connected' for row in self.states.snapshot())
         
 import serial
 import struct
@@ -178,15 +481,30 @@ class SerialReader:
 
         
         
-def run_pygame_visualization(ble_manager):
+def run_pygame_visualization(ble_manager, serial_port=None):
+    """
+    Draws the rover from whichever source is fresher: the BLE tag or, as fallback,
+    the tag on serial_port. Both are read in the background, the render loop never waits.
+    """
+    import pygame
+
+    sources = [BleSource(ble_manager)]
+    if serial_port:
+        sources.append(SerialSource(serial_port))
+    positions = PositionMux(sources)
+    positions.start()
+
     pygame.init()
     screen = pygame.display.set_mode((1500, 750))
     pygame.display.set_caption("BLE Rover Coordinates")
+    clock = pygame.time.Clock()
     
     real_width = 1500
     real_height = 750
     
     red = (255, 0, 0)
+    blue = (0, 0, 255)
+    colors = {'ble': red, 'serial': blue}
     font = pygame.font.Font(None, 36)
 
 
@@ -198,55 +516,36 @@ def run_pygame_visualization(ble_manager):
 
         screen.fill((255, 255, 255))  # Clear the screen with black
 
-        connected, device_info = ble_manager.is_connected()
+        fix = positions.latest()
         
-        if connected:
-            # Display BLE data if connected
-            x = device_info['X'].values[0] if not math.isnan(device_info['X'].values[0]) else None
-            y = device_info['Y'].values[0] if not math.isnan(device_info['Y'].values[0]) else None
+        if fix is not None and not math.isnan(fix.x) and not math.isnan(fix.y):
+            color = colors.get(fix.source, red)
+
+            # Convert coordinates to screen space
+            screen_x = int(fix.x % real_width)
+            screen_y = int(fix.y % real_height)
             
-            if x is not None and y is not None and isinstance(x, (int, float)) and isinstance(y, (int, float)):
-                if not math.isnan(x) and not math.isnan(y):
-                    # Convert BLE coordinates to screen space
-                    screen_x = int(x % real_width)
-                    screen_y = int(y % real_height)
-                    
-                    # Draw the rover as a circle
-                    pygame.draw.circle(screen, red, (screen_x, screen_y), 10)
-                    
-                    # Render BLE coordinates text
-                    coords_text = font.render(f"BLE: ({int(x)}, {int(y)})", True, red)
-                    screen.blit(coords_text, (10, 10))
-        else:
-            # If not connected to BLE, use Serial data
-            serial_data = serial_reader.get_latest_data()  # Get the latest data from the SerialReader
-            if serial_data:
-                x = serial_data['X']
-                y = serial_data['Y']
-                
-                if isinstance(x, (int, float)) and isinstance(y, (int, float)):
-                    # Convert Serial coordinates to screen space
-                    screen_x = int(x % real_width)
-                    screen_y = int(y % real_height)
-                    
-                    # Draw the rover as a circle (use a different color for Serial data)
-                    pygame.draw.circle(screen, blue, (screen_x, screen_y), 10)
-                    
-                    # Render Serial coordinates text
-                    coords_text = font.render(f"Serial: ({int(x)}, {int(y)})", True, blue)
-                    screen.blit(coords_text, (10, 10))
+            # Draw the rover as a circle, the color shows the source
+            pygame.draw.circle(screen, color, (screen_x, screen_y), 10)
+            
+            # Render coordinates text with source and sample age
+            coords_text = font.render(f"{fix.source.upper()}: ({int(fix.x)}, {int(fix.y)}) {fix.age * 1000:.0f} ms",
+                                      True, color)
+            screen.blit(coords_text, (10, 10))
                         
         pygame.display.update()
+        clock.tick(60)
 
+    positions.stop()
     pygame.quit()
     
     
 if __name__ == "__main__":
     ble_manager = BLEDeviceManager()
 
-    # Start BLE connection in a separate thread to avoid blocking the main thread
-    ble_thread = threading.Thread(target=ble_manager.start_connection(id_rover=3))
-    ble_thread.start()
+    # Scanning and the connection run on the manager's own loop thread
+    ble_manager.start_connection(id_rover=3, wait=False)
 
-    # Run the Pygame visualization
-    run_pygame_visualization(ble_manager)
\ No newline at end of file
+    # Run the Pygame visualization, with the USB tag as fallback
+    run_pygame_visualization(ble_manager, serial_port=os.environ.get("UWB_PORT", "COM6"))
+    ble_manager.stop_connection()
@@ -0,0 +1,108 @@
+'''
+rev 01 - Live per-tag state for BLEDeviceManager: fixed slots, lock-free reads, DataFrame export on request
+'''
+
+import threading
+from collections import namedtuple
+
+import repo_root  # noqa: F401 - imported for its side effect, the repository root on sys.path
+from position_history import PositionHistory
+from timebase import format_ns, to_datetime
+
+# One immutable row per tag. Writers replace the whole row, so a reader always sees a
+# consistent sample without taking a lock.
+DeviceSample = namedtuple('DeviceSample', ['name', 'status', 'x', 'y', 'z', 't_ns', 'count'])
+
+class DeviceStateTable:
+    """
+    Latest sample of every tag. Each tag name gets a fixed slot when it is first seen,
+    updates only swap the row in that slot.
+    """
+    __slots__ = ('names', 'index', 'rows', 'lock', 'record', 'history_capacity', 'history')
+
+    def __init__(self, capacity=16, record=False, history_capacity=6000):
+        """
+        Args:
+            capacity (int, optional): Slots reserved up front, more are added if needed. Defaults to 16.
+            record (bool, optional): Also keep every sample for history_dataframe() / save_to_csv().
+            history_capacity (int, optional): Samples kept per tag when recording. Defaults to 6000.
+        """
+        self.names = []
+        self.index = {}
+        self.rows = [None] * capacity
+        self.lock = threading.Lock()    # Only taken when a new tag is added
+        self.record = record
+        self.history_capacity = history_capacity
+        self.history = {}
+
+    def slot(self, name):
+        """Returns the fixed slot of a tag, adding it on first use."""
+        i = self.index.get(name)
+        if i is not None:
+            return i
+        with self.lock:
+            i = self.index.get(name)
+            if i is None:
+                i = len(self.names)
+                if i == len(self.rows):
+                    self.rows.append(None)
+                self.rows[i] = DeviceSample(name, 'Disconnected', None, None, None, 0, 0)
+                if self.record:
+                    self.history[name] = PositionHistory(capacity=self.history_capacity)
+                self.names.append(name)
+                self.index[name] = i
+            return i
+
+    def set_status(self, name, status):
+        i = self.slot(name)
+        self.rows[i] = self.rows[i]._replace(status=status)
+
+    def update(self, i, x, y, z, t_ns):
+        """Stores a new position in slot i. Called from the BLE loop only."""
+        row = self.rows[i]
+        self.rows[i] = DeviceSample(row.name, row.status, x, y, z, t_ns, row.count + 1)
+        if self.record:
+            self.history[row.name].append(x, y, z, t_ns)
+
+    def get(self, name):
+        """
+        Returns:
+            DeviceSample: Latest sample of the tag, or None if it was never seen.
+        """
+        i = self.index.get(name)
+        return self.rows[i] if i is not None else None
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: DeviceSample of every known tag, in slot order.
+        """
+        return tuple(self.rows[:len(self.names)])
+
+    def to_dataframe(self):
+        """Exports the latest samples as a DataFrame with the old device_info columns."""
+        import pandas as pd
+        rows = self.snapshot()
+        return pd.DataFrame({
+            'Name': [row.name for row in rows],
+            'Status': [row.status for row in rows],
+            'X': [row.x for row in rows],
+            'Y': [row.y for row in rows],
+            'Z': [row.z for row in rows],
+            'Time': [to_datetime(row.t_ns) if row.t_ns else None for row in rows],
+            'T_ns': [row.t_ns for row in rows],
+        }, columns=['Name', 'Status', 'X', 'Y', 'Z', 'Time', 'T_ns'])
+
+    def history_dataframe(self):
+        """Exports every recorded sample (record=True) as a DataFrame, oldest first per tag."""
+        import pandas as pd
+        frames = []
+        for name, history in list(self.history.items()):
+            t_ns, pos = history.window()
+            frame = pd.DataFrame({'Name': name, 'T_ns': t_ns.copy(), 'X': pos[:, 0], 'Y': pos[:, 1], 'Z': pos[:, 2]})
+            frame['T_tag'] = frame['T_ns'].map(lambda t: format_ns(int(t), '%Y%m%d %H%M%S.%f'))
+            frame['Time_Diff [msec]'] = frame['T_ns'].diff() / 1e6
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=['Name', 'T_ns', 'X', 'Y', 'Z', 'T_tag', 'Time_Diff [msec]'])
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,172 @@
+'''
+rev 01 - Position sources (BLE tag, USB-serial tag) read in the background, multiplexed by sample age
+'''
+
+import threading
+from collections import namedtuple
+
+import repo_root  # noqa: F401 - imported for its side effect, the repository root on sys.path
+from timebase import now_ns
+
+# age is in seconds, x/y in the units of the source (BLE and serial both in mm by default)
+PositionFix = namedtuple('PositionFix', ['x', 'y', 'source', 'age', 't_ns'])
+
+class BleSource:
+    """Latest position of one tag of a BLEDeviceManager, which runs its own loop thread."""
+    def __init__(self, manager, device_name=None, period=0.1, name='ble'):
+        """
+        Args:
+            manager (BLEDeviceManager): Started with start_connection().
+            device_name (str, optional): Tag to follow, defaults to the first connected tag.
+            period (float, optional): Expected seconds between samples. Defaults to 0.1.
+            name (str, optional): Reported as PositionFix.source. Defaults to 'ble'.
+        """
+        self.manager = manager
+        self.device_name = device_name
+        self.period = period
+        self.name = name
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def sample(self):
+        """
+        Returns:
+            tuple: (x, y, t_ns) of the latest sample, or None.
+        """
+        if self.device_name is not None:
+            rows = (self.manager.get_position(self.device_name),)
+        else:
+            rows = self.manager.snapshot()
+        for row in rows:
+            if row is not None and row.status == 'Connected' and row.x is not None:
+                return row.x, row.y, row.t_ns
+        return None
+
+class SerialSource:
+    """
+    DWM1001 on USB read by a UwbUsbReader thread. The port is opened in the background
+    too, and reopened after errors, so a missing cable never blocks the caller.
+    """
+    def __init__(self, port, mode='tlv', scale=1000.0, period=0.1, name='serial', retry_interval=1.0):
+        """
+        Args:
+            port (str): Serial port, e.g. 'COM6' or '/dev/ttyACM0'.
+            mode (str, optional): UwbUsbReader mode, 'tlv' (dwm_loc_get) or 'shell'. Defaults to 'tlv'.
+            scale (float, optional): Multiplier for the reader's meters, 1000 matches the BLE millimeters.
+            period (float, optional): Expected seconds between samples. Defaults to 0.1.
+            name (str, optional): Reported as PositionFix.source. Defaults to 'serial'.
+            retry_interval (float, optional): Seconds between attempts to open the port.
+        """
+        self.port = port
+        self.mode = mode
+        self.scale = scale
+        self.period = period
+        self.name = name
+        self.retry_interval = retry_interval
+        self.reader = None
+        self.latest = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name=f"{self.name}-source", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.reader is not None:
+            self.reader.stop_reader()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def _on_frame(self, frame):
+        if frame.has_pos:
+            self.latest = (frame.x * self.scale, frame.y * self.scale, frame.t_ns)
+
+    def _run(self):
+        from uwb_usb import UwbUsbReader
+
+        while not self.stop_event.is_set():
+            if self.reader is None:
+                try:
+                    self.reader = UwbUsbReader(self.port, mode=self.mode)
+                    if self.mode == 'shell':
+                        self.reader.activate_shell_mode()
+                    self.reader.start_reader(callback=self._on_frame)
+                except Exception as e:
+                    print(f"Could not open {self.port}: {e}")
+                    self.reader = None
+            elif self.reader.reader_thread is None or not self.reader.reader_thread.is_alive():
+                # Reader stopped after a serial error, reopen the port
+                self.reader.close()
+                self.reader = None
+                continue
+            self.stop_event.wait(self.retry_interval)
+
+    def sample(self):
+        return self.latest
+
+class PositionMux:
+    """
+    Picks the freshest healthy source on every latest() call and stays on it while it is
+    healthy. A source is healthy while its last sample is at most stale_periods sample
+    periods old, so when it stops the mux moves to the next source within one period
+    after the missing sample was due.
+    """
+    def __init__(self, sources, stale_periods=2.0):
+        """
+        Args:
+            sources (list): BleSource, SerialSource or anything with name, period and sample().
+            stale_periods (float, optional): Sample periods after which a source counts as stale.
+        """
+        self.sources = sources
+        self.stale_periods = stale_periods
+        self.active = None
+        self.switches = 0
+
+    def start(self):
+        for source in self.sources:
+            source.start()
+
+    def stop(self):
+        for source in self.sources:
+            source.stop()
+
+    def latest(self):
+        """
+        Non-blocking, only reads the samples the sources already hold.
+        Returns:
+            PositionFix: (x, y, source, age, t_ns) of the freshest healthy source. If every
+            source is stale the freshest stale sample is returned, None before any sample.
+        """
+        now = now_ns()
+        best = None
+        best_healthy = False
+        for source in self.sources:
+            sample = source.sample()
+            if sample is None:
+                continue
+            x, y, t_ns = sample
+            age = (now - t_ns) / 1e9
+            healthy = age <= source.period * self.stale_periods
+            if healthy and source.name == self.active:
+                # Stay on a healthy source instead of flapping between two live ones
+                best = PositionFix(x, y, source.name, age, t_ns)
+                break
+            if best is None or (healthy and not best_healthy) or (healthy == best_healthy and age < best.age):
+                best = PositionFix(x, y, source.name, age, t_ns)
+                best_healthy = healthy
+        if best is not None and best.source != self.active:
+            if self.active is not None:
+                self.switches += 1
+                print(f"Position source switched from {self.active} to {best.source}")
+            self.active = best.source
+        return best
@@ -0,0 +1,264 @@
+'''
+rev 01 - Pooled Pyro5 proxies per rover service: reuse connections, health checks, backoff, call latency
+'''
+
+import threading
+import time
+from collections import deque
+
+import Pyro5.api
+import Pyro5.core
+import Pyro5.errors
+
+def rover_uri(ip_address, service="server", port=9090):
+    """URI of a rover service, e.g. rover_uri('192.168.50.141') for the file/time server."""
+    return f"PYRO:{service}@{ip_address}:{port}"
+
+def _ping(proxy):
+    # DaemonObject.ping of the rover's daemon, answers without touching the service
+    proxy._pyroInvoke('ping', [], {}, objectId=Pyro5.core.DAEMON_NAME)
+
+class _Endpoint:
+    # Idle connections and counters of one URI, i.e. one service of one rover
+    def __init__(self, uri, history):
+        self.uri = uri
+        self.lock = threading.Lock()
+        self.idle = deque()         # (proxy, time it was returned)
+        self.open = 0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.connects = 0
+        self.latencies = deque(maxlen=history)     # [s]
+        self.methods = {}           # method -> [calls, total seconds]
+        self.last_ok = 0.0
+
+    def record(self, method, seconds, ok):
+        with self.lock:
+            self.calls += 1
+            if ok:
+                self.latencies.append(seconds)
+                self.last_ok = time.monotonic()
+            else:
+                self.errors += 1
+            entry = self.methods.setdefault(method, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+class ProxyPool:
+    """
+    Keeps Pyro5 connections to the rovers open between calls, so a button press or the
+    1 s time poll no longer pays a TCP connect and Pyro handshake. Any thread may call
+    call(): a proxy is taken from the pool, claimed by the calling thread and put back
+    afterwards, so a proxy is never used by two threads at once.
+
+    A rover that cannot be reached is retried after a backoff that doubles up to
+    backoff_max, calls in between fail right away instead of waiting for the connect
+    timeout again.
+    """
+    def __init__(self, timeout=5.0, max_idle=2, keepalive=15.0, backoff_initial=0.5, backoff_max=10.0, history=500):
+        """
+        Args:
+            timeout (float, optional): Default seconds per call, including the connect.
+            max_idle (int, optional): Connections kept open per service. Every open connection
+                holds a worker thread in the rover's daemon, so keep this small. Defaults to 2.
+            keepalive (float, optional): Idle connections are pinged after this many seconds,
+                broken ones are closed. 0 disables the background check. Defaults to 15.
+            backoff_initial (float, optional): Seconds before the first retry of an unreachable rover.
+            backoff_max (float, optional): Upper limit of the retry interval.
+            history (int, optional): Latencies kept per service for stats().
+        """
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.keepalive = keepalive
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.history = history
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.stop_event = threading.Event()
+        self.keepalive_thread = None
+        if keepalive:
+            self.keepalive_thread = threading.Thread(target=self._keepalive_loop, name="proxy-keepalive", daemon=True)
+            self.keepalive_thread.start()
+
+    def _endpoint(self, uri):
+        uri = str(uri)
+        endpoint = self.endpoints.get(uri)
+        if endpoint is None:
+            with self.lock:
+                endpoint = self.endpoints.setdefault(uri, _Endpoint(uri, self.history))
+        return endpoint
+
+    def _acquire(self, endpoint):
+        # Returns (proxy, reused)
+        with endpoint.lock:
+            if endpoint.idle:
+                proxy, _ = endpoint.idle.pop()
+                reused = True
+            else:
+                wait = endpoint.retry_at - time.monotonic()
+                if wait > 0:
+                    raise Pyro5.errors.CommunicationError(
+                        f"{endpoint.uri} unreachable, next attempt in {wait:.1f} s")
+                proxy = None
+                reused = False
+            endpoint.open += 1
+        if proxy is None:
+            proxy = Pyro5.api.Proxy(endpoint.uri)
+        else:
+            proxy._pyroClaimOwnership()
+        return proxy, reused
+
+    def _release(self, endpoint, proxy, keep):
+        with endpoint.lock:
+            endpoint.open -= 1
+            if keep and proxy._pyroConnection is not None and len(endpoint.idle) < self.max_idle:
+                endpoint.idle.append((proxy, time.monotonic()))
+                return
+        proxy._pyroRelease()
+
+    def _connect_failed(self, endpoint):
+        with endpoint.lock:
+            endpoint.failures += 1
+            delay = min(self.backoff_max, self.backoff_initial * 2 ** (endpoint.failures - 1))
+            endpoint.retry_at = time.monotonic() + delay
+
+    def _connected(self, endpoint):
+        with endpoint.lock:
+            endpoint.connects += 1
+            endpoint.failures = 0
+            endpoint.retry_at = 0.0
+
+    def call(self, uri, method, *args, timeout=None, **kwargs):
+        """
+        Calls method on the service at uri through a pooled connection.
+        Args:
+            uri (str): e.g. rover_uri(ip_address).
+            method (str): Exposed method name, e.g. 'get_file_list'.
+            timeout (float, optional): Seconds for this call, e.g. longer for a download.
+        Returns:
+            The method's return value. Pyro5 errors are raised after the latency is recorded.
+            Only a communication error closes the connection, an exception raised by the
+            method is passed on and the connection goes back to the pool.
+        """
+        return self._invoke(uri, method, lambda proxy: getattr(proxy, method)(*args, **kwargs), timeout)
+
+    def ping(self, uri, timeout=None):
+        """Round trip to the rover's daemon without calling the service. Returns the seconds taken."""
+        start = time.perf_counter()
+        self._invoke(uri, 'ping', _ping, timeout)
+        return time.perf_counter() - start
+
+    def _invoke(self, uri, label, func, timeout):
+        endpoint = self._endpoint(uri)
+        for attempt in range(2):
+            proxy, reused = self._acquire(endpoint)
+            proxy._pyroTimeout = timeout if timeout is not None else self.timeout
+            start = time.perf_counter()
+            ok = keep = False
+            try:
+                if proxy._pyroConnection is None:
+                    try:
+                        proxy._pyroBind()
+                    except Pyro5.errors.CommunicationError:
+                        self._connect_failed(endpoint)
+                        raise
+                    self._connected(endpoint)
+                result = func(proxy)
+                ok = keep = True
+                return result
+            except Pyro5.errors.ConnectionClosedError:
+                # A reused connection the rover closed while it was idle, the call was not
+                # handled, so it is sent once more on a new connection
+                if not reused or attempt:
+                    raise
+            except Pyro5.errors.CommunicationError:
+                raise
+            except Exception:
+                # Raised by the service itself, the reply arrived and the connection is still good
+                keep = True
+                raise
+            finally:
+                endpoint.record(label, time.perf_counter() - start, ok)
+                self._release(endpoint, proxy, keep)
+
+    def is_healthy(self, uri, max_age=None):
+        """True if a call to uri succeeded within max_age seconds (default twice the keepalive)."""
+        endpoint = self.endpoints.get(str(uri))
+        max_age = max_age if max_age is not None else 2 * (self.keepalive or 15.0)
+        return endpoint is not None and time.monotonic() - endpoint.last_ok <= max_age
+
+    def _keepalive_loop(self):
+        while not self.stop_event.wait(self.keepalive / 3):
+            for endpoint in list(self.endpoints.values()):
+                self._check_idle(endpoint)
+
+    def _check_idle(self, endpoint):
+        now = time.monotonic()
+        with endpoint.lock:
+            due = [entry for entry in endpoint.idle if now - entry[1] >= self.keepalive]
+            for entry in due:
+                endpoint.idle.remove(entry)
+            endpoint.open += len(due)
+        for proxy, _ in due:
+            proxy._pyroClaimOwnership()
+            proxy._pyroTimeout = self.timeout
+            start = time.perf_counter()
+            ok = False
+            try:
+                _ping(proxy)
+                ok = True
+            except Pyro5.errors.PyroError as e:
+                print(f"Connection to {endpoint.uri} lost: {e}")
+            endpoint.record('ping', time.perf_counter() - start, ok)
+            self._release(endpoint, proxy, ok)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Per URI: calls, errors, connects, open, idle, mean_ms, p50_ms, p95_ms, max_ms
+            over the latest successful calls, and methods {name: (calls, mean_ms)}.
+        """
+        result = {}
+        for uri, endpoint in list(self.endpoints.items()):
+            with endpoint.lock:
+                latencies = sorted(endpoint.latencies)
+                entry = {
+                    'calls': endpoint.calls,
+                    'errors': endpoint.errors,
+                    'connects': endpoint.connects,
+                    'open': endpoint.open,
+                    'idle': len(endpoint.idle),
+                    'methods': {name: (count, total / count * 1000) for name, (count, total) in endpoint.methods.items()},
+                }
+            if latencies:
+                entry['mean_ms'] = sum(latencies) / len(latencies) * 1000
+                entry['p50_ms'] = latencies[len(latencies) // 2] * 1000
+                entry['p95_ms'] = latencies[int(len(latencies) * 0.95)] * 1000
+                entry['max_ms'] = latencies[-1] * 1000
+            else:
+                entry['mean_ms'] = entry['p50_ms'] = entry['p95_ms'] = entry['max_ms'] = None
+            result[uri] = entry
+        return result
+
+    def print_stats(self):
+        for uri, entry in self.stats().items():
+            if entry['mean_ms'] is None:
+                print(f"{uri}: {entry['calls']} calls, {entry['errors']} errors")
+                continue
+            print(f"{uri}: {entry['calls']} calls, {entry['errors']} errors, {entry['connects']} connects, "
+                  f"mean {entry['mean_ms']:.2f} ms p50 {entry['p50_ms']:.2f} ms p95 {entry['p95_ms']:.2f} ms "
+                  f"max {entry['max_ms']:.2f} ms")
+
+    def close(self):
+        """Stops the keepalive thread and closes every idle connection."""
+        self.stop_event.set()
+        for endpoint in list(self.endpoints.values()):
+            with endpoint.lock:
+                idle = list(endpoint.idle)
+                endpoint.idle.clear()
+            for proxy, _ in idle:
+                proxy._pyroClaimOwnership()
+                proxy._pyroRelease()
@@ -0,0 +1,14 @@
+'''
+rev 01 - Puts the repository root on sys.path for the modules shared with the rover scripts (timebase, telemetry_push, ...)
+
+Import it before the shared modules: import repo_root  # noqa: F401
+'''
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Appended, so copies next to the script win when everything is deployed in one directory
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
@@ -76,7 +76,7 @@ class Rover:
     def execute_movement(self):
         try:
             # Connect to the remote Pyro server
-            with Pyro5.api.Proxy(f"PYRO:move@{self.ip_address}:9093") as movement_service:
+            with Pyro5.api.Proxy(f"PYRO:move@{self.ip_address}:9090") as movement_service:
                 movement_service.start_movement(self.rover_id)
         except Pyro5.errors.CommunicationError as e:
             print(f"Communication error verifying identity for Rover {self.rover_id}: {e}")
@@ -1,26 +1,115 @@
+'''
+rev 01 - Rover identity lookup: identity.csv loaded once into a set, reloaded when the file changes
+'''
+
 import csv
+import os
 import sys
+import threading
+import time
+
+# Exit codes / return values of check_identity
+ID_FOUND = 0
+ID_NOT_FOUND = 1
+FILE_NOT_FOUND = 2
+
+class IdentityIndex:
+    """
+    IDs of identity.csv in a set. The file is read again only when its mtime or size
+    changed, checked at most every check_interval seconds, so a whole fleet connecting
+    at once costs set lookups instead of CSV scans.
+    """
+    def __init__(self, file_path='identity.csv', check_interval=1.0):
+        """
+        Args:
+            file_path (str, optional): CSV with an ID column. Defaults to 'identity.csv'.
+            check_interval (float, optional): Seconds between checks of the file's mtime.
+        """
+        self.file_path = file_path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.ids = None         # None while the file is missing
+        self.stat_key = None
+        self.last_check = 0.0
+        self.lookups = 0
+        self.cache_hits = 0     # Lookups answered without reading the file
+        self.reloads = 0
+
+    def _refresh(self):
+        # Returns True if the file was read
+        now = time.monotonic()
+        if self.stat_key is not None and now - self.last_check < self.check_interval:
+            return False
+        with self.lock:
+            if self.stat_key is not None and now - self.last_check < self.check_interval:
+                return False
+            self.last_check = now
+            try:
+                st = os.stat(self.file_path)
+            except FileNotFoundError:
+                if self.ids is not None:
+                    print(f"{self.file_path} file not found.")
+                self.ids = None
+                self.stat_key = ()
+                return False
+            key = (st.st_mtime_ns, st.st_size)
+            if key == self.stat_key:
+                return False
+            with open(self.file_path, 'r') as file:
+                self.ids = frozenset(row['ID'].strip() for row in csv.DictReader(file))
+            self.stat_key = key
+            self.reloads += 1
+            print(f"Loaded {len(self.ids)} IDs from {self.file_path}")
+            return True
+
+    def check(self, id_database):
+        """
+        Returns:
+            int: ID_FOUND (0), ID_NOT_FOUND (1) or FILE_NOT_FOUND (2), like identity.py's exit code.
+        """
+        read = self._refresh()
+        self.lookups += 1
+        if not read:
+            self.cache_hits += 1
+        if self.ids is None:
+            return FILE_NOT_FOUND
+        return ID_FOUND if str(id_database).strip() in self.ids else ID_NOT_FOUND
+
+    def check_many(self, ids):
+        """
+        Returns:
+            list: check() result of every ID, in the same order.
+        """
+        read = self._refresh()
+        self.lookups += len(ids)
+        self.cache_hits += len(ids) - (1 if read and ids else 0)
+        if self.ids is None:
+            return [FILE_NOT_FOUND] * len(ids)
+        return [ID_FOUND if str(i).strip() in self.ids else ID_NOT_FOUND for i in ids]
+
+    def stats(self):
+        return {"lookups": self.lookups, "cache_hits": self.cache_hits, "reloads": self.reloads}
+
+_index = None
 
 def check_identity(id_database):
-    try:
-        with open('identity.csv', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                id_rover = row['ID'].strip()
-                if id_rover == id_database:
-                    print(id_rover)  # Print the ID when found
-                    return 0
-            print("ID not found in the CSV file.")
-            return 1
-    except FileNotFoundError:
+    global _index
+    if _index is None:
+        _index = IdentityIndex()
+    result = _index.check(id_database)
+    if result == ID_FOUND:
+        print(str(id_database).strip())  # Print the ID when found
+    elif result == ID_NOT_FOUND:
+        print("ID not found in the CSV file.")
+    else:
         print("identity.csv file not found.")
-        return 2
+    return result
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
         print("Usage: python identity.py <id_database>")
         sys.exit(1)
-       
+
     id_database = sys.argv[1]
     exit_code = check_identity(id_database)
-    sys.exit(exit_code)
\ No newline at end of file
+    sys.exit(exit_code)
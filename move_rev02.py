@@ -1,18 +1,31 @@
 import Pyro5.api
 import threading
 import uwb_movement_rev05b
+from rover_daemon import RoverDaemon, bind_address
+from scheduled_start import ScheduledStart, GoListener
 
 # Expose the RoverController class with Pyro5
 @Pyro5.api.expose
 class RoverController:
     def __init__(self):
         self.movement_trigger_event = threading.Event()  # Event to control start trigger
+        self.movement_thread = None
+        # Start at a swarm time, confirmed by the ground station's go datagram
+        self.scheduled_start = ScheduledStart()
+        self.go_listener = GoListener(self.scheduled_start.on_go, interface=bind_address())
+        self.go_listener.start()
 
     def start_movement(self, id_rover):
         self.movement_trigger_event.clear()
+        uwb_movement_rev05b.movement_event.clear()
         # Run the movement logic in a separate thread so the server remains responsive
-        movement_thread = threading.Thread(target=self.run_movement_logic, args=(id_rover,))
-        movement_thread.start()
+        self.movement_thread = threading.Thread(target=self.run_movement_logic, args=(id_rover,))
+        self.movement_thread.start()
+
+    def is_armed(self):
+        """True once the show is loaded and the UWB reader runs, i.e. only the go is missing."""
+        return (self.movement_thread is not None and self.movement_thread.is_alive()
+                and uwb_movement_rev05b.uwb_is_connected and not self.movement_trigger_event.is_set())
 
     def run_movement_logic(self, id_rover):
         """Internal function that runs the movement and waits for a signal from the client to start."""
@@ -26,15 +39,42 @@ class RoverController:
         print(f"Rover {id_rover} received the start command, beginning movement...")
         uwb_movement_rev05b.start_movement(id_rover)  # Now call the movement function after the trigger
 
+    def _go(self):
+        # start_movement() waits on the module's movement_event
+        uwb_movement_rev05b.movement_event.set()
+        self.movement_trigger_event.set()
+
     def trigger_start(self):
         """This will be called by the client to signal the rover to start moving."""
         print("Movement start command received.")
-        self.movement_trigger_event.set()  # Trigger the event to start the movement
+        self._go()  # Trigger the event to start the movement
         print("Movement event set. The rover should now start moving")
 
+    def schedule_start(self, start_id, start_ns, require_go=False):
+        """
+        Starts the armed show at swarm time start_ns (ground station clock, ns since the epoch).
+        Returns:
+            float: Seconds until the start on this rover's clock.
+        """
+        seconds = self.scheduled_start.schedule(start_id, start_ns, self._go, require_go)
+        print(f"Start {start_id} scheduled in {seconds:.3f} s, armed: {self.is_armed()}")
+        return seconds
+
+    def cancel_start(self):
+        self.scheduled_start.cancel()
+
+    def get_start_report(self):
+        """
+        Returns:
+            dict: ScheduledStart.report() of the last scheduled start, with armed.
+        """
+        report = self.scheduled_start.report()
+        report['armed'] = self.is_armed()
+        return report
+
 if __name__ == "__main__":
-    move = RoverController()
-    daemon = Pyro5.api.Daemon(host="192.168.50.215", port=9093)
-    uri = daemon.register(move, "move")
+    # Only the move service, like rover.py --services move, on the same port
+    rover_daemon = RoverDaemon()
+    uri = rover_daemon.register(RoverController(), "move", announce=False)
     print(f"Rover controller is ready. URI: {uri}")
-    daemon.requestLoop()
+    rover_daemon.request_loop()
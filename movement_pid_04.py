@@ -1,10 +1,10 @@
 import pandas as pd
 import numpy as np
-import threading
 import time
 import datetime
 from HiwonderSDK import mecanum, Board
-from ble_manager_rev03 import BLEDeviceManager
+from ble_manager_rev06 import BLEDeviceManager
+from timebase import now_ns, format_ns
 
 class PIDController:
     def __init__(self, Kp, Ki, Kd, setpoint=0, integral_limit=None):
@@ -56,24 +56,15 @@ def calculate_angles_for_xr(df):
 
 def update_coordinates(device_manager, id_rover):
     while not device_manager.stop_event.is_set():
-        if device_manager.is_connected():
-            device_info = device_manager.get_device_info()
-            rover_data = device_info[device_info['Name'] == f'Rov{id_rover}']
-            if not rover_data.empty:
-                try:
-                    xr = pd.to_numeric(rover_data.iloc[0]['X'], errors='coerce')
-                    yr = pd.to_numeric(rover_data.iloc[0]['Y'], errors='coerce')
-                    t_tag = rover_data.iloc[0]['T_tag']
-                    
-                except ValueError:
-                    print(f"Error converting rover data for Rover {id_rover}")
-                    return None, None, None
-
-                if np.isnan(xr) or np.isnan(yr):
-                    print(f"Invalid coordinates received: X={xr}, Y={yr}")
-                    return None, None, None
-                
-                return xr, yr, t_tag
+        sample = device_manager.get_position(f'Rov{id_rover}')
+        if sample is not None and sample.status == 'Connected' and sample.x is not None:
+            xr, yr, t_tag = sample.x, sample.y, sample.t_ns
+
+            if np.isnan(xr) or np.isnan(yr):
+                print(f"Invalid coordinates received: X={xr}, Y={yr}")
+                return None, None, None
+            
+            return xr, yr, t_tag
         time.sleep(1)
     return None, None, None
 
@@ -86,11 +77,9 @@ def execute_movement(id_rover, file_path):
     
     df.rename(columns={'Time [msec]': 'T_sky [msec]'}, inplace=True)
 
-    device_manager = BLEDeviceManager()
-    device_manager.stop_event = threading.Event()
-
-    connection_thread = threading.Thread(target=device_manager.start_connection, args=(id_rover,))
-    connection_thread.start()
+    # Meters, as ble_manager_rev03 delivered them
+    device_manager = BLEDeviceManager(scale=0.001, record=True)
+    device_manager.start_connection(id_rover, wait=False)
 
     print(f"Executing movement for Rover {id_rover}")
     chassis = mecanum.MecanumChassis()
@@ -108,7 +97,7 @@ def execute_movement(id_rover, file_path):
                 df.at[index, 'xr'] = xr
                 df.at[index, 'yr'] = yr
                 df.at[index, 'T_tag'] = t_tag
-                df.at[index, 'T_rover'] = datetime.datetime.now()
+                df.at[index, 'T_rover'] = now_ns()
                 
                 # Calculate offsets based on the first row
                 offset_x = df.at[0, 'xr'] - df.at[0, 'xs']
@@ -154,15 +143,15 @@ def execute_movement(id_rover, file_path):
 
     chassis.set_velocity(0, 0, 0)
     
-    device_manager.stop_event.set()
     device_manager.stop_connection()
     device_manager.save_to_csv('device_info.csv')
         
     df = calculate_angles_for_xr(df)
-    df['Time_Diff [msec]'] = df['T_rover'].diff().dt.total_seconds() * 1000
+    df['Time_Diff [msec]'] = df['T_rover'].diff() / 1e6
     df['Time_Diff [msec]'].fillna(0, inplace=True)
         
-    df['T_rover'] = pd.to_datetime(df['T_rover'], format='%Y%m%d%H%M%S.%f').dt.strftime('%Y%m%d%H%M%S.%f').str[:-3]
+    df['T_rover'] = df['T_rover'].map(lambda t_ns: format_ns(int(t_ns)) if pd.notna(t_ns) else '')
+    df['T_tag'] = df['T_tag'].map(lambda t_ns: format_ns(int(t_ns), '%Y%m%d %H%M%S.%f') if pd.notna(t_ns) else '')
     timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
 
     # Save the main DataFrame
@@ -0,0 +1,179 @@
+'''
+rev 01 - Gauss-Newton multilateration from DWM1001 anchor ranges, per frame and batched over logs
+'''
+
+import math
+import numpy as np
+
+# Anchors whose heights differ by less than this are treated as coplanar: z is then fixed,
+# otherwise the mirror image below the anchor plane is an equally good solution
+COPLANAR_SPREAD = 0.2
+
+def solve(anchor_xyz, distances, x0=None, z=0.0, iterations=6):
+    """
+    Solves one position from anchor ranges. Pure Python, cheap enough for every frame.
+    Args:
+        anchor_xyz (sequence): (x, y, z) of each anchor in meters.
+        distances (sequence): Measured range to each anchor in meters.
+        x0 (tuple, optional): Starting point, e.g. the previous solution. Defaults to the anchor centroid.
+        z (float, optional): Fixed tag height for coplanar anchors, None always solves z. Defaults to 0.0.
+        iterations (int, optional): Gauss-Newton iterations. Defaults to 6.
+    Returns:
+        tuple: (x, y, z, residual) with residual the RMS range error in meters,
+        or None with fewer than 3 ranges (4 when z is solved).
+    """
+    anchors = [(a, d) for a, d in zip(anchor_xyz, distances) if a is not None and d == d and d > 0]
+    heights = [a[2] for a, _ in anchors]
+    solve_z = z is None or (len(anchors) >= 4 and max(heights) - min(heights) >= COPLANAR_SPREAD)
+    if len(anchors) < (4 if solve_z else 3):
+        return None
+
+    if x0 is None:
+        x = sum(a[0] for a, _ in anchors) / len(anchors)
+        y = sum(a[1] for a, _ in anchors) / len(anchors)
+        pz = sum(heights) / len(anchors) if solve_z else z
+    else:
+        x, y, pz = x0[0], x0[1], (x0[2] if solve_z else z)
+
+    for _ in range(iterations):
+        # Normal equations J^T J dp = -J^T r, accumulated without building J
+        sxx = sxy = sxz = syy = syz = szz = bx = by = bz = 0.0
+        for (ax, ay, az), d in anchors:
+            dx, dy, dz = x - ax, y - ay, pz - az
+            rng = math.sqrt(dx * dx + dy * dy + dz * dz) or 1e-9
+            ux, uy, uz = dx / rng, dy / rng, dz / rng
+            r = rng - d
+            sxx += ux * ux
+            sxy += ux * uy
+            syy += uy * uy
+            bx -= ux * r
+            by -= uy * r
+            if solve_z:
+                sxz += ux * uz
+                syz += uy * uz
+                szz += uz * uz
+                bz -= uz * r
+        if solve_z:
+            det = (sxx * (syy * szz - syz * syz) - sxy * (sxy * szz - syz * sxz) + sxz * (sxy * syz - syy * sxz))
+            if abs(det) < 1e-12:
+                break
+            step_x = (bx * (syy * szz - syz * syz) - sxy * (by * szz - syz * bz) + sxz * (by * syz - syy * bz)) / det
+            step_y = (sxx * (by * szz - syz * bz) - bx * (sxy * szz - syz * sxz) + sxz * (sxy * bz - by * sxz)) / det
+            step_z = (sxx * (syy * bz - by * syz) - sxy * (sxy * bz - by * sxz) + bx * (sxy * syz - syy * sxz)) / det
+        else:
+            det = sxx * syy - sxy * sxy
+            if abs(det) < 1e-12:
+                break
+            step_x = (bx * syy - sxy * by) / det
+            step_y = (sxx * by - sxy * bx) / det
+            step_z = 0.0
+        x += step_x
+        y += step_y
+        pz += step_z
+        if abs(step_x) + abs(step_y) + abs(step_z) < 1e-4:
+            break
+
+    squared = 0.0
+    for (ax, ay, az), d in anchors:
+        r = math.sqrt((x - ax)**2 + (y - ay)**2 + (pz - az)**2) - d
+        squared += r * r
+    return x, y, pz, math.sqrt(squared / len(anchors))
+
+def solve_batch(anchor_xyz, distances, z=0.0, iterations=8, damping=1e-6):
+    """
+    Solves many positions at once, e.g. a whole log from uwb_parser.parse_log().
+    Args:
+        anchor_xyz (numpy.ndarray): (n, a, 3) anchor positions, or (a, 3) shared by every sample.
+        distances (numpy.ndarray): (n, a) ranges in meters, NaN where an anchor is missing.
+        z (float, optional): Fixed tag height for coplanar anchors, None always solves z. Defaults to 0.0.
+        iterations (int, optional): Gauss-Newton iterations. Defaults to 8.
+        damping (float, optional): Levenberg term that keeps degenerate samples finite.
+    Returns:
+        tuple: (pos, residual) with pos (n, 3) and residual (n,) RMS range error in meters.
+        Samples with too few ranges are NaN.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    n = distances.shape[0]
+    anchors = np.broadcast_to(np.asarray(anchor_xyz, dtype=np.float64), (n,) + distances.shape[1:] + (3,))
+    valid = ~np.isnan(distances) & ~np.isnan(anchors).any(axis=2) & (distances > 0)
+    weight = valid.astype(np.float64)
+    count = valid.sum(axis=1)
+    d = np.where(valid, distances, 0.0)
+    a = np.where(valid[..., None], anchors, 0.0)
+
+    spread = (np.where(valid, anchors[..., 2], -np.inf).max(axis=1, initial=-np.inf)
+              - np.where(valid, anchors[..., 2], np.inf).min(axis=1, initial=np.inf))
+    spread = spread[count > 0]
+    solve_z = z is None or (spread.size > 0 and bool(spread.min() >= COPLANAR_SPREAD))
+    dims = 3 if solve_z else 2
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pos = (a * weight[..., None]).sum(axis=1) / count[:, None]
+    if not solve_z:
+        pos[:, 2] = z
+    eye = np.eye(dims) * damping
+
+    for _ in range(iterations):
+        diff = pos[:, None, :] - a
+        rng = np.sqrt((diff**2).sum(axis=2))
+        rng = np.where(rng > 1e-9, rng, 1e-9)
+        jac = diff[..., :dims] / rng[..., None] * weight[..., None]
+        res = (rng - d) * weight
+        jtj = np.einsum('nai,naj->nij', jac, jac) + eye
+        jtr = np.einsum('nai,na->ni', jac, res)
+        with np.errstate(invalid='ignore'):
+            step = np.linalg.solve(jtj, -jtr[..., None])[..., 0]
+        pos[:, :dims] += np.nan_to_num(step)
+
+    rng = np.sqrt(((pos[:, None, :] - a)**2).sum(axis=2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        residual = np.sqrt((((rng - d) * weight)**2).sum(axis=1) / count)
+    unsolved = count < (4 if solve_z else 3)
+    pos[unsolved] = np.nan
+    residual[unsolved] = np.nan
+    return pos, residual
+
+def solve_log(arrays, z=0.0):
+    """
+    Runs solve_batch() on the output of uwb_parser.parse_log().
+    Returns:
+        tuple: (pos, residual), see solve_batch().
+    """
+    return solve_batch(arrays['anchor_xyz'], arrays['distances'], z=z)
+
+class Multilaterator:
+    """
+    Frame-by-frame solver for the read_uwb loops. Starts each solve from the previous
+    solution, so a few iterations are enough at the full ranging rate.
+    """
+    def __init__(self, z=0.0, iterations=4, max_residual=0.5):
+        """
+        Args:
+            z (float, optional): Fixed tag height for coplanar anchors, None always solves z.
+            iterations (int, optional): Gauss-Newton iterations per frame. Defaults to 4.
+            max_residual (float, optional): Solutions with a larger RMS range error [m] are rejected.
+        """
+        self.z = z
+        self.iterations = iterations
+        self.max_residual = max_residual
+        self.last = None
+        self.residual = None
+
+    def update(self, frame):
+        """
+        Args:
+            frame (UwbFrame): Frame with anchor positions and distances.
+        Returns:
+            tuple: (x, y, z, residual), or None if the frame could not be solved.
+        """
+        x0 = self.last
+        result = solve(frame.anchor_xyz, frame.distances, x0=x0, z=self.z,
+                       iterations=self.iterations if x0 is not None else 10)
+        if result is None:
+            return None
+        self.residual = result[3]
+        if result[3] > self.max_residual:
+            # Do not let a bad fix become the next starting point
+            return None
+        self.last = result[:3]
+        return result
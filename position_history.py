@@ -0,0 +1,114 @@
+'''
+rev 01 - Preallocated ring buffer for position fixes with optional spill to a memory-mapped file
+'''
+
+import numpy as np
+from timebase import now_ns
+
+# Record layout of the spill file
+HISTORY_DTYPE = np.dtype([('t_ns', '<i8'), ('x', '<f8'), ('y', '<f8'), ('z', '<f8')])
+
+class PositionHistory:
+    """
+    Fixed-size history of position fixes. Every sample is written twice, at index i and
+    i + capacity, so the latest n samples are always one contiguous slice and windows
+    are returned as views without copying.
+    """
+    def __init__(self, capacity=6000, spill_path=None):
+        """
+        Args:
+            capacity (int, optional): Number of samples kept in memory. Defaults to 6000.
+            spill_path (str, optional): Raw file that receives samples before they are
+                overwritten, read it back with load_spill(). An existing file is truncated,
+                the t_ns stamps of another run or boot would need another timebase anchor.
+                Defaults to None (no spill).
+        """
+        self.capacity = capacity
+        self.t_ns = np.zeros(2 * capacity, dtype=np.int64)
+        self.pos = np.zeros((2 * capacity, 3), dtype=np.float64)
+        self.count = 0          # Total samples appended
+        self.spilled = 0        # Total samples written to the spill file
+        self.spill_path = spill_path
+        self.spill_file = open(spill_path, 'wb') if spill_path else None
+
+    def append(self, x, y, z, t_ns=None):
+        """
+        Adds one fix.
+        Args:
+            x, y, z (float): Position.
+            t_ns (int, optional): Timestamp, defaults to timebase.now_ns().
+        """
+        if t_ns is None:
+            t_ns = now_ns()
+        if self.spill_file is not None and self.count - self.spilled == self.capacity:
+            self._spill(self.capacity)
+        i = self.count % self.capacity
+        j = i + self.capacity
+        self.t_ns[i] = self.t_ns[j] = t_ns
+        pos = self.pos
+        pos[i, 0] = pos[j, 0] = x
+        pos[i, 1] = pos[j, 1] = y
+        pos[i, 2] = pos[j, 2] = z
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def window(self, n=None):
+        """
+        Returns the latest n samples, oldest first, as views into the buffer.
+        Args:
+            n (int, optional): Number of samples, defaults to everything held in memory.
+        Returns:
+            tuple: (t_ns, pos) arrays of shape (n,) and (n, 3). They are only valid until
+            the buffer wraps around, copy them to keep them longer.
+        """
+        size = len(self)
+        n = size if n is None else min(n, size)
+        # Read from the mirrored half so the window never wraps
+        end = (self.count - 1) % self.capacity + 1 + self.capacity if self.count else self.capacity
+        return self.t_ns[end - n:end], self.pos[end - n:end]
+
+    def latest(self):
+        """
+        Returns:
+            tuple: (t_ns, x, y, z) of the newest sample, or None if empty.
+        """
+        if self.count == 0:
+            return None
+        i = (self.count - 1) % self.capacity
+        return int(self.t_ns[i]), float(self.pos[i, 0]), float(self.pos[i, 1]), float(self.pos[i, 2])
+
+    def _spill(self, n):
+        t_ns, pos = self.window(n)
+        records = np.empty(n, dtype=HISTORY_DTYPE)
+        records['t_ns'] = t_ns
+        records['x'] = pos[:, 0]
+        records['y'] = pos[:, 1]
+        records['z'] = pos[:, 2]
+        records.tofile(self.spill_file)
+        self.spilled += n
+
+    def flush(self):
+        """Writes samples not yet spilled to the spill file."""
+        if self.spill_file is None:
+            return
+        pending = self.count - self.spilled
+        if pending:
+            self._spill(pending)
+        self.spill_file.flush()
+
+    def close(self):
+        """Flushes and closes the spill file."""
+        if self.spill_file is not None:
+            self.flush()
+            spill_file, self.spill_file = self.spill_file, None
+            spill_file.close()
+
+def load_spill(spill_path):
+    """
+    Memory-maps a spill file written by PositionHistory.
+    Returns:
+        numpy.memmap: Records with fields t_ns, x, y, z.
+    """
+    return np.memmap(spill_path, dtype=HISTORY_DTYPE, mode='r')
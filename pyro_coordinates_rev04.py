@@ -1,41 +1,90 @@
 import Pyro5.api
 import threading
 import time
-import pandas as pd
-from ble_manager import BLEDeviceManager
+from telemetry_push import TelemetryPublisher
+from timebase import to_datetime, to_wall_ns
+from telemetry_record import encode_batch, make_status, rover_number
+from rover_daemon import bind_address
+
+def coordinates_from_snapshot(rows):
+    # Same lists get_coordinates() returned when it was built from the device_info DataFrame
+    name = [row.name for row in rows]
+    x = [row.x for row in rows]
+    y = [row.y for row in rows]
+    z = [row.z for row in rows]
+    t_tag = [to_datetime(row.t_ns).strftime('%Y-%m-%d %H:%M:%S.%f') if row.t_ns else None for row in rows]
+    status = [row.status for row in rows]
+    return name, x, y, z, t_tag, status
+
+def records_from_snapshot(rows):
+    """Packs every tag as a telemetry_record batch, 28 bytes per tag instead of six lists."""
+    records = []
+    for row in rows:
+        rover_id = rover_number(row.name)
+        # The id is the rover number, a tag not named 'RovN' has none and is left out
+        if row.x is None or rover_id is None:
+            continue
+        records.append((rover_id, row.count, to_wall_ns(row.t_ns), row.x, row.y, row.z, 0,
+                        make_status(row.status == 'Connected')))
+    return encode_batch(records)
 
 @Pyro5.api.expose
 class RoverServer:
-    def __init__(self):
-        self.device_manager = BLEDeviceManager()
-        self.device_manager.stop_event = threading.Event()
+    def __init__(self, device_manager=None):
+        """
+        Args:
+            device_manager (optional): Source of the tags, with add_listener(), snapshot(),
+                is_connected() and start_connection(). Defaults to a BLEDeviceManager,
+                fleet_simulator passes simulated tags.
+        """
+        if device_manager is None:
+            # Imported here, so the simulated rovers run without bleak
+            from ble_manager_rev06 import BLEDeviceManager
+            device_manager = BLEDeviceManager()
+        self.device_manager = device_manager
         self.connection_lock = threading.Lock()
+        # Topic 'coordinates' carries the get_coordinates() tuple after every new fix,
+        # 'coordinates_packed' the get_coordinates_packed() bytes
+        self.telemetry = TelemetryPublisher()
+        self.device_manager.add_listener(self._on_sample)
 
     def start_connection(self, id_rover):   
         self.device_manager.start_connection(id_rover)
 
+    def _on_sample(self, sample):
+        if self.telemetry.has_subscribers('coordinates'):
+            self.telemetry.publish('coordinates', coordinates_from_snapshot(self.device_manager.snapshot()))
+        if self.telemetry.has_subscribers('coordinates_packed'):
+            self.telemetry.publish('coordinates_packed', records_from_snapshot(self.device_manager.snapshot()))
+
     def get_coordinates(self):
         if self.device_manager.is_connected():
-            info = self.device_manager.get_device_info()
-            
-            if not pd.api.types.is_datetime64_any_dtype(info['Time']):
-                info['Time'] = pd.to_datetime(info['Time'])
-
-            # Convert pandas Series to lists or scalars
-            name = info['Name'].tolist() if isinstance(info['Name'], pd.Series) else info['Name']
-            x = info['X'].tolist() if isinstance(info['X'], pd.Series) else info['X']
-            y = info['Y'].tolist() if isinstance(info['Y'], pd.Series) else info['Y']
-            z = info['Z'].tolist() if isinstance(info['Z'], pd.Series) else info['Z']
-            t_tag = info['Time'].dt.strftime('%Y-%m-%d %H:%M:%S.%f').tolist()
-            status = info['Status'].tolist() if isinstance(info['Status'], pd.Series) else info['Status']
-
-            return name, x, y, z, t_tag, status
+            return coordinates_from_snapshot(self.device_manager.snapshot())
         else:
             return None, None, None, None, None, None
+
+    def get_coordinates_packed(self):
+        """
+        Returns:
+            bytes: telemetry_record batch of every tag with a fix, decode with decode_batch().
+            Call with the marshal serializer to receive it as raw bytes.
+        """
+        return records_from_snapshot(self.device_manager.snapshot())
+
+    def subscribe(self, callback_uri, topic='coordinates', max_rate=10.0):
+        """
+        Pushes every new fix to callback_uri instead of the client polling get_coordinates().
+        Returns:
+            float: The granted rate [Hz].
+        """
+        return self.telemetry.subscribe(callback_uri, topic, max_rate)
+
+    def unsubscribe(self, callback_uri, topic='coordinates'):
+        self.telemetry.unsubscribe(callback_uri, topic)
         
 def main():
     rover_server = RoverServer()
-    daemon = Pyro5.api.Daemon(host="192.168.50.251", port=9091)
+    daemon = Pyro5.api.Daemon(host=bind_address(), port=9091)
     uri = daemon.register(rover_server, "rover_server")
     
     thread = threading.Thread(target=rover_server.start_connection, args=(3,))
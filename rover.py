@@ -1,8 +1,8 @@
-import Pyro5.api
+import argparse
+import os
 import threading
 import logging
-from server import Server
-from uwb import Uwb
+from rover_daemon import RoverDaemon, ROVER_PORT, DEFAULT_INTERFACE
 
 # Configure logging to show only warnings and above
 logging.basicConfig(level=logging.WARNING)
@@ -15,28 +15,57 @@ bleak_logger.setLevel(logging.WARNING)
 asyncio_logger = logging.getLogger('asyncio')
 asyncio_logger.setLevel(logging.WARNING)
 
-@Pyro5.api.expose
+SERVICES = ("server", "uwb", "move", "coordinates")
 
-def start_daemon(class_instance, port, name):
-    daemon = Pyro5.api.Daemon(host="192.168.50.141", port=port)
-    uri = daemon.register(class_instance, name)
-    print(f"{name} is running. Object URI: {uri}")
-    return daemon
+def start_server_service(args):
+    from server import Server
+    return Server(args.base_path)
 
-if __name__ == '__main__':
-    base_path = "/home/pi/Desktop/rover"
-    server_service = Server(base_path)
+def start_uwb_service(args):
+    from uwb import Uwb
     uwb_service = Uwb()
-    
-    daemon_server = start_daemon(server_service, 9090, "server")
-    daemon_uwb = start_daemon(uwb_service, 9091, "uwb")
-    
     connect_thread = threading.Thread(target=uwb_service.start_connection, args=(5,))
     connect_thread.daemon = True
     connect_thread.start()
-    
-    server_thread = threading.Thread(target=daemon_server.requestLoop)
-    server_thread.start()
-    
-    uwb_thread = threading.Thread(target=daemon_uwb.requestLoop)
-    uwb_thread.start()
\ No newline at end of file
+    return uwb_service
+
+def start_move_service(args):
+    from move_rev02 import RoverController
+    return RoverController()
+
+def start_coordinates_service(args):
+    import serverclient_rev04
+    serverclient_rev04.start_uwb_services(args.rover_id)
+    return serverclient_rev04.RoverServer(args.rover_id)
+
+STARTERS = {
+    "server": start_server_service,
+    "uwb": start_uwb_service,
+    "move": start_move_service,
+    "coordinates": start_coordinates_service,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="All Pyro5 services of the rover on one daemon.")
+    parser.add_argument("--interface", default=DEFAULT_INTERFACE, help="Interface, IP or host name to listen on")
+    parser.add_argument("--port", type=int, default=ROVER_PORT, help="Port of the daemon")
+    parser.add_argument("--servertype", choices=["thread", "multiplex"], default="thread", help="Pyro5 server type")
+    parser.add_argument("--pool-size", type=int, default=32, help="Worker threads of the thread server")
+    parser.add_argument("--services", nargs="+", choices=SERVICES, default=list(SERVICES), help="Services to register")
+    parser.add_argument("--base-path", default="/home/pi/Desktop/rover", help="Show files of the server service")
+    parser.add_argument("--rover-id", default=os.environ.get("ROVER_ID", "2"), help="ID of the coordinates service")
+    args = parser.parse_args()
+
+    rover_daemon = RoverDaemon(args.interface, args.port, args.servertype, args.pool_size)
+    for name in args.services:
+        try:
+            rover_daemon.register(STARTERS[name](args), name)
+        except ImportError as e:
+            # e.g. the movement libraries are not installed on this machine
+            print(f"{name} not started: {e}")
+
+    print(f"Rover daemon on {rover_daemon.host}:{rover_daemon.port} ({args.servertype}, pool {args.pool_size})")
+    try:
+        rover_daemon.request_loop()
+    finally:
+        rover_daemon.print_stats()
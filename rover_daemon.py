@@ -0,0 +1,212 @@
+'''
+rev 01 - One Pyro5 daemon per rover for all its services: server type, worker pool, interface binding, call statistics
+'''
+
+import fcntl
+import functools
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import Pyro5
+import Pyro5.api
+
+ROVER_PORT = 9090
+DEFAULT_INTERFACE = os.environ.get("ROVER_INTERFACE", "wlan0")
+SIOCGIFADDR = 0x8915
+
+def interface_address(interface):
+    """
+    Args:
+        interface (str): Network interface (e.g. 'wlan0'), an IP address or a host name.
+            None or '' for all interfaces.
+    Returns:
+        str: IP address to bind to, None if the interface has no IPv4 address.
+    """
+    if not interface or interface == "0.0.0.0":
+        return "0.0.0.0"
+    try:
+        socket.inet_aton(interface)
+        return interface
+    except OSError:
+        pass
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            request = struct.pack('256s', interface[:15].encode())
+            return socket.inet_ntoa(fcntl.ioctl(sock.fileno(), SIOCGIFADDR, request)[20:24])
+    except OSError:
+        pass
+    try:
+        return socket.gethostbyname(interface)
+    except OSError:
+        return None
+
+def bind_address(interface=DEFAULT_INTERFACE):
+    """interface_address() for a daemon: all interfaces if the interface has no address (yet)."""
+    host = interface_address(interface)
+    if host is None:
+        print(f"Interface {interface} has no IPv4 address, listening on all interfaces")
+        host = "0.0.0.0"
+    return host
+
+class _MethodStats:
+    def __init__(self, history):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.latencies = deque(maxlen=history)     # [s]
+
+@Pyro5.api.expose
+class DaemonStats:
+    """Registered as "stats": call counts and latency of every service of the rover."""
+    def __init__(self, rover_daemon):
+        self.rover_daemon = rover_daemon
+
+    def get_call_stats(self):
+        return self.rover_daemon.stats()
+
+    def reset_call_stats(self):
+        self.rover_daemon.reset_stats()
+
+    def get_daemon_info(self):
+        return self.rover_daemon.info()
+
+class RoverDaemon:
+    """
+    A single Pyro5 daemon that hosts every service of the rover (server, uwb, move,
+    coordinates) on one port, instead of one daemon with its own accept thread and
+    worker pool per service. The exposed methods of every registered object are timed,
+    the numbers are available locally from stats() and remotely from the "stats" object.
+
+    servertype "thread" gives every connection a worker thread from a pool of pool_size;
+    a connection that arrives while all workers are busy is refused, so pool_size must
+    cover every proxy the ground stations keep open. "multiplex" serves all connections
+    from one thread, a slow call then holds up the others.
+    """
+    def __init__(self, interface=DEFAULT_INTERFACE, port=ROVER_PORT, servertype="thread", pool_size=32, pool_size_min=4,
+                 history=500):
+        """
+        Args:
+            interface (str, optional): Interface, IP or host name to bind to, None for all interfaces.
+                Defaults to $ROVER_INTERFACE or wlan0.
+            port (int, optional): Defaults to ROVER_PORT (9090).
+            servertype (str, optional): "thread" or "multiplex".
+            pool_size (int, optional): Worker threads at most with the thread server.
+            pool_size_min (int, optional): Worker threads kept when idle.
+            history (int, optional): Latest latencies kept per method for the percentiles.
+        """
+        host = bind_address(interface)
+        # Pyro5 reads these when the daemon is created and while it runs, one daemon per process
+        Pyro5.config.SERVERTYPE = servertype
+        Pyro5.config.THREADPOOL_SIZE = pool_size
+        Pyro5.config.THREADPOOL_SIZE_MIN = min(pool_size_min, pool_size)
+        self.daemon = Pyro5.api.Daemon(host=host, port=port)
+        self.host = host
+        self.port = self.daemon.locationStr.rsplit(":", 1)[1]
+        self.servertype = servertype
+        self.pool_size = pool_size
+        self.history = history
+        self.lock = threading.Lock()
+        self.methods = {}       # "service.method" -> _MethodStats
+        self.services = {}
+        self.started = time.monotonic()
+        self.thread = None
+        self.daemon.register(DaemonStats(self), "stats")
+
+    def register(self, obj, name, announce=True):
+        """
+        Registers obj as name and times its exposed methods. announce=False skips the print.
+        Returns:
+            Pyro5.core.URI: URI of the service.
+        """
+        for attr in dir(type(obj)):
+            if attr.startswith("_") or isinstance(getattr(type(obj), attr, None), property):
+                continue
+            method = getattr(obj, attr, None)
+            if callable(method) and getattr(method, "_pyroExposed", False):
+                # Pyro5 looks the method up on the instance, so the timed wrapper is called
+                setattr(obj, attr, self._timed(name, attr, method))
+        self.services[name] = obj
+        uri = self.daemon.register(obj, name)
+        if announce:
+            print(f"{name} is running. Object URI: {uri}")
+        return uri
+
+    def _timed(self, service, attr, method):
+        key = f"{service}.{attr}"
+        with self.lock:
+            self.methods.setdefault(key, _MethodStats(self.history))
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            ok = False
+            try:
+                result = method(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                self._record(key, time.perf_counter() - start, ok)
+        return timed
+
+    def _record(self, key, seconds, ok):
+        with self.lock:
+            entry = self.methods[key]
+            entry.calls += 1
+            entry.total += seconds
+            entry.max = max(entry.max, seconds)
+            entry.latencies.append(seconds)
+            if not ok:
+                entry.errors += 1
+
+    def stats(self):
+        """
+        Returns:
+            dict: Per "service.method" that was called: calls, errors, mean_ms, p50_ms,
+            p99_ms and max_ms. Percentiles are over the latest history calls.
+        """
+        result = {}
+        with self.lock:
+            for key, entry in self.methods.items():
+                if not entry.calls:
+                    continue
+                latencies = sorted(entry.latencies)
+                result[key] = {
+                    'calls': entry.calls,
+                    'errors': entry.errors,
+                    'mean_ms': entry.total / entry.calls * 1000,
+                    'p50_ms': latencies[len(latencies) // 2] * 1000,
+                    'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+                    'max_ms': entry.max * 1000,
+                }
+        return result
+
+    def reset_stats(self):
+        with self.lock:
+            for key in self.methods:
+                self.methods[key] = _MethodStats(self.history)
+
+    def info(self):
+        return {'host': self.host, 'port': int(self.port), 'servertype': self.servertype,
+                'pool_size': self.pool_size, 'services': sorted(self.services),
+                'uptime': time.monotonic() - self.started}
+
+    def print_stats(self):
+        for key, entry in sorted(self.stats().items()):
+            print(f"{key:<36} {entry['calls']:8d} calls {entry['errors']:4d} errors "
+                  f"mean {entry['mean_ms']:7.2f} ms p99 {entry['p99_ms']:7.2f} ms max {entry['max_ms']:7.2f} ms")
+
+    def start(self):
+        """Runs the request loop in a background thread."""
+        self.thread = threading.Thread(target=self.daemon.requestLoop, name="rover-daemon", daemon=True)
+        self.thread.start()
+
+    def request_loop(self):
+        self.daemon.requestLoop()
+
+    def shutdown(self):
+        self.daemon.shutdown()
@@ -1,15 +1,14 @@
 import os
 import time
 import numpy as np
-import threading
 from collections import deque
 import pandas as pd
 from HiwonderSDK import mecanum, Board
-from ble_manager_rev03 import BLEDeviceManager
+from ble_manager_rev06 import BLEDeviceManager
 import onnxruntime as ort
 from nn_infer import ONNXModel
 from filterpy.kalman import KalmanFilter
-from datetime import datetime
+from timebase import now_ns, elapsed_s, save_anchor
 
 class MovingAverage:
     def __init__(self, window_size):
@@ -37,22 +36,15 @@ class KalmanFilterWrapper:
 
 def update_coordinates(device_manager, id_rover):
     while not device_manager.stop_event.is_set():
-        if device_manager.is_connected():
-            device_info = device_manager.get_device_info()
-            rover_data = device_info[device_info['Name'] == f'Rov{id_rover}']
-            if not rover_data.empty:
-                try:
-                    xr = pd.to_numeric(rover_data.iloc[0]['X'], errors='coerce')
-                    yr = pd.to_numeric(rover_data.iloc[0]['Y'], errors='coerce')
-                    
-                    if pd.isna(xr) or pd.isna(yr):
-                        print(f"Invalid coordinates received: X={xr}, Y={yr}")
-                        return None, None, None
-                    
-                    return xr, yr
-                except ValueError:
-                    print(f"Error converting rover data for Rover {id_rover}")
-                    return None, None, None
+        sample = device_manager.get_position(f'Rov{id_rover}')
+        if sample is not None and sample.status == 'Connected' and sample.x is not None:
+            xr, yr = sample.x, sample.y
+            
+            if np.isnan(xr) or np.isnan(yr):
+                print(f"Invalid coordinates received: X={xr}, Y={yr}")
+                return None, None, None
+            
+            return xr, yr
         time.sleep(1)
     return None, None, None
 
@@ -62,11 +54,9 @@ def execute_movement(id_rover):
         model_path = os.path.join(model_folder, 'Rover_02_01.onnx')
         model = ONNXModel(model_path)
 
-        device_manager = BLEDeviceManager()
-        device_manager.stop_event = threading.Event()
-
-        connection_thread = threading.Thread(target=device_manager.start_connection, args=(id_rover,))
-        connection_thread.start()
+        # Meters, as ble_manager_rev03 delivered them
+        device_manager = BLEDeviceManager(scale=0.001)
+        device_manager.start_connection(id_rover, wait=False)
 
         x_moving_avg = MovingAverage(window_size=10)
         y_moving_avg = MovingAverage(window_size=10)
@@ -102,9 +92,11 @@ def execute_movement(id_rover):
         # Initial previous values
         prev_rover_pos = None
         prev_time = None
+        # 'timestamp' is timebase.now_ns(), the anchor converts it back to wall time
+        save_anchor('rover_data_anchor.csv')
 
         while not device_manager.stop_event.is_set():
-            current_time = datetime.now().strftime('%Y%m%d%H%M%S.%f')[:-3]
+            current_time = now_ns()
             #Retrieve actual rover coord from UWB
             xr, yr = update_coordinates(device_manager, id_rover)
             #Compute MVA
@@ -143,9 +135,7 @@ def execute_movement(id_rover):
             
             # Calculate time difference and distance moved
             if prev_rover_pos is not None and prev_time is not None:
-                prev_time_obj = datetime.strptime(prev_time, '%Y%m%d%H%M%S.%f')
-                current_time_obj = datetime.strptime(current_time, '%Y%m%d%H%M%S.%f')
-                delta_t = (current_time_obj - prev_time_obj).total_seconds()
+                delta_t = elapsed_s(prev_time, current_time)
                 print("Time difference:", delta_t)
                 
                 distance_moved = np.sqrt((kalman_avg_x - prev_rover_pos[0])**2 + (kalman_avg_y - prev_rover_pos[1])**2)
@@ -211,7 +201,7 @@ def execute_movement(id_rover):
             time.sleep(0.25)
         
         chassis.set_velocity(0, 0, 0)
-        device_manager.stop_event.set()
+        device_manager.stop_connection()
 
     except Exception as e:
         print(f"An error occurred: {e}")
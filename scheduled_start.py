@@ -0,0 +1,232 @@
+'''
+rev 01 - Swarm-wide start at a swarm time: high-resolution wait, optional go datagram, measured start skew
+'''
+
+import socket
+import struct
+import threading
+import time
+
+from clock_sync import swarm_clock
+
+START_GROUP = '239.255.50.2'
+START_PORT = 50051
+
+# Sleep until this close to the start, then spin on the monotonic clock
+SPIN_NS = 2000000
+
+# magic, version, command, start_id, start time in swarm ns
+_GO = struct.Struct('<2sBBIq')
+_MAGIC = b'GO'
+_VERSION = 1
+GO = 1
+ABORT = 2
+
+def encode_go(start_id, start_ns, command=GO):
+    return _GO.pack(_MAGIC, _VERSION, command, start_id & 0xFFFFFFFF, start_ns)
+
+def decode_go(data):
+    """
+    Returns:
+        tuple: (command, start_id, start_ns), or None if data is not a go datagram.
+    """
+    if len(data) != _GO.size:
+        return None
+    magic, version, command, start_id, start_ns = _GO.unpack(data)
+    if magic != _MAGIC or version != _VERSION:
+        return None
+    return command, start_id, start_ns
+
+def wait_until(target_ns, clock_ns=time.time_ns, cancel=None, spin_ns=SPIN_NS):
+    """
+    Waits until clock_ns() reaches target_ns. The target is moved to the monotonic clock
+    once, so the wall clock being set during the wait does not move the start.
+    Args:
+        target_ns (int): Time on clock_ns to return at.
+        clock_ns (callable, optional): Defaults to time.time_ns.
+        cancel (threading.Event, optional): Returns None early when set.
+        spin_ns (int, optional): Busy-wait for the last spin_ns instead of sleeping.
+    Returns:
+        int: How late it returned [ns], None if cancelled.
+    """
+    target_mono = time.monotonic_ns() + (target_ns - clock_ns())
+    while True:
+        remaining = target_mono - time.monotonic_ns() - spin_ns
+        if remaining <= 0:
+            break
+        if cancel is not None:
+            if cancel.wait(remaining / 1e9):
+                return None
+        else:
+            time.sleep(remaining / 1e9)
+    while time.monotonic_ns() < target_mono:
+        pass
+    return time.monotonic_ns() - target_mono
+
+def send_go(start_id, start_ns, command=GO, group=START_GROUP, port=START_PORT, interface='0.0.0.0',
+            broadcast=False, repeat=3, loopback=False):
+    """
+    Sends the go (or abort) datagram to every rover, repeat times in case one is lost.
+    Args:
+        interface (str, optional): Local address of the swarm network, '0.0.0.0' lets the OS pick.
+        broadcast (bool, optional): group is a broadcast address, for networks that drop multicast.
+        loopback (bool, optional): Also deliver to listeners on this host, for simulations.
+    """
+    packet = encode_go(start_id, start_ns, command)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as sock:
+        if broadcast:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        else:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1 if loopback else 0)
+            if interface != '0.0.0.0':
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+        for _ in range(repeat):
+            sock.sendto(packet, (group, port))
+
+class GoListener:
+    """Receives go datagrams and passes (command, start_id, start_ns) to on_go."""
+    def __init__(self, on_go, group=START_GROUP, port=START_PORT, interface='0.0.0.0', broadcast=False):
+        self.on_go = on_go
+        self.group = group
+        self.port = port
+        self.interface = interface
+        self.broadcast = broadcast
+        self.stop_event = threading.Event()
+        self.sock = None
+        self.thread = None
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(('', self.port))
+        if not self.broadcast:
+            membership = socket.inet_aton(self.group) + socket.inet_aton(self.interface)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        sock.settimeout(0.5)
+        self.sock = sock
+        self.thread = threading.Thread(target=self._receive_loop, name="go-listener", daemon=True)
+        self.thread.start()
+
+    def _receive_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                data, _ = self.sock.recvfrom(64)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            go = decode_go(data)
+            if go is not None:
+                self.on_go(*go)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        if self.sock is not None:
+            self.sock.close()
+
+class ScheduledStart:
+    """
+    Runs an action at a swarm time. The rover is armed beforehand (show loaded, sensors
+    running), so the start itself is only the action. The wait sleeps until SPIN_NS before
+    the start and spins for the rest, on the rover's clock corrected with the clock_sync
+    offset. With require_go the start also needs the go datagram for the same start_id,
+    so a ground station that went away cannot leave the swarm starting on its own.
+    report() has the measured skew, the swarm time the action ran at minus the start time.
+    """
+    def __init__(self, clock=swarm_clock, spin_ns=SPIN_NS):
+        """
+        Args:
+            clock (SwarmClock, optional): Converts between swarm time and this rover's clock.
+            spin_ns (int, optional): Busy-wait for the last spin_ns before the start.
+        """
+        self.clock = clock
+        self.spin_ns = spin_ns
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.go_event = threading.Event()
+        self.start_id = None
+        self.thread = None
+        self.result = {}
+
+    def schedule(self, start_id, start_ns, action, require_go=False, go_grace=0.5):
+        """
+        Args:
+            start_id (int): ID of this start, the go datagram has to carry the same.
+            start_ns (int): Swarm time to start at, ns since the epoch on the ground station's clock.
+            action (callable): Called at the start, e.g. sets the movement event.
+            require_go (bool, optional): Start only once the go datagram for start_id arrived.
+            go_grace (float, optional): Seconds after start_ns to wait for a late go datagram.
+        Returns:
+            float: Seconds until the start on this rover's clock, negative if already past.
+        """
+        self.cancel()
+        with self.lock:
+            self.cancel_event = threading.Event()
+            self.go_event = threading.Event()
+            self.start_id = start_id & 0xFFFFFFFF
+            self.result = {'start_id': self.start_id, 'start_ns': start_ns, 'state': 'scheduled',
+                           'require_go': require_go, 'go_received': False, 'synced': self.clock.is_synced()}
+            self.thread = threading.Thread(target=self._run, name="scheduled-start", daemon=True,
+                                           args=(start_ns, action, require_go, go_grace,
+                                                 self.cancel_event, self.go_event, self.result))
+            self.thread.start()
+        return (self.clock.to_local_ns(start_ns) - time.time_ns()) / 1e9
+
+    def on_go(self, command, start_id, start_ns):
+        """GoListener callback."""
+        with self.lock:
+            if start_id != self.start_id or self.result.get('state') != 'scheduled':
+                return
+            if command == ABORT:
+                self.result['state'] = 'aborted'
+                self.cancel_event.set()
+            elif not self.go_event.is_set():
+                self.result['go_received'] = True
+                self.result['go_rx_ns'] = self.clock.now_ns()
+                self.go_event.set()
+
+    def _run(self, start_ns, action, require_go, go_grace, cancel_event, go_event, result):
+        late_ns = wait_until(self.clock.to_local_ns(start_ns), cancel=cancel_event, spin_ns=self.spin_ns)
+        if late_ns is None:
+            return
+        if require_go and not go_event.is_set():
+            go_event.wait(go_grace)
+        # Checked under the lock right before the action: an ABORT or cancel() during the spin
+        # or the go_grace wait still stops the start, and its state is not overwritten
+        with self.lock:
+            if cancel_event.is_set() or result['state'] != 'scheduled':
+                return
+            if require_go and not go_event.is_set():
+                result['state'] = 'no go'
+                return
+            # From here on ABORT and cancel() are too late and leave the state alone
+            result['state'] = 'started'
+            started_ns = self.clock.now_ns()
+        action()
+        status = self.clock.status()
+        with self.lock:
+            result['started_ns'] = started_ns
+            result['skew_ms'] = (started_ns - start_ns) / 1e6
+            result['timer_late_ms'] = late_ns / 1e6
+            result['clock_uncertainty_ms'] = status['uncertainty_ms']
+
+    def cancel(self):
+        with self.lock:
+            if self.result.get('state') == 'scheduled':
+                self.result['state'] = 'cancelled'
+            self.cancel_event.set()
+
+    def report(self):
+        """
+        Returns:
+            dict: start_id, start_ns, state ('scheduled', 'started', 'no go', 'aborted' or
+            'cancelled'), go_received, and once started skew_ms, timer_late_ms and
+            clock_uncertainty_ms (None if the clock was never synchronized).
+        """
+        with self.lock:
+            return dict(self.result)
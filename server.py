@@ -1,11 +1,18 @@
-import csv
 import datetime
+import json
 import os
 import pickle
 import base64
 import logging
 import select
+import time
+import zlib
 import Pyro5.api
+from file_transfer import file_sha256, MAX_CHUNK_SIZE
+from fleet_sync import block_signatures
+from directory_index import DirectoryIndex
+from identity import IdentityIndex
+from clock_sync import swarm_clock
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -14,31 +21,66 @@ logging.basicConfig(level=logging.DEBUG)
 class Server:
     def __init__(self, base_path):
         self.base_path = base_path
+        self.index = DirectoryIndex(base_path)  # Listing with size, mtime and hash, kept up to date
+        self.identities = IdentityIndex('identity.csv')  # Reloaded when identity.csv changes
 
     def check_identity(self, id_database):
-        try:
-            with open('identity.csv', 'r') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    id_rover = row['ID'].strip()
-                    if id_rover == id_database:
-                        print(id_rover)  # Print the ID when found
-                        return 0
-                print("ID not found in the CSV file.")
-                return 1
-        except FileNotFoundError:
-            print("identity.csv file not found.")
-            return 2
+        # 0 found, 1 not found, 2 identity.csv missing
+        return self.identities.check(id_database)
+
+    def check_identities(self, ids):
+        """
+        Checks many IDs in one call, e.g. the whole fleet.
+        Returns:
+            list: check_identity() result of every ID, in the same order.
+        """
+        return self.identities.check_many(list(ids))
+
+    def get_identity_stats(self):
+        """
+        Returns:
+            dict: lookups, cache_hits (answered without reading identity.csv) and reloads.
+        """
+        return self.identities.stats()
 
     def get_server_time(self):
         return datetime.datetime.now().strftime("%H:%M:%S %p")
 
+    def get_clock(self):
+        """
+        One clock_sync exchange, keep this method short.
+        Returns:
+            tuple: (receive_ns, transmit_ns) of time.time_ns().
+        """
+        receive_ns = time.time_ns()
+        return receive_ns, time.time_ns()
+
+    def set_clock_offset(self, offset_ns, drift_ppm, uncertainty_ns, ref_ns):
+        # Measured by the ground station, used by the schedulers through clock_sync.swarm_clock
+        swarm_clock.update(offset_ns, drift_ppm, uncertainty_ns, ref_ns)
+
+    def get_clock_status(self):
+        """
+        Returns:
+            dict: offset_ms, drift_ppm, uncertainty_ms and age [s] of the last estimate.
+        """
+        return swarm_clock.status()
+
     def get_file_list(self):
-        files = []
-        for filename in os.listdir(self.base_path):
-            #if filename.endswith(".csv"):
-            files.append(filename)
-        return sorted(files)
+        # Served from the index, unfinished chunked uploads are left out
+        return self.index.names()
+
+    def list_with_metadata(self, since_version=0):
+        """
+        Listing with name, size, mtime and sha256 of every file in one call.
+        Args:
+            since_version (int, optional): "version" of the previous reply, only files changed
+                since then are returned. 0 for the whole listing.
+        Returns:
+            dict: {"version", "files": [{"name", "size", "mtime", "sha256", "version"}],
+            "removed": [names], "full": True if files is the whole listing}.
+        """
+        return self.index.list(since_version)
 
     def upload_file(self, filename, data):
         try:
@@ -47,6 +89,7 @@ class Server:
             file_path = os.path.join(self.base_path, filename)
             with open(file_path, 'wb') as f:
                 f.write(file_data)
+            self.index.invalidate(filename)
             return f"File '{filename}' uploaded successfully."
         except Exception as e:
             return f"Error uploading file '{filename}': {e}"
@@ -64,11 +107,170 @@ class Server:
         except Exception as e:
             return {"error": str(e)}
 
+    # Chunked transfer, see file_transfer.py for the client. Chunks travel as raw bytes
+    # (the client uses the marshal serializer), only one chunk is in memory at a time.
+    def _transfer_paths(self, filename):
+        # basename keeps the transfer inside base_path
+        file_path = os.path.join(self.base_path, os.path.basename(filename))
+        return file_path, file_path + ".part", file_path + ".part.json"
+
+    def open_upload(self, filename, size, sha256):
+        """
+        Starts or resumes an upload. A partial upload of the same content is continued.
+        Returns:
+            dict: {"offset": bytes already received}, or {"error": ...}.
+        """
+        try:
+            file_path, part_path, info_path = self._transfer_paths(filename)
+            info = {"size": size, "sha256": sha256}
+            offset = 0
+            if os.path.exists(info_path) and os.path.exists(part_path):
+                with open(info_path, 'r') as f:
+                    if json.load(f) == info:
+                        offset = os.path.getsize(part_path)
+            if offset == 0 or offset > size:
+                offset = 0
+                with open(info_path, 'w') as f:
+                    json.dump(info, f)
+                open(part_path, 'wb').close()
+            return {"offset": offset}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def write_chunk(self, filename, offset, data, crc):
+        """
+        Writes one chunk at offset after checking its CRC-32.
+        Returns:
+            dict: {"offset": end of the received data}, or {"error": ...}. A chunk that fails
+            the check is not written, the client sends it again.
+        """
+        try:
+            file_path, part_path, info_path = self._transfer_paths(filename)
+            if len(data) > MAX_CHUNK_SIZE:
+                return {"error": f"Chunk larger than {MAX_CHUNK_SIZE} bytes"}
+            if zlib.crc32(data) != crc:
+                return {"error": "CRC mismatch", "offset": os.path.getsize(part_path)}
+            received = os.path.getsize(part_path)
+            if offset > received:
+                return {"error": "Gap before chunk", "offset": received}
+            with open(part_path, 'r+b') as f:
+                f.seek(offset)
+                f.write(data)
+            return {"offset": max(received, offset + len(data))}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def finish_upload(self, filename):
+        """
+        Checks the SHA-256 of the whole file and moves it in place.
+        Returns:
+            dict: {"size", "sha256"}, or {"error": ...} and the partial upload is discarded.
+        """
+        try:
+            file_path, part_path, info_path = self._transfer_paths(filename)
+            with open(info_path, 'r') as f:
+                info = json.load(f)
+            sha256 = file_sha256(part_path)
+            size = os.path.getsize(part_path)
+            os.remove(info_path)
+            if size != info["size"] or sha256 != info["sha256"]:
+                os.remove(part_path)
+                return {"error": "SHA-256 mismatch, upload discarded"}
+            os.replace(part_path, file_path)
+            self.index.invalidate(filename)
+            return {"size": size, "sha256": sha256}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def stat_file(self, filename):
+        """
+        Returns:
+            dict: {"size", "sha256", "mtime"} of a file for a download, or {"error": ...}.
+        """
+        try:
+            # Checked right now, the hash is only computed again if the file changed
+            self.index.invalidate(filename)
+            entry = self.index.get(filename)
+            if entry is None:
+                return {"error": "File not found"}
+            return {"size": entry.size, "sha256": entry.sha256, "mtime": entry.mtime}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def read_chunk(self, filename, offset, size):
+        """
+        Returns:
+            dict: {"data": bytes, "crc": CRC-32 of data}, data is empty at the end of the file.
+        """
+        try:
+            file_path, _, _ = self._transfer_paths(filename)
+            with open(file_path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(min(size, MAX_CHUNK_SIZE))
+            return {"data": data, "crc": zlib.crc32(data)}
+        except Exception as e:
+            return {"error": str(e)}
+
+    # Delta sync, see fleet_sync.py. The new file is built in <name>.part from blocks of
+    # the current file and literal bytes, then checked and moved in place by finish_upload.
+    def get_file_hashes(self):
+        """
+        Returns:
+            dict: name -> {"size", "sha256"} of every file in get_file_list().
+        """
+        # A sync has to see every change, so the directory is stat'ed now (files are only
+        # hashed again if they changed)
+        self.index.invalidate()
+        listing = self.index.list()
+        return {entry["name"]: {"size": entry["size"], "sha256": entry["sha256"]} for entry in listing["files"]}
+
+    def get_block_signatures(self, filename, block_size):
+        try:
+            file_path, _, _ = self._transfer_paths(filename)
+            return {"signatures": block_signatures(file_path, block_size)}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def open_delta(self, filename, size, sha256):
+        try:
+            file_path, part_path, info_path = self._transfer_paths(filename)
+            with open(info_path, 'w') as f:
+                json.dump({"size": size, "sha256": sha256}, f)
+            open(part_path, 'wb').close()
+            return {"offset": 0}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def write_delta(self, filename, block_size, ops):
+        """
+        Appends ('c', first block, count) copies of the current file and ('d', bytes) literals.
+        Returns:
+            dict: {"offset": size of the new file so far}, or {"error": ...}.
+        """
+        try:
+            file_path, part_path, _ = self._transfer_paths(filename)
+            with open(file_path, 'rb') as base, open(part_path, 'ab') as part:
+                for op in ops:
+                    if op[0] == 'c':
+                        base.seek(op[1] * block_size)
+                        remaining = op[2] * block_size
+                        while remaining > 0:
+                            data = base.read(min(remaining, MAX_CHUNK_SIZE))
+                            if not data:
+                                break
+                            part.write(data)
+                            remaining -= len(data)
+                    else:
+                        part.write(op[1])
+                return {"offset": part.tell()}
+        except Exception as e:
+            return {"error": str(e)}
+
     def get_file_metadata(self, filename):
         try:
-            file_path = os.path.join(self.base_path, filename)
-            if os.path.exists(file_path):
-                file_mtime = os.path.getmtime(file_path)
+            entry = self.index.get(filename)
+            if entry is not None:
+                file_mtime = entry.mtime
                 file_date_time = datetime.datetime.fromtimestamp(file_mtime)
                 file_date = file_date_time.strftime("%Y-%m-%d")
                 file_time = file_date_time.strftime("%H:%M:%S")
@@ -1,15 +1,25 @@
 import csv
+import os
 import time
-from datetime import datetime
 import threading
 import Pyro5.api
 from uwb_usb import UwbUsbReader
+from telemetry_push import TelemetryPublisher
+from swarm_gossip import SwarmGossip
+from telemetry_record import encode_batch, make_status
+from timebase import to_wall_ns
+from rover_daemon import RoverDaemon, ROVER_PORT
 
 # Global variables
 pos_x, pos_y, pos_z = 0.0, 0.0, 0.0
 timestamp = None
 other_rovers = []  # This should be populated with data from other rovers
 num_anchors = 0  # Number of anchors initialized
+pos_quality = 0
+fix_count = 0  # Sequence number of the own packed record
+latest_uwb_data = None
+telemetry = TelemetryPublisher()  # Pushes 'coordinates' and 'uwb_data' to subscribers
+gossip = None  # SwarmGossip, shares the own position and holds the other rovers' positions
 
 # Function to read rover info from CSV file
 def read_rover_info(file_path, rover_id):
@@ -39,16 +49,36 @@ class RoverServer:
         }
         
     def get_uwb_data(self):
-        global latest_uwb_data
-        return latest_uwb_data
+        # Built from the gossip neighbour table, no calls to the other rovers
+        return build_uwb_data(self.rover_id)
+
+    def get_uwb_data_packed(self):
+        """
+        Same content as get_uwb_data() as a telemetry_record batch, own rover first.
+        Call with the marshal serializer to receive it as raw bytes.
+        """
+        return build_uwb_packed(self.rover_id)
+
+    def subscribe(self, callback_uri, topic='coordinates', max_rate=10.0):
+        """
+        Pushes 'coordinates' (the get_coordinates() dict, on every fix), 'uwb_data'
+        (the get_uwb_data() list) or 'uwb_packed' (the get_uwb_data_packed() bytes) to
+        callback_uri instead of the client polling.
+        Returns:
+            float: The granted rate [Hz].
+        """
+        return telemetry.subscribe(callback_uri, topic, max_rate)
+
+    def unsubscribe(self, callback_uri, topic='coordinates'):
+        telemetry.unsubscribe(callback_uri, topic)
 
 # Function to start the Pyro5 server
-def start_server(rover_id, server_port):
-    rover_server = RoverServer(rover_id)
-    daemon = Pyro5.server.Daemon(host="192.168.50.215", port=server_port)
-    uri = daemon.register(rover_server, "coordinates")
+def start_server(rover_id, server_port=ROVER_PORT):
+    # The same daemon and port as rover.py, which also hosts the other services
+    rover_daemon = RoverDaemon(port=server_port)
+    uri = rover_daemon.register(RoverServer(rover_id), "coordinates", announce=False)
     print(f"Server started for Rover {rover_id} with URI: {uri}")
-    daemon.requestLoop()
+    rover_daemon.request_loop()
 
 # Function to get coordinates from another rover
 def get_coordinates(server_uri):
@@ -78,8 +108,9 @@ def get_coordinates(server_uri):
 
 # Function to read UWB data
 def read_uwb():
-    global pos_x, pos_y, pos_z, timestamp, num_anchors
-    serial_port = "/dev/ttyACM0"
+    global pos_x, pos_y, pos_z, timestamp, num_anchors, pos_quality, fix_count
+    # UWB_PORT points the reader at another device, e.g. the uwb_replay pty
+    serial_port = os.environ.get("UWB_PORT", "/dev/ttyACM0")
     
     #print("Thread UWB starting...")
     reader = UwbUsbReader(serial_port)
@@ -88,94 +119,91 @@ def read_uwb():
     
     reader.activate_shell_mode()
     time.sleep(1)
+    reader.start_reader()
     
     while True:
-        data = reader.read_data()
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S.%f')[:-3]
-
-        if data == "dwm>":
-            reader.request_lec()
-        elif data is None:
+        frame = reader.get_frame(timeout=1)
+        if frame is None:
             continue
+        timestamp = frame.t_ns
+
+        num_anchors = min(len(frame.distances), 4)
+        if frame.has_pos:
+            pos_x, pos_y, pos_z = frame.x, frame.y, frame.z
+            pos_quality = frame.quality or 0
+            fix_count += 1
+            telemetry.publish('coordinates', {'x': pos_x, 'y': pos_y, 'z': pos_z})
+            if gossip is not None:
+                gossip.update(pos_x, pos_y, pos_z, frame.t_ns, quality=pos_quality, num_anchors=num_anchors)
+
+# Function to build the UWB data list from the own position and the gossip neighbour table
+def build_uwb_data(rover_id):
+    uwb_data = ['CORD']  # Start with UWB data
+
+    # Include own coordinates first
+    uwb_data.extend([
+        f"{num_anchors}",
+        "0",
+        f"Rov{rover_id}",
+        f"{pos_x}",
+        f"{pos_y}",
+        f"{pos_z}"
+    ])
+
+    # Rovers not heard for gossip.stale_after seconds are left out, like a failed fetch before
+    neighbours = gossip.get_neighbours() if gossip is not None else []
+    for neighbour, age in neighbours:
+        uwb_data.extend([
+            f"Rov{neighbour.rover_id}",
+            f"{neighbour.x}",
+            f"{neighbour.y}",
+            f"{neighbour.z}"
+        ])
 
-        data_split = data.split(",")
-
-        if data_split[0] == "DIST":
-            num_anchors = min(int(data_split[1]), 4)
-
-            if 'POS' in data_split:
-                try:
-                    pos_index = data_split.index('POS')
-                    pos_x = float(data_split[pos_index + 1])
-                    pos_y = float(data_split[pos_index + 2])
-                    pos_z = float(data_split[pos_index + 3])
-
-                except (IndexError, ValueError) as e:
-                    print(f"Error processing POS data: {e}")
-                    continue
-
-        time.sleep(0.1)
-
-# Function to fetch other rovers' coordinates in a thread
-def fetch_other_rovers_coordinates(rover_id):
-    global other_rovers, latest_uwb_data
+    # Update the fetched rover count
+    uwb_data[2] = f"{len(neighbours)}"
+    return uwb_data
+
+# Function to pack the own position and the neighbour table as binary records
+def build_uwb_packed(rover_id):
+    records = [(int(rover_id), fix_count, to_wall_ns(timestamp) if timestamp else 0,
+                pos_x, pos_y, pos_z, pos_quality, make_status(fix_count > 0, num_anchors))]
+    neighbours = gossip.get_neighbours() if gossip is not None else []
+    for neighbour, age in neighbours:
+        records.append((neighbour.rover_id, neighbour.seq, neighbour.t_ns, neighbour.x, neighbour.y, neighbour.z,
+                        neighbour.quality, neighbour.status))
+    return encode_batch(records)
+
+# Function to push the UWB data to subscribers, replaces polling every other rover over Pyro5
+def publish_uwb_data(rover_id):
+    global latest_uwb_data
     while True:
-        uwb_data = ['CORD']  # Start with UWB data
-        
-        fetched_rover_count = 0
+        latest_uwb_data = build_uwb_data(rover_id)
+        telemetry.publish('uwb_data', latest_uwb_data)
+        if telemetry.has_subscribers('uwb_packed'):
+            telemetry.publish('uwb_packed', build_uwb_packed(rover_id))
+        time.sleep(0.2)  # Adjust the interval as needed
 
-        # Include own coordinates first
-        uwb_data.extend([
-            f"{num_anchors}",
-            f"{fetched_rover_count}", 
-            f"Rov{rover_id}",
-            f"{pos_x}",
-            f"{pos_y}",
-            f"{pos_z}"
-        ])
 
-        for other_rover in other_rovers:
-            try:
-                other_rover_uri = f"PYRO:coordinates@{other_rover['IP']}:{other_rover['Port']}"
-                x, y, z = get_coordinates(other_rover_uri)
-
-                if x is not None and y is not None:
-                    fetched_rover_count += 1  # Increment the count
-                    uwb_data.extend([
-                        f"Rov{other_rover['ID']}",
-                        f"{x}",
-                        f"{y}",
-                        f"{z}"
-                    ])
-
-            except Exception as e:
-                print(f"Error fetching data from Rover {other_rover['ID']}: {e}")
-
-        # Update the fetched rover count
-        uwb_data[2] = f"{fetched_rover_count}"
-        
-        latest_uwb_data = uwb_data
+# Function to start everything behind the "coordinates" service, also used by rover.py
+def start_uwb_services(rover_id):
+    global gossip
+    # Start the UWB reader in a separate thread
+    uwb_thread = threading.Thread(target=read_uwb, daemon=True)
+    uwb_thread.start()
 
-        # Print or store the final uwb_data including others and self coordinates
-        print(f"UWB Data: {uwb_data}")
-        time.sleep(0.2)  # Adjust the interval as needed
+    # Share the own position with the swarm and collect the others' over UDP multicast
+    gossip = SwarmGossip(rover_id, interface=os.environ.get("GOSSIP_INTERFACE", "0.0.0.0"))
+    gossip.start()
 
+    # Start the thread to push the UWB data to subscribers
+    publish_thread = threading.Thread(target=publish_uwb_data, args=(rover_id,), daemon=True)
+    publish_thread.start()
 
 if __name__ == "__main__":
     rover_id = "2"
 
-    # Read rover info from CSV and get other rovers' data
-    rover_data, other_rovers = read_rover_info("rovers.csv", rover_id)
-    
-    # Start the server in a separate thread
-    server_thread = threading.Thread(target=start_server, args=(rover_data["ID"], int(rover_data["Port"])))
-    server_thread.start()
-
-    # Start the UWB reader in a separate thread
-    uwb_thread = threading.Thread(target=read_uwb)
-    uwb_thread.start()
-
-    # Start the thread to fetch coordinates from other rovers
-    fetch_thread = threading.Thread(target=fetch_other_rovers_coordinates, args=(rover_data["ID"],))
-    fetch_thread.start()
+    # Only the coordinates service, like rover.py --services coordinates
+    start_uwb_services(rover_id)
+    start_server(rover_id)
     
\ No newline at end of file
@@ -2,10 +2,12 @@ import threading
 import time
 import Pyro5.api
 import csv
+import os
 import numpy as np
 import serial
 import pylops
-from datetime import datetime
+from timebase import now_ns, to_wall_ns, format_ns
+from uwb_parser import parse_frame
 
 # Global variables for shared data and locking
 latest_data = {}
@@ -39,6 +41,7 @@ class RoverServer:
                     'xr': latest_data.get('xr'),
                     'yr': latest_data.get('yr'),
                     'time': latest_data.get('time'),
+                    'time_ns': latest_data.get('time_ns'),
                 }
             else:
                 return "No data available"
@@ -114,44 +117,49 @@ def client_task(rover_id, other_rovers):
 def update_coordinates_from_serial(ser):
     global points
     while True:
-        if ser.inWaiting() > 0:
-            response = ser.readline().decode('utf-8').strip().split(',')
-            print(f"Received data: {response}")
-            
-            try:
-                idx_pos = response.index("POS")
-                if idx_pos != -1:
-                    pos_x = float(response[idx_pos + 1]) * 1000  # Convert to mm
-                    pos_y = float(response[idx_pos + 2]) * 1000  # Convert to mm
-
-                    # Update the points array and apply smoothing
-                    points = np.roll(points, -1, axis=0)
-                    points[-1] = [pos_x, pos_y]
-
-                    # Apply smoothing operator
-                    x_smooth = Sop @ points[:, 0]
-                    y_smooth = Sop @ points[:, 1]
-
-                    # Calculate smoothed maximum values
-                    xr = int(max(x_smooth))  # Smoothed x-coordinate
-                    yr = int(max(y_smooth))  # Smoothed y-coordinate
-                    
-                    timestamp = datetime.now().strftime('%Y%m%d%H%M%S.%f')[:-3]
-
-                    with latest_data_lock:
-                        latest_data.update({
-                           'raw_x': pos_x,
-                           'raw_y': pos_y,
-                           'x_smooth': x_smooth,
-                           'y_smooth': y_smooth,
-                           'xr': xr,
-                           'yr': yr,
-                           'time': timestamp
-                        })
-                    print(f"xr: {xr}")
-            except (ValueError, IndexError):
-                print(f"Error parsing serial data: {response}")
-        time.sleep(0.1)
+        # Blocks until a line arrives or the port timeout expires
+        line = ser.readline()
+        if not line:
+            continue
+        print(f"Received data: {line}")
+
+        frame = parse_frame(line, now_ns())
+        if frame is None or not frame.has_pos:
+            if frame is None and line.startswith((b'DIST', b'POS')):
+                print(f"Error parsing serial data: {line}")
+            continue
+
+        pos_x = frame.x * 1000  # Convert to mm
+        pos_y = frame.y * 1000  # Convert to mm
+
+        # Update the points array and apply smoothing
+        points = np.roll(points, -1, axis=0)
+        points[-1] = [pos_x, pos_y]
+
+        # Apply smoothing operator
+        x_smooth = Sop @ points[:, 0]
+        y_smooth = Sop @ points[:, 1]
+
+        # Calculate smoothed maximum values
+        xr = int(max(x_smooth))  # Smoothed x-coordinate
+        yr = int(max(y_smooth))  # Smoothed y-coordinate
+        
+        # 'time' keeps the old '%Y%m%d%H%M%S.%f' string, 'time_ns' adds wall-clock ns other rovers can compare
+        timestamp = format_ns(frame.t_ns)
+        timestamp_ns = to_wall_ns(frame.t_ns)
+
+        with latest_data_lock:
+            latest_data.update({
+               'raw_x': pos_x,
+               'raw_y': pos_y,
+               'x_smooth': x_smooth,
+               'y_smooth': y_smooth,
+               'xr': xr,
+               'yr': yr,
+               'time': timestamp,
+               'time_ns': timestamp_ns
+            })
+        print(f"xr: {xr}")
 
 # Function to read configuration from CSV
 def read_config(file_path, rover_id):
@@ -177,7 +185,7 @@ if __name__ == "__main__":
         exit(1)
 
     # Connect to the serial port
-    serial_port = "/dev/ttyACM0"  # Replace with actual serial port
+    serial_port = os.environ.get("UWB_PORT", "/dev/ttyACM0")  # Replace with actual serial port, or set UWB_PORT
     baud_rate = 115200
     try:
         ser = serial.Serial(serial_port, baud_rate, timeout=1)
@@ -0,0 +1,175 @@
+'''
+rev 01 - Rover positions shared over UDP multicast (or broadcast), one small packet per rover per tick
+rev 02 - Packets are telemetry_record batches of one record
+'''
+
+import socket
+import threading
+from collections import namedtuple
+
+from telemetry_record import encode_batch, decode_batch, make_status, HEADER_SIZE, RECORD_SIZE
+from timebase import now_ns, to_wall_ns
+
+GOSSIP_GROUP = '239.255.50.1'
+GOSSIP_PORT = 50050
+
+PACKET_SIZE = HEADER_SIZE + RECORD_SIZE
+
+# rx_ns is the local now_ns() when the packet arrived, ages are measured from it because
+# the fix time comes from the sender's clock
+Neighbour = namedtuple('Neighbour', ['rover_id', 'seq', 't_ns', 'x', 'y', 'z', 'quality', 'status', 'rx_ns'])
+
+class SwarmGossip:
+    """
+    Every rover sends its own latest fix to the group at a fixed rate and keeps the
+    newest fix heard from every other rover. N rovers cost N datagrams per tick in
+    total, instead of N*(N-1) Pyro connections.
+    """
+    def __init__(self, rover_id, group=GOSSIP_GROUP, port=GOSSIP_PORT, interface='0.0.0.0',
+                 rate=5.0, stale_after=2.0, broadcast=False, ttl=1, loopback=False):
+        """
+        Args:
+            rover_id (int | str): Own ID, the ID column of rovers.csv.
+            group (str, optional): Multicast group, or the broadcast address when broadcast=True.
+            port (int, optional): UDP port shared by the swarm.
+            interface (str, optional): Local address of the swarm network, '0.0.0.0' lets the OS pick.
+            rate (float, optional): Own packets per second. Defaults to 5, the old 0.2 s poll.
+            stale_after (float, optional): Seconds after which a silent neighbour is left out.
+            broadcast (bool, optional): Use broadcast for networks that drop multicast.
+            ttl (int, optional): Multicast hops, 1 keeps the packets on the local network.
+            loopback (bool, optional): Also deliver to other sockets on this host, for simulations.
+        """
+        self.rover_id = int(rover_id)
+        self.group = group
+        self.port = port
+        self.interface = interface
+        self.interval = 1.0 / rate
+        self.stale_after = stale_after
+        self.broadcast = broadcast
+        self.ttl = ttl
+        self.loopback = loopback
+
+        self.own = None     # (t_ns, x, y, z, quality, status)
+        self.seq = 0
+        self.neighbours = {}
+        self.packets_sent = 0
+        self.packets_received = 0
+        self.packets_dropped = 0
+
+        self.stop_event = threading.Event()
+        self.send_sock = None
+        self.recv_sock = None
+        self.threads = []
+
+    def _open_sockets(self):
+        recv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        recv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            # Several rovers (or the simulator) on one host share the port
+            recv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        recv_sock.bind(('', self.port))
+        recv_sock.settimeout(0.5)
+
+        send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        if self.broadcast:
+            send_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            if self.interface != '0.0.0.0':
+                send_sock.bind((self.interface, 0))
+        else:
+            membership = socket.inet_aton(self.group) + socket.inet_aton(self.interface)
+            recv_sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            send_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+            send_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1 if self.loopback else 0)
+            if self.interface != '0.0.0.0':
+                send_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        self.recv_sock = recv_sock
+        self.send_sock = send_sock
+
+    def start(self):
+        self._open_sockets()
+        self.stop_event.clear()
+        self.threads = [
+            threading.Thread(target=self._send_loop, name="gossip-send", daemon=True),
+            threading.Thread(target=self._receive_loop, name="gossip-receive", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        for sock in (self.send_sock, self.recv_sock):
+            if sock is not None:
+                sock.close()
+        self.send_sock = self.recv_sock = None
+
+    def update(self, x, y, z, t_ns=None, quality=0, num_anchors=0):
+        """Sets the own fix sent on the next tick. Never blocks on the network."""
+        self.own = (t_ns if t_ns is not None else now_ns(), x, y, z, quality, make_status(True, num_anchors))
+
+    def _send_loop(self):
+        next_send = now_ns()
+        interval_ns = int(self.interval * 1e9)
+        while not self.stop_event.is_set():
+            own = self.own
+            if own is not None:
+                t_ns, x, y, z, quality, status = own
+                self.seq += 1
+                packet = encode_batch([(self.rover_id, self.seq, to_wall_ns(t_ns), x, y, z, quality, status)])
+                try:
+                    self.send_sock.sendto(packet, (self.group, self.port))
+                    self.packets_sent += 1
+                except OSError as e:
+                    print(f"Gossip send failed: {e}")
+            next_send += interval_ns
+            delay = (next_send - now_ns()) / 1e9
+            if delay < 0:
+                next_send = now_ns()
+                delay = 0
+            self.stop_event.wait(delay)
+
+    def _receive_loop(self):
+        sock = self.recv_sock
+        while not self.stop_event.is_set():
+            try:
+                data, _ = sock.recvfrom(64)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.handle_packet(data)
+
+    def handle_packet(self, data, rx_ns=None):
+        """Stores one received packet in the neighbour table, also used by the benchmark."""
+        records = decode_batch(data)
+        if not records or records[0].id == self.rover_id:
+            return
+        record = records[0]
+        rx_ns = rx_ns if rx_ns is not None else now_ns()
+        rover_id, seq = record.id, record.seq
+        old = self.neighbours.get(rover_id)
+        # Datagrams can arrive out of order, older ones are dropped. A much lower sequence
+        # or a long silence means the rover restarted.
+        if old is not None and seq <= old.seq and old.seq - seq < 1000 and rx_ns - old.rx_ns < self.stale_after * 1e9:
+            self.packets_dropped += 1
+            return
+        self.neighbours[rover_id] = Neighbour(*record, rx_ns)
+        self.packets_received += 1
+
+    def get_neighbours(self, max_age=None):
+        """
+        Args:
+            max_age (float, optional): Seconds, defaults to stale_after.
+        Returns:
+            list: (Neighbour, age [s]) of every rover heard within max_age, sorted by rover ID.
+        """
+        max_age = self.stale_after if max_age is None else max_age
+        now = now_ns()
+        result = []
+        for rover_id in sorted(self.neighbours):
+            neighbour = self.neighbours[rover_id]
+            age = (now - neighbour.rx_ns) / 1e9
+            if age <= max_age:
+                result.append((neighbour, age))
+        return result
@@ -0,0 +1,307 @@
+'''
+rev 01 - Push telemetry from the rover Pyro5 services to subscribed ground stations
+rev 02 - Raw bytes (telemetry_record batches) are pushed with the marshal serializer
+rev 03 - Callback thread pool grows with the subscriptions, silent subscriptions are reported
+rev 04 - The pool belongs to the client daemon instead of the global config, subscribers are capped
+'''
+
+import socket
+import threading
+import time
+
+import Pyro5.api
+import Pyro5.errors
+from Pyro5 import svr_threads
+
+class _Subscription:
+    # One sender thread per subscriber, so a slow or lost ground station never delays the others
+    def __init__(self, publisher, callback_uri, topic, max_rate):
+        self.publisher = publisher
+        self.callback_uri = callback_uri
+        self.topic = topic
+        self.interval = 1.0 / max_rate if max_rate else 0.0
+        self.stop_event = threading.Event()
+        self.sent = 0
+        self.thread = threading.Thread(target=self._run, name=f"push-{topic}", daemon=True)
+
+    def _run(self):
+        publisher = self.publisher
+        proxy = Pyro5.api.Proxy(self.callback_uri)
+        proxy._pyroTimeout = 2.0
+        last_seq = 0    # The current value, if any, is sent right away
+        next_send = 0.0
+        failures = 0
+        while not self.stop_event.is_set():
+            with publisher.condition:
+                while publisher.sequence.get(self.topic, 0) == last_seq and not self.stop_event.is_set():
+                    publisher.condition.wait(1.0)
+            delay = next_send - time.monotonic()
+            if delay > 0 and self.stop_event.wait(delay):
+                break
+            if self.stop_event.is_set():
+                break
+            # Only the newest value is sent, values published while waiting are skipped
+            with publisher.condition:
+                last_seq = publisher.sequence[self.topic]
+                data = publisher.latest[self.topic]
+            # serpent would base64 encode packed records, marshal sends them as they are
+            proxy._pyroSerializer = "marshal" if isinstance(data, bytes) else None
+            try:
+                proxy.on_telemetry(self.topic, data)
+                self.sent += 1
+                failures = 0
+            except Pyro5.errors.CommunicationError as e:
+                failures += 1
+                proxy._pyroRelease()
+                if failures >= publisher.max_failures:
+                    print(f"Dropping subscriber {self.callback_uri}: {e}")
+                    publisher.unsubscribe(self.callback_uri, self.topic)
+                    break
+            # Paced on the schedule, not on the send time, so a fix arriving on time is
+            # not held back; at most one interval of credit is kept
+            next_send = max(next_send + self.interval, time.monotonic() - self.interval)
+        proxy._pyroRelease()
+
+class TelemetryPublisher:
+    """
+    Holds the latest value of each topic and pushes it to every subscriber of that topic,
+    at most max_rate times per second per subscriber. The Pyro5 services expose subscribe()
+    and unsubscribe() and call publish() for every new fix.
+    """
+    def __init__(self, max_rate=20.0, max_failures=3, max_subscribers=16):
+        """
+        Args:
+            max_rate (float, optional): Upper limit for the rate a subscriber may ask for [Hz].
+            max_failures (int, optional): Failed pushes in a row before a subscriber is dropped.
+            max_subscribers (int, optional): Subscriptions held at once, each one costs a sender
+                thread and a connection on the rover. Defaults to 16.
+        """
+        self.max_rate = max_rate
+        self.max_failures = max_failures
+        self.max_subscribers = max_subscribers
+        self.condition = threading.Condition()
+        self.latest = {}
+        self.sequence = {}
+        self.subscriptions = {}
+
+    def publish(self, topic, data):
+        """Stores data as the newest value of topic and wakes the senders. Never blocks on the network."""
+        with self.condition:
+            self.latest[topic] = data
+            self.sequence[topic] = self.sequence.get(topic, 0) + 1
+            self.condition.notify_all()
+
+    def has_subscribers(self, topic):
+        """True if anyone subscribed to topic, so the caller can skip building it."""
+        return any(key[1] == topic for key in list(self.subscriptions))
+
+    def subscribe(self, callback_uri, topic, max_rate=10.0):
+        """
+        Args:
+            callback_uri (str): URI of an object with an on_telemetry(topic, data) method.
+            topic (str): What to receive.
+            max_rate (float, optional): Pushes per second at most. Defaults to 10.
+        Returns:
+            float: The rate granted, capped at the publisher's max_rate. 0.0 if the
+            subscription was refused because max_subscribers are already subscribed.
+        """
+        max_rate = min(float(max_rate), self.max_rate) if max_rate else self.max_rate
+        subscription = _Subscription(self, str(callback_uri), topic, max_rate)
+        key = (subscription.callback_uri, topic)
+        with self.condition:
+            if key not in self.subscriptions and len(self.subscriptions) >= self.max_subscribers:
+                print(f"Refusing {subscription.callback_uri} for {topic}: {self.max_subscribers} subscribers already")
+                return 0.0
+            # Subscribing again replaces the old subscription, e.g. after the client restarted
+            old = self.subscriptions.pop(key, None)
+            self.subscriptions[key] = subscription
+        if old is not None:
+            old.stop_event.set()
+        subscription.thread.start()
+        print(f"{subscription.callback_uri} subscribed to {topic} at {max_rate:.1f} Hz")
+        return max_rate
+
+    def unsubscribe(self, callback_uri, topic):
+        with self.condition:
+            subscription = self.subscriptions.pop((str(callback_uri), topic), None)
+            self.condition.notify_all()
+        if subscription is not None:
+            subscription.stop_event.set()
+
+    def close(self):
+        for callback_uri, topic in list(self.subscriptions):
+            self.unsubscribe(callback_uri, topic)
+
+def local_address_for(host):
+    """Returns the local IP address used to reach host, so the rover can connect back to it."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect((host, 9))
+        return sock.getsockname()[0]
+    except OSError:
+        return "0.0.0.0"
+    finally:
+        sock.close()
+
+class _CallbackPool(svr_threads.Pool):
+    # svr_threads.Pool checks the global Pyro5.config.THREADPOOL_SIZE for every connection,
+    # this one its own size, so growing it leaves the other daemons of the process alone
+    def __init__(self, size):
+        self.size = size
+        super().__init__()
+
+    def process(self, job):
+        if self.closed:
+            raise svr_threads.PoolError("job queue is closed")
+        if self.idle:
+            worker = self.idle.pop()
+        elif self.num_workers() < self.size:
+            worker = svr_threads.Worker(self)
+            worker.start()
+        else:
+            raise svr_threads.NoFreeWorkersError("no free workers available, increase thread pool size")
+        self.busy.add(worker)
+        worker.process(job)
+
+@Pyro5.api.expose
+class TelemetryCallback:
+    def __init__(self, on_data):
+        self.on_data = on_data
+        self.last_received = 0.0
+        self.received = 0
+
+    # Not oneway: Pyro5 starts a new thread for every oneway call, which would also reorder
+    # the pushes. The sender thread on the rover absorbs the reply instead.
+    def on_telemetry(self, topic, data):
+        self.last_received = time.monotonic()
+        self.received += 1
+        try:
+            self.on_data(data)
+        except Exception as e:
+            print(f"Error handling {topic} telemetry: {e}")
+
+class TelemetryClient:
+    """
+    Ground station side: one Pyro5 daemon that receives the pushes of every subscribed
+    rover. Each subscription is renewed when nothing arrived for resubscribe_after seconds,
+    so rovers that restart are picked up again. Every subscription holds one connection to
+    the daemon, and the thread server refuses connections beyond its pool, so the daemon
+    gets its own pool that grows with the number of subscriptions.
+    """
+    SPARE_WORKERS = 8     # Connections besides the subscriptions, e.g. a rover reconnecting
+
+    def __init__(self, host=None, port=0):
+        """
+        Args:
+            host (str, optional): Local address the rovers connect back to, defaults to the
+                interface that reaches the first rover.
+            port (int, optional): Local port, 0 picks a free one.
+        """
+        self.host = host
+        self.port = port
+        self.daemon = None
+        self.daemon_thread = None
+        self.pool = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.subscriptions = []
+
+    def _start_daemon(self, service_uri):
+        with self.lock:
+            if self.daemon is None:
+                host = self.host or local_address_for(Pyro5.api.URI(service_uri).host)
+                self.daemon = Pyro5.api.Daemon(host=host, port=self.port)
+                server = self.daemon.transportServer
+                if isinstance(server, svr_threads.SocketServer_Threadpool):
+                    # Swapped before the request loop starts, nothing runs on the default pool yet
+                    default_pool, server.pool = server.pool, _CallbackPool(self.SPARE_WORKERS)
+                    default_pool.close()
+                    self.pool = server.pool
+                self.daemon_thread = threading.Thread(target=self.daemon.requestLoop, name="telemetry-daemon", daemon=True)
+                self.daemon_thread.start()
+            return self.daemon
+
+    def subscribe(self, service_uri, topic, on_data, max_rate=10.0, resubscribe_after=5.0):
+        """
+        Subscribes and keeps the subscription alive in the background.
+        Args:
+            service_uri (str): Rover service, e.g. "PYRO:coordinates@192.168.50.215:9090".
+            topic (str): Topic published by that service.
+            on_data (callable): Called as on_data(data) from the daemon thread for every push.
+            max_rate (float, optional): Pushes per second at most. Defaults to 10.
+            resubscribe_after (float, optional): Seconds of silence before subscribing again.
+        Returns:
+            TelemetryCallback: Has received and last_received for monitoring. None if the
+            service has no subscribe(), the caller should poll instead.
+        """
+        daemon = self._start_daemon(service_uri)
+        self._grow_pool(len(self.subscriptions) + 1)
+        callback = TelemetryCallback(on_data)
+        callback_uri = daemon.register(callback)
+        try:
+            if not self.subscribe_once(service_uri, topic, str(callback_uri), max_rate):
+                print(f"{service_uri} does not support subscriptions")
+                daemon.unregister(callback)
+                return None
+        except Pyro5.errors.CommunicationError as e:
+            # Not reachable yet, the keeper thread retries
+            print(f"Subscribing to {service_uri} failed: {e}")
+        thread = threading.Thread(target=self._keep_subscribed, daemon=True,
+                                  args=(service_uri, topic, callback, str(callback_uri), max_rate, resubscribe_after))
+        self.subscriptions.append((service_uri, topic, str(callback_uri)))
+        thread.start()
+        return callback
+
+    def _grow_pool(self, subscriptions):
+        # The pool checks its size for every new connection, so growing it takes effect
+        # while the daemon runs; workers are only started when connections arrive.
+        # The multiplex server has no pool.
+        with self.lock:
+            if self.pool is not None:
+                self.pool.size = max(self.pool.size, subscriptions + self.SPARE_WORKERS)
+
+    def subscribe_once(self, service_uri, topic, callback_uri, max_rate):
+        """
+        Returns:
+            bool: False if the service has no subscribe(), i.e. an older rover script.
+        """
+        with Pyro5.api.Proxy(service_uri) as proxy:
+            proxy._pyroTimeout = 2.0
+            try:
+                granted = proxy.subscribe(callback_uri, topic, max_rate)
+            except AttributeError:
+                return False
+        if granted == 0:
+            # The rover is at max_subscribers, _keep_subscribed tries again
+            print(f"{service_uri} refused the {topic} subscription, too many subscribers")
+        return True
+
+    def _keep_subscribed(self, service_uri, topic, callback, callback_uri, max_rate, resubscribe_after):
+        last_subscribed = time.monotonic()
+        reported = False
+        while not self.stop_event.wait(1.0):
+            if time.monotonic() - max(callback.last_received, last_subscribed) > resubscribe_after:
+                if callback.received == 0 and not reported:
+                    print(f"No {topic} telemetry from {service_uri} since subscribing, subscribing again")
+                    reported = True
+                try:
+                    self.subscribe_once(service_uri, topic, callback_uri, max_rate)
+                except Pyro5.errors.CommunicationError as e:
+                    print(f"Subscribing to {service_uri} failed: {e}")
+                last_subscribed = time.monotonic()
+
+    def close(self):
+        """Unsubscribes everywhere and stops the daemon."""
+        self.stop_event.set()
+        for service_uri, topic, callback_uri in self.subscriptions:
+            try:
+                with Pyro5.api.Proxy(service_uri) as proxy:
+                    proxy._pyroTimeout = 1.0
+                    proxy.unsubscribe(callback_uri, topic)
+            except Exception:
+                pass
+        self.subscriptions.clear()
+        if self.daemon is not None:
+            self.daemon.shutdown()
+            self.daemon = None
+            self.pool = None
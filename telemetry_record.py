@@ -0,0 +1,101 @@
+'''
+rev 01 - Fixed binary position record (id, seq, t_ns, x, y, z, quality, status), single and batched
+'''
+
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# id uint16 (rover number, 'Rov5' -> 5), seq uint32, t_ns int64 (wall-clock ns), x, y, z float32,
+# quality uint8, status uint8
+_RECORD = struct.Struct('<HIqfffBB')
+RECORD_SIZE = _RECORD.size
+
+# magic, version, record count
+_HEADER = struct.Struct('<2sBH')
+_MAGIC = b'TR'
+_VERSION = 1
+HEADER_SIZE = _HEADER.size
+
+# status: bit 0 set for a valid fix, bits 4-7 the number of anchors used (0-15)
+STATUS_VALID = 0x01
+
+RECORD_DTYPE = np.dtype([('id', '<u2'), ('seq', '<u4'), ('t_ns', '<i8'), ('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                         ('quality', 'u1'), ('status', 'u1')])
+
+PositionRecord = namedtuple('PositionRecord', ['id', 'seq', 't_ns', 'x', 'y', 'z', 'quality', 'status'])
+
+def make_status(valid, num_anchors=0):
+    return (STATUS_VALID if valid else 0) | (min(int(num_anchors), 15) << 4)
+
+def is_valid(status):
+    return bool(status & STATUS_VALID)
+
+def num_anchors(status):
+    return status >> 4
+
+def encode_record(rover_id, seq, t_ns, x, y, z, quality=0, status=STATUS_VALID):
+    """
+    Returns:
+        bytes: RECORD_SIZE (28) bytes. A missing coordinate is sent as NaN.
+    """
+    return _RECORD.pack(int(rover_id), seq & 0xFFFFFFFF, t_ns,
+                        x if x is not None else float('nan'),
+                        y if y is not None else float('nan'),
+                        z if z is not None else float('nan'),
+                        quality, status)
+
+def decode_record(data, offset=0):
+    return PositionRecord(*_RECORD.unpack_from(data, offset))
+
+def encode_batch(records):
+    """
+    Args:
+        records (list): PositionRecord or (id, seq, t_ns, x, y, z, quality, status) tuples.
+    Returns:
+        bytes: Header and the records, HEADER_SIZE + n * RECORD_SIZE bytes.
+    """
+    return _HEADER.pack(_MAGIC, _VERSION, len(records)) + b''.join(encode_record(*record) for record in records)
+
+def decode_batch(data):
+    """
+    Returns:
+        list: PositionRecord of every record, or None if data is not a batch of this version.
+    """
+    count = _batch_count(data)
+    if count is None:
+        return None
+    return [PositionRecord(*fields) for fields in _RECORD.iter_unpack(data[HEADER_SIZE:HEADER_SIZE + count * RECORD_SIZE])]
+
+def decode_batch_array(data):
+    """
+    Decodes a batch without a Python loop, e.g. for a whole swarm.
+    Returns:
+        numpy.ndarray: Structured array with RECORD_DTYPE fields, or None if data is not a batch.
+    """
+    count = _batch_count(data)
+    if count is None:
+        return None
+    return np.frombuffer(data, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE)
+
+def _batch_count(data):
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, version, count = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION or len(data) < HEADER_SIZE + count * RECORD_SIZE:
+        return None
+    return count
+
+def rover_number(name):
+    """Record id of a rover from its tag name, e.g. 'Rov5' -> 5. None if name is not 'RovN'."""
+    if not name or not name.startswith('Rov'):
+        return None
+    try:
+        return int(name[3:])
+    except ValueError:
+        return None
+
+def rover_name(record_id):
+    """Tag name of a record id, e.g. 5 -> 'Rov5'."""
+    return f"Rov{record_id}"
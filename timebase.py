@@ -0,0 +1,62 @@
+'''
+rev 01 - Monotonic nanosecond time base with one wall-clock anchor for converting logs
+'''
+
+import csv
+import datetime
+import time
+
+# Stamp samples with this in the hot path: one integer, no formatting
+now_ns = time.monotonic_ns
+
+def _capture_anchor():
+    # Bracket the wall-clock read with two monotonic reads and keep the midpoint
+    mono_before = time.monotonic_ns()
+    wall = time.time_ns()
+    mono_after = time.monotonic_ns()
+    return wall, (mono_before + mono_after) // 2
+
+# The same instant on both clocks, captured once at import
+ANCHOR_WALL_NS, ANCHOR_MONO_NS = _capture_anchor()
+
+def elapsed_s(t0_ns, t1_ns):
+    """Seconds between two now_ns() stamps."""
+    return (t1_ns - t0_ns) * 1e-9
+
+def to_wall_ns(t_ns, anchor=None):
+    """
+    Converts now_ns() stamps to wall-clock nanoseconds since the epoch.
+    Args:
+        t_ns (int | numpy.ndarray | pandas.Series): Monotonic stamps.
+        anchor (tuple, optional): (wall_ns, mono_ns) from load_anchor(), defaults to this process.
+    """
+    wall_ns, mono_ns = anchor if anchor is not None else (ANCHOR_WALL_NS, ANCHOR_MONO_NS)
+    return t_ns - mono_ns + wall_ns
+
+def to_datetime(t_ns, anchor=None):
+    """Converts one now_ns() stamp to a local datetime."""
+    return datetime.datetime.fromtimestamp(to_wall_ns(t_ns, anchor) / 1e9)
+
+def format_ns(t_ns, fmt='%Y%m%d%H%M%S.%f', anchor=None):
+    """
+    Formats a now_ns() stamp with millisecond resolution, e.g. '20240823122230.989'.
+    Meant for file names and saving logs, not for the sample loop.
+    """
+    return to_datetime(t_ns, anchor).strftime(fmt)[:-3]
+
+def save_anchor(file_path):
+    """Writes the wall-clock anchor so logs stamped with now_ns() can be converted later."""
+    with open(file_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['wall_ns', 'mono_ns'])
+        writer.writerow([ANCHOR_WALL_NS, ANCHOR_MONO_NS])
+
+def load_anchor(file_path):
+    """
+    Reads an anchor written by save_anchor().
+    Returns:
+        tuple: (wall_ns, mono_ns) to pass as anchor to to_wall_ns() / format_ns().
+    """
+    with open(file_path, mode='r') as file:
+        row = next(csv.DictReader(file))
+    return int(row['wall_ns']), int(row['mono_ns'])
@@ -5,6 +5,7 @@ import HiwonderSDK.mecanum as mecanum
 import HiwonderSDK.Board as Board
 import time
 import datetime
+from scheduled_start import wait_until
 
 #######################################################################
 
@@ -86,13 +87,11 @@ if __name__ == "__main__":
     print(f"t_execute rover {id_rover} = {t_execute}")
    
     try:
-        while True:
-            if should_move_now(t_execute):
-                execute_movement()
-                break
-            else:
-                pass
-            time.sleep(0.05)
+        # Sleeps until just before t_execute instead of checking every 50 ms
+        target = datetime.datetime.combine(datetime.date.today(), t_execute)
+        late_ns = wait_until(int(target.timestamp() * 1e9))
+        print(f"t_current_rover {id_rover} = {datetime.datetime.now().time()}, {late_ns / 1e6:.3f} ms late")
+        execute_movement()
            
     except KeyboardInterrupt:
         print("Keyboard Interrupt")
@@ -1,47 +1,24 @@
 import Pyro5.api
 import threading
 import time
-import pandas as pd
 import logging
-from ble_manager import BLEDeviceManager
+from pyro_coordinates_rev04 import RoverServer
+from rover_daemon import bind_address
 
 logging.basicConfig(level=logging.WARNING)
 
 @Pyro5.api.expose
-class Uwb:
-    def __init__(self):
-        self.device_manager = BLEDeviceManager()
-        self.device_manager.stop_event = threading.Event()
-        self.connection_lock = threading.Lock()
-
-    def start_connection(self, id_rover):   
-        self.device_manager.start_connection(id_rover)
-
-    def get_coordinates(self):
-        if self.device_manager.is_connected():
-            info = self.device_manager.get_device_info()
-            
-            if not pd.api.types.is_datetime64_any_dtype(info['Time']):
-                info['Time'] = pd.to_datetime(info['Time'])
-
-            # Convert pandas Series to lists or scalars
-            name = info['Name'].tolist() if isinstance(info['Name'], pd.Series) else info['Name']
-            x = info['X'].tolist() if isinstance(info['X'], pd.Series) else info['X']
-            y = info['Y'].tolist() if isinstance(info['Y'], pd.Series) else info['Y']
-            z = info['Z'].tolist() if isinstance(info['Z'], pd.Series) else info['Z']
-            t_tag = info['Time'].dt.strftime('%Y-%m-%d %H:%M:%S.%f').tolist()
-            status = info['Status'].tolist() if isinstance(info['Status'], pd.Series) else info['Status']
-
-            return name, x, y, z, t_tag, status
-        else:
-            return None, None, None, None, None, None
+class Uwb(RoverServer):
+    # Same service as pyro_coordinates_rev04, registered as "uwb" by rover.py:
+    # get_coordinates() plus subscribe()/unsubscribe() for pushed fixes
+    pass
         
 def main():
     uwb_server = Uwb()
-    daemon = Pyro5.api.Daemon(host="192.168.50.141", port=9091)
+    daemon = Pyro5.api.Daemon(host=bind_address(), port=9091)
     uri = daemon.register(uwb_server, "uwb")
     
-    thread = threading.Thread(target=rover_server.start_connection, args=(5,))
+    thread = threading.Thread(target=uwb_server.start_connection, args=(5,))
     thread.daemon = True
     thread.start()
     
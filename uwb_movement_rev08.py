@@ -1,6 +1,8 @@
 '''
 rev 07 - Setpoint interval at each 1 seconds, ignore intermediate
 rev 08 - Restructure database
+rev 09 - Monotonic ns timestamps (timebase), formatted only when the record is saved
+rev 10 - Optional on-rover multilateration from the DIST anchor ranges
 '''
 
 import threading
@@ -9,18 +11,30 @@ import pylops
 import signal
 import serial
 import math
+import os
 
 import pandas as pd
 import numpy as np
 
-from datetime import datetime
+import timebase
 from uwb_usb import UwbUsbReader
+from position_history import PositionHistory, load_spill
+from multilateration import Multilaterator
 from HiwonderSDK import mecanum, Board
 ############################################
 #Global var
-pos_x, pos_y, pos_z, timestamp = 0, 0, 0, 0
-timestamp_list, pos_x_list, pos_y_list, pos_z_list = [], [], [], []
+pos_x, pos_y, pos_z = 0, 0, 0
+timestamp = None        # now_ns() stamp of the last frame, None until the first one arrives
+# Last 6000 fixes in memory, older fixes spill to disk (read back with position_history.load_spill),
+# the whole run is exported to data_with_timestamps_<run>.csv at shutdown.
+# One spill file per run, its t_ns stamps only convert to wall time with this run's anchor next to it
+run_stamp = timebase.format_ns(timebase.now_ns(), '%Y%m%d%H%M%S.%f')
+uwb_history = PositionHistory(capacity=6000, spill_path=f'data_with_timestamps_{run_stamp}.bin')
+timebase.save_anchor(f'data_with_timestamps_{run_stamp}_anchor.csv')
 uwb_is_connected = False
+# 'pos' uses the tag's own POS solution, 'ranges' solves the position on the rover from the anchor ranges
+POSITION_SOURCE = 'pos'
+multilaterator = Multilaterator(z=0.0)
 
 ############################################
 stop_requested = False
@@ -35,26 +49,10 @@ chassis = mecanum.MecanumChassis()
 
 data_ready_event = threading.Event()
 ##########################################################################
-def get_current_timestamp():
-    # Get the current time
-    now = datetime.now()
-
-    # Format hours, minutes, and seconds
-    time_str = now.strftime("%H%M%S")
-
-    # Get milliseconds (fraction of a second)
-    milliseconds = int(time.time() * 1000) % 1000
-
-    # Format milliseconds as three digits
-    milliseconds_str = f"{milliseconds:03}"
-
-    # Combine the time string with milliseconds
-    timestamp = f"{time_str}.{milliseconds_str}"
-    return timestamp
-##########################################################################
 def read_uwb():
-    global pos_x, pos_y, pos_z, timestamp_list, pos_x_list, pos_y_list, pos_z_list, timestamp, uwb_is_connected
-    serial_port = "/dev/ttyACM0"
+    global pos_x, pos_y, pos_z, timestamp, uwb_is_connected
+    # UWB_PORT points the reader at another device, e.g. the uwb_replay pty
+    serial_port = os.environ.get("UWB_PORT", "/dev/ttyACM0")
     baud_rate = 115200
     
     print("Thread UWB starting...")
@@ -73,46 +71,29 @@ def read_uwb():
     #Activates shell mode
     reader.activate_shell_mode()
     time.sleep(1)
+    # Background reader blocks on the port and answers the shell prompt with lec
+    reader.start_reader()
     
     uwb_is_connected = True
     
     while True:
-        data = reader.read_data()
-        # Get timestamp
-        timestamp = get_current_timestamp()
-
-        if data == "dwm>":
-            reader.request_lec()
-        elif data is None:
+        frame = reader.get_frame(timeout=1)
+        if frame is None:
             continue
+        # Get timestamp
+        timestamp = frame.t_ns
 
-        #print("data:", data)
-        data_split = data.split(",")
-        if data_split[0] == "DIST":
-            #print("Data:", data_split)
-            # Check if 'POS' exists in the data list
-            if 'POS' in data_split:
-                # Find the index of 'POS'
-                pos_index = data_split.index('POS')
-                #print("Index:", pos_index)
-                try:
-                    # Extract position data: X, Y, Z, and quality
-                    pos_x = float(data_split[pos_index + 1])
-                    pos_y = float(data_split[pos_index + 2])
-                    pos_z = float(data_split[pos_index + 3])
-                except ValueError:
-                    pos_x = 0
-                    pos_y = 0
-                    pos_z = 0
-            else:
-                pass
+        if POSITION_SOURCE == 'ranges':
+            solution = multilaterator.update(frame)
+            if solution is not None:
+                pos_x, pos_y, pos_z, _ = solution
+                uwb_history.append(pos_x, pos_y, pos_z, frame.t_ns)
+        elif frame.has_pos:
+            pos_x, pos_y, pos_z = frame.x, frame.y, frame.z
+            # Only new fixes go into the history
+            uwb_history.append(pos_x, pos_y, pos_z, frame.t_ns)
         
         #print(f"Timestamp: {timestamp}, X: {pos_x} meters, Y: {pos_y} meters, Z: {pos_z} meters")
-        # Append the data to respective lists
-        timestamp_list.append(timestamp)
-        pos_x_list.append(pos_x)
-        pos_y_list.append(pos_y)
-        pos_z_list.append(pos_z)
             
 ##########################################################################
 def signal_handler(signum, frame):
@@ -170,7 +151,7 @@ def execute_movement(theta_xy, R, G, B):
         
 ##########################################################################        
 def start_movement(id_rover, wait_for_input=True):
-    global stop_requested, pos_x, pos_y, pos_z, timestamp_list, pos_x_list, pos_y_list, pos_z_list, timestamp
+    global stop_requested, pos_x, pos_y, pos_z, timestamp
     global uwb_is_connected, df
     file_path = "Drone 1(0.3).csv"
     df, setpoints = read_csv_and_loop_by_row(file_path)
@@ -279,17 +260,23 @@ def start_movement(id_rover, wait_for_input=True):
     finally:
         chassis.set_velocity(0, 0, 0)   
        
-        # Create a DataFrame from the lists
-        uwb_df = pd.DataFrame({
-            'Timestamp': timestamp_list,
-            'Pos_X': pos_x_list,
-            'Pos_Y': pos_y_list,
-            'Pos_Z': pos_z_list
-        })
-        # Optionally, save the DataFrame to a CSV file
-        uwb_df.to_csv('data_with_timestamps.csv', index=False)
+        # Only the fixes still in memory are written here, the rest already spilled
+        uwb_history.close()
+        if uwb_history.count:
+            # Same columns as the old data_with_timestamps.csv, uwb_replay.load_track reads it
+            spill = load_spill(uwb_history.spill_path)
+            uwb_df = pd.DataFrame({
+                'Timestamp': [timebase.format_ns(t_ns, '%H%M%S.%f') for t_ns in spill['t_ns']],
+                'Pos_X': spill['x'],
+                'Pos_Y': spill['y'],
+                'Pos_Z': spill['z']
+            })
+            uwb_df.to_csv(f'data_with_timestamps_{run_stamp}.csv', index=False)
         #df.to_csv("movement_record_" + str(timestamp) + ".csv")
-        df2.to_csv("movement_record_" + str(timestamp) + ".csv")
+        # Rows logged before the first UWB frame have no timestamp
+        df2['timestamp'] = df2['timestamp'].map(
+            lambda t_ns: timebase.format_ns(t_ns, '%H%M%S.%f') if t_ns is not None else None)
+        df2.to_csv("movement_record_" + timebase.format_ns(timebase.now_ns(), '%H%M%S.%f') + ".csv")
         
         # Turn off all lights
         Board.RGB.setPixelColor(0, Board.PixelColor(0, 0, 0))
@@ -0,0 +1,219 @@
+'''
+rev 01 - Shared parser for DWM1001 "lec" DIST/POS lines and binary dwm_loc_get frames
+'''
+
+import math
+import struct
+
+import numpy as np
+
+# DWM1001 UART TLV API
+TLV_TYPE_RET_VAL = 0x40
+TLV_TYPE_POS_XYZ = 0x41
+TLV_TYPE_RNG_AN_DIST = 0x48
+TLV_TYPE_RNG_AN_POS_DIST = 0x49
+TLV_POSITION = struct.Struct('<iiiB')          # x, y, z [mm], quality
+TLV_TAG_ANCHOR = struct.Struct('<HiBiiiB')     # address, distance [mm], quality, x, y, z [mm], quality
+TLV_ANCHOR_ANCHOR = struct.Struct('<QiB')      # address, distance [mm], quality
+
+class UwbFrame:
+    """
+    One parsed position frame. Coordinates and distances are in meters.
+    x, y, z and quality are None when the frame carried no POS block.
+    """
+    __slots__ = ('t_ns', 'x', 'y', 'z', 'quality', 'anchor_ids', 'anchor_xyz', 'distances')
+
+    def __init__(self, t_ns=0, x=None, y=None, z=None, quality=None, anchor_ids=(), anchor_xyz=(), distances=()):
+        self.t_ns = t_ns
+        self.x = x
+        self.y = y
+        self.z = z
+        self.quality = quality
+        self.anchor_ids = anchor_ids
+        self.anchor_xyz = anchor_xyz
+        self.distances = distances
+
+    @property
+    def has_pos(self):
+        return self.x is not None
+
+    def __repr__(self):
+        return (f"UwbFrame(t_ns={self.t_ns}, x={self.x}, y={self.y}, z={self.z}, quality={self.quality}, "
+                f"anchor_ids={self.anchor_ids}, distances={self.distances})")
+
+def parse_frame(line, t_ns=0, anchors=True):
+    """
+    Parses one "lec" line. The raw line is split once and every field is read at its fixed
+    offset (POS follows the count * 6 anchor fields), there is no decode, strip or search for 'POS'.
+    The single split() is kept on purpose: walking the commas with find() and slicing in place was
+    measured 2-4x slower (benchmark_uwb_parser.py), the per-field Python calls cost more than the list.
+    Args:
+        line (str | bytes): A line such as "DIST,2,AN0,1151,5.00,8.00,2.25,6.48,AN1,...,POS,1.47,4.56,0.31,56".
+            bytes straight from the serial port are parsed as they are.
+        t_ns (int, optional): Timestamp stored on the frame.
+        anchors (bool, optional): Also decode the anchor IDs, positions and distances. Defaults to True.
+    Returns:
+        UwbFrame: The parsed frame, or None if the line is not a DIST/POS line or is malformed.
+    """
+    fields = line.split(b',' if isinstance(line, bytes) else ',')
+    tag = fields[0]
+    try:
+        if tag == b'DIST' or tag == 'DIST':
+            count = int(fields[1])
+            p = 2 + 6 * count
+            anchor_ids = []
+            anchor_xyz = []
+            distances = []
+            if anchors:
+                for i in range(2, min(p, len(fields) - 5), 6):
+                    # ANn,id,x,y,z,distance
+                    anchor_ids.append(int(fields[i + 1], 16))
+                    anchor_xyz.append((float(fields[i + 2]), float(fields[i + 3]), float(fields[i + 4])))
+                    distances.append(float(fields[i + 5]))
+            if len(fields) < p + 4 or (fields[p] != b'POS' and fields[p] != 'POS'):
+                return UwbFrame(t_ns, None, None, None, None, anchor_ids, anchor_xyz, distances)
+        elif tag == b'POS' or tag == 'POS':
+            p = 0
+            anchor_ids = anchor_xyz = distances = ()
+        else:
+            return None
+        quality = int(fields[p + 4]) if len(fields) > p + 4 else 0
+        return UwbFrame(t_ns, float(fields[p + 1]), float(fields[p + 2]), float(fields[p + 3]), quality,
+                        anchor_ids, anchor_xyz, distances)
+    except (ValueError, IndexError):
+        return None
+
+def decode_loc_get(buffer, t_ns=0):
+    """
+    Decodes a binary dwm_loc_get response.
+    Args:
+        buffer (bytes | bytearray | memoryview): The complete response, starting with the return value TLV.
+        t_ns (int, optional): Timestamp stored on the frame.
+    Returns:
+        UwbFrame: The decoded frame, anchor coordinates are None when the node reports distances only.
+        Returns None if the response is an error or malformed.
+    """
+    if len(buffer) < 5 + TLV_POSITION.size or buffer[0] != TLV_TYPE_RET_VAL or buffer[2] != 0:
+        return None
+    if buffer[3] != TLV_TYPE_POS_XYZ:
+        return None
+    x, y, z, quality = TLV_POSITION.unpack_from(buffer, 5)
+
+    anchor_ids = []
+    anchor_xyz = []
+    distances = []
+    offset = 5 + TLV_POSITION.size
+    if len(buffer) >= offset + 3:
+        length = buffer[offset + 1]
+        count = buffer[offset + 2]
+        offset += 3
+        if count and length - 1 == count * TLV_TAG_ANCHOR.size:
+            for _ in range(count):
+                address, dist, _, ax, ay, az, _ = TLV_TAG_ANCHOR.unpack_from(buffer, offset)
+                anchor_ids.append(address)
+                anchor_xyz.append((ax / 1000, ay / 1000, az / 1000))
+                distances.append(dist / 1000)
+                offset += TLV_TAG_ANCHOR.size
+        elif count and length - 1 == count * TLV_ANCHOR_ANCHOR.size:
+            for _ in range(count):
+                address, dist, _ = TLV_ANCHOR_ANCHOR.unpack_from(buffer, offset)
+                anchor_ids.append(address)
+                anchor_xyz.append(None)
+                distances.append(dist / 1000)
+                offset += TLV_ANCHOR_ANCHOR.size
+
+    return UwbFrame(t_ns, x / 1000, y / 1000, z / 1000, quality, anchor_ids, anchor_xyz, distances)
+
+def encode_loc_get(x, y, z, quality=100, anchors=()):
+    """
+    Builds a dwm_loc_get response the way a tag sends it, the inverse of decode_loc_get().
+    Args:
+        x, y, z (float): Tag position in meters.
+        quality (int, optional): Position quality factor. Defaults to 100.
+        anchors (iterable, optional): (anchor_id, ax, ay, az, distance) tuples in meters.
+    Returns:
+        bytes: The response frame.
+    """
+    frame = bytearray([TLV_TYPE_RET_VAL, 0x01, 0x00, TLV_TYPE_POS_XYZ, TLV_POSITION.size])
+    frame += TLV_POSITION.pack(round(x * 1000), round(y * 1000), round(z * 1000), int(quality))
+    frame += bytes([TLV_TYPE_RNG_AN_POS_DIST, 1 + len(anchors) * TLV_TAG_ANCHOR.size, len(anchors)])
+    for anchor_id, ax, ay, az, distance in anchors:
+        frame += TLV_TAG_ANCHOR.pack(anchor_id, round(distance * 1000), 100,
+                                     round(ax * 1000), round(ay * 1000), round(az * 1000), 100)
+    return bytes(frame)
+
+def parse_log(source, max_anchors=4):
+    """
+    Parses a whole captured log into NumPy arrays.
+    Args:
+        source (str | iterable): Path of a text log with one "lec" line per row, or an iterable of lines.
+        max_anchors (int, optional): Number of anchor columns kept per frame. Defaults to 4.
+    Returns:
+        dict: 'x', 'y', 'z', 'distances' (float64, NaN when missing), 'quality' (int16, -1 when missing),
+        'anchor_ids' (int64, -1 when missing), 'anchor_xyz' (n, max_anchors, 3) and 'num_anchors'.
+        Lines that are not DIST/POS frames are skipped.
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            lines = f.read().splitlines()
+    else:
+        lines = source if hasattr(source, '__len__') else list(source)
+
+    n = len(lines)
+    x = np.full(n, np.nan)
+    y = np.full(n, np.nan)
+    z = np.full(n, np.nan)
+    quality = np.full(n, -1, dtype=np.int16)
+    num_anchors = np.zeros(n, dtype=np.int8)
+    anchor_ids = np.full((n, max_anchors), -1, dtype=np.int64)
+    anchor_xyz = np.full((n, max_anchors, 3), np.nan)
+    distances = np.full((n, max_anchors), np.nan)
+
+    row = 0
+    for line in lines:
+        frame = parse_frame(line)
+        if frame is None:
+            continue
+        if frame.x is not None:
+            x[row] = frame.x
+            y[row] = frame.y
+            z[row] = frame.z
+            quality[row] = frame.quality
+        count = min(len(frame.distances), max_anchors)
+        num_anchors[row] = count
+        if count:
+            anchor_ids[row, :count] = frame.anchor_ids[:count]
+            distances[row, :count] = frame.distances[:count]
+            for k in range(count):
+                xyz = frame.anchor_xyz[k]
+                if xyz is not None:
+                    anchor_xyz[row, k] = xyz
+        row += 1
+
+    return {
+        'x': x[:row],
+        'y': y[:row],
+        'z': z[:row],
+        'quality': quality[:row],
+        'num_anchors': num_anchors[:row],
+        'anchor_ids': anchor_ids[:row],
+        'anchor_xyz': anchor_xyz[:row],
+        'distances': distances[:row],
+    }
+
+def format_frame(x, y, z, quality=100, anchors=()):
+    """
+    Formats a position the way the "lec" command prints it.
+    Args:
+        x, y, z (float): Tag position in meters.
+        quality (int, optional): Position quality factor. Defaults to 100.
+        anchors (iterable, optional): (anchor_id, ax, ay, az, distance) tuples.
+    Returns:
+        str: The line without line ending.
+    """
+    parts = [f"DIST,{len(anchors)}"]
+    for k, (anchor_id, ax, ay, az, distance) in enumerate(anchors):
+        parts.append(f"AN{k},{anchor_id:04X},{ax:.2f},{ay:.2f},{az:.2f},{distance:.2f}")
+    if not (math.isnan(x) or math.isnan(y) or math.isnan(z)):
+        parts.append(f"POS,{x:.2f},{y:.2f},{z:.2f},{int(quality)}")
+    return ",".join(parts)
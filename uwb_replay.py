@@ -0,0 +1,246 @@
+'''
+rev 01 - Replays recorded positions as a DWM1001 on a pseudo-terminal, no hardware needed
+'''
+
+import argparse
+import csv
+import datetime
+import math
+import os
+import pty
+import random
+import select
+import threading
+import time
+import tty
+
+from timebase import now_ns
+from uwb_parser import format_frame, encode_loc_get, parse_frame
+
+# Anchor ID and position [m] used to synthesize the DIST part of each line
+DEFAULT_ANCHORS = [(0x1151, 0.0, 0.0, 2.25), (0x0CA8, 0.0, 8.0, 2.25), (0x111C, 5.0, 8.0, 2.25), (0x1150, 5.0, 0.0, 2.25)]
+
+TIME_COLUMNS = ['Timestamp', 'timestamp', 'Time [msec]', 'T_rover']
+X_COLUMNS = ['Pos_X', 'rover_x', 'xr', 'X', 'x']
+Y_COLUMNS = ['Pos_Y', 'rover_y', 'yr', 'Y', 'y']
+Z_COLUMNS = ['Pos_Z', 'rover_z', 'zr', 'Z', 'z']
+TIME_FORMATS = ['%Y%m%d%H%M%S.%f', '%H%M%S.%f', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y%m%d %H%M%S.%f']
+
+def _parse_time(value, column):
+    if column == 'Time [msec]':
+        return float(value) / 1000
+    for fmt in TIME_FORMATS:
+        try:
+            t = datetime.datetime.strptime(value, fmt)
+            return t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1e6 + t.toordinal() * 86400
+        except ValueError:
+            pass
+    return float(value)
+
+def _parse_number(value):
+    # rover_data*.csv stores some values as "[142.64356929]"
+    return float(value.strip().strip('[]'))
+
+def load_track(file_path, scale=1.0, rate=10.0):
+    """
+    Loads recorded positions.
+    Args:
+        file_path (str): A CSV such as data_with_timestamps.csv or rover_data*.csv, or a text
+            log of raw "lec" lines.
+        scale (float, optional): Multiplier that converts the file's units to meters. Defaults to 1.0.
+        rate (float, optional): Lines per second for logs without timestamps. Defaults to 10.
+    Returns:
+        list: (t_s, x, y, z) tuples with t_s relative to the first sample.
+    """
+    track = []
+    if not file_path.lower().endswith('.csv'):
+        with open(file_path, 'rb') as f:
+            for line in f:
+                frame = parse_frame(line)
+                if frame is not None and frame.has_pos:
+                    track.append((len(track) / rate, frame.x * scale, frame.y * scale, frame.z * scale))
+        return track
+
+    with open(file_path, mode='r', newline='') as file:
+        reader = csv.DictReader(file)
+        columns = reader.fieldnames or []
+        t_col = next((c for c in TIME_COLUMNS if c in columns), None)
+        x_col = next((c for c in X_COLUMNS if c in columns), None)
+        y_col = next((c for c in Y_COLUMNS if c in columns), None)
+        z_col = next((c for c in Z_COLUMNS if c in columns), None)
+        if x_col is None or y_col is None:
+            raise ValueError(f"No position columns found in {file_path}: {columns}")
+        for row in reader:
+            try:
+                x = _parse_number(row[x_col]) * scale
+                y = _parse_number(row[y_col]) * scale
+                z = _parse_number(row[z_col]) * scale if z_col and row[z_col] else 0.0
+                t = _parse_time(row[t_col], t_col) if t_col else len(track) / rate
+            except (ValueError, TypeError):
+                continue
+            track.append((t, x, y, z))
+
+    if track:
+        t0 = track[0][0]
+        track = [(t - t0, x, y, z) for t, x, y, z in track]
+    return track
+
+class UwbReplayDevice:
+    """
+    A pseudo-terminal that behaves like a DWM1001 tag on USB: it answers the shell prompt,
+    streams "lec" lines after the lec command and answers binary dwm_loc_get requests.
+    Point UwbUsbReader (or UWB_PORT for the read_uwb loops) at .port.
+    """
+    def __init__(self, track, speed=1.0, noise=0.0, dropout=0.0, anchors=DEFAULT_ANCHORS, loop=False, seed=None):
+        """
+        Args:
+            track (list): (t_s, x, y, z) samples, see load_track().
+            speed (float, optional): Replay speed factor, 2.0 plays twice as fast. 0 sends as fast as possible.
+            noise (float, optional): Standard deviation [m] added to positions and ranges. Defaults to 0.
+            dropout (float, optional): Probability that a line is not sent. Defaults to 0.
+            anchors (list, optional): (anchor_id, x, y, z) of the simulated anchors.
+            loop (bool, optional): Start again at the end of the track. Defaults to False.
+            seed (int, optional): Seed for noise and dropouts.
+        """
+        self.track = track
+        self.speed = speed
+        self.noise = noise
+        self.dropout = dropout
+        self.anchors = anchors
+        self.loop = loop
+        self.random = random.Random(seed)
+
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+
+        self.streaming = False
+        self.started = threading.Event()    # Set by the first lec or dwm_loc_get command
+        self.finished = threading.Event()
+        self.stop_event = threading.Event()
+        self.write_lock = threading.Lock()
+        self.current = track[0] if track else (0.0, 0.0, 0.0, 0.0)
+        self.sent_ns = []       # now_ns() of every line written, in order
+        self.lines_sent = 0
+        self.lines_dropped = 0
+        self.threads = []
+
+    def start(self):
+        self.stop_event.clear()
+        self.threads = [threading.Thread(target=self._command_loop, daemon=True),
+                        threading.Thread(target=self._stream_loop, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        print(f"Replaying {len(self.track)} samples on {self.port}")
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=1)
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def _measure(self, x, y, z):
+        gauss = self.random.gauss
+        noise = self.noise
+        anchors = []
+        for anchor_id, ax, ay, az in self.anchors:
+            distance = math.sqrt((x - ax)**2 + (y - ay)**2 + (z - az)**2)
+            anchors.append((anchor_id, ax, ay, az, max(0.0, distance + gauss(0, noise) if noise else distance)))
+        if noise:
+            x, y, z = x + gauss(0, noise), y + gauss(0, noise), z + gauss(0, noise)
+        return x, y, z, anchors
+
+    def _write(self, data):
+        with self.write_lock:
+            os.write(self.master_fd, data)
+
+    def _command_loop(self):
+        received = bytearray()
+        while not self.stop_event.is_set():
+            readable, _, _ = select.select([self.master_fd], [], [], 0.2)
+            if not readable:
+                continue
+            try:
+                received += os.read(self.master_fd, 1024)
+            except OSError:
+                break
+            while received:
+                if received.startswith(b'\x0c\x00'):
+                    # Binary dwm_loc_get
+                    _, x, y, z = self.current
+                    x, y, z, anchors = self._measure(x, y, z)
+                    self._write(encode_loc_get(x, y, z, 100, anchors))
+                    self.started.set()
+                    del received[:2]
+                elif received.startswith(b'lec\r'):
+                    self.streaming = True
+                    self.started.set()
+                    self._write(b'lec\r\n')
+                    del received[:4]
+                elif received.startswith(b'quit\r'):
+                    self.streaming = False
+                    del received[:5]
+                elif received.startswith(b'\r'):
+                    if not self.streaming:
+                        self._write(b'dwm> ')
+                    del received[:1]
+                elif len(received) < 5 and (b'lec\r'.startswith(bytes(received)) or b'quit\r'.startswith(bytes(received))
+                                            or received == b'\x0c'):
+                    break   # Wait for the rest of the command
+                else:
+                    del received[:1]
+
+    def _stream_loop(self):
+        # The track clock starts with the first command, not when the pty is created
+        while not self.started.wait(0.1):
+            if self.stop_event.is_set():
+                return
+        while not self.stop_event.is_set():
+            start = time.monotonic()
+            for t, x, y, z in self.track:
+                if self.speed > 0:
+                    delay = start + t / self.speed - time.monotonic()
+                    if delay > 0 and self.stop_event.wait(delay):
+                        return
+                elif self.stop_event.is_set():
+                    return
+                self.current = (t, x, y, z)
+                if not self.streaming:
+                    continue
+                if self.dropout and self.random.random() < self.dropout:
+                    self.lines_dropped += 1
+                    continue
+                mx, my, mz, anchors = self._measure(x, y, z)
+                line = (format_frame(mx, my, mz, 100, anchors) + '\r\n').encode('ascii')
+                self.sent_ns.append(now_ns())
+                self._write(line)
+                self.lines_sent += 1
+            if not self.loop:
+                break
+        self.finished.set()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded UWB positions on a pseudo-terminal.")
+    parser.add_argument("file", help="CSV (data_with_timestamps.csv, rover_data*.csv) or text log of lec lines")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor, 0 = as fast as possible")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier converting the file's units to meters")
+    parser.add_argument("--rate", type=float, default=10.0, help="Lines per second for files without timestamps")
+    parser.add_argument("--noise", type=float, default=0.0, help="Gaussian noise [m] on positions and ranges")
+    parser.add_argument("--dropout", type=float, default=0.0, help="Probability of dropping a line")
+    parser.add_argument("--loop", action="store_true", help="Restart at the end of the file")
+    args = parser.parse_args()
+
+    track = load_track(args.file, scale=args.scale, rate=args.rate)
+    device = UwbReplayDevice(track, speed=args.speed, noise=args.noise, dropout=args.dropout, loop=args.loop)
+    device.start()
+    print(f"Run the rover scripts with UWB_PORT={device.port}")
+
+    try:
+        while not device.finished.wait(1):
+            pass
+        print(f"Done: {device.lines_sent} lines sent, {device.lines_dropped} dropped")
+    except KeyboardInterrupt:
+        print("Process interrupted.")
+    finally:
+        device.stop()
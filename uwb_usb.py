@@ -1,24 +1,69 @@
 '''
 rev 01 - Class UWB_USB to retrieve position data
+rev 02 - Background reader thread, bulk reads into a bounded buffer, frame queue/callback and ingest stats
+rev 03 - Binary TLV (dwm_loc_get) transport selectable with mode='tlv'
+rev 04 - Frames parsed once by uwb_parser, reader delivers UwbFrame records
+rev 05 - Frames stamped with timebase.now_ns()
 '''
 
+import os
 import serial
 import time
+import queue
+import threading
+from timebase import now_ns
+from uwb_parser import (parse_frame, decode_loc_get, TLV_TYPE_RET_VAL, TLV_TYPE_POS_XYZ,
+                        TLV_TYPE_RNG_AN_DIST, TLV_TYPE_RNG_AN_POS_DIST)
+
+# Only complete lines starting with these prefixes are delivered as frames
+FRAME_PREFIXES = (b'DIST', b'POS')
+
+TLV_LOC_GET = bytes([0x0C, 0x00])
 
 class UwbUsbReader:
-    def __init__(self, port, baudrate=115200, timeout=1):
+    def __init__(self, port, baudrate=115200, timeout=1, buffer_size=4096, queue_size=256,
+                 mode='shell', tlv_interval=0.01):
         """
         Initializes the serial connection.
         Args:
             port (str): The port to connect to (e.g., 'COM3' or '/dev/ttyUSB0').
             baudrate (int, optional): The baudrate for the serial connection. Defaults to 9600.
             timeout (int, optional): The timeout for serial reads. Defaults to 1 second.
+            buffer_size (int, optional): Maximum bytes held by the background reader before
+                the oldest bytes are dropped. Defaults to 4096.
+            queue_size (int, optional): Maximum frames waiting in the frame queue before
+                the oldest frame is dropped. Defaults to 256.
+            mode (str, optional): 'shell' for the UART shell "lec" text output or 'tlv' for the
+                binary dwm_loc_get API. Defaults to 'shell'.
+            tlv_interval (float, optional): Pause between dwm_loc_get requests of the background
+                reader in 'tlv' mode. Defaults to 0.01 seconds.
         """
+        if mode not in ('shell', 'tlv'):
+            raise ValueError(f"Unknown mode '{mode}', expected 'shell' or 'tlv'")
         self.port = port
+        self.mode = mode
+        self.tlv_interval = tlv_interval
         self.baudrate = baudrate
         self.timeout = timeout
         self.serial_connection = serial.Serial(port, baudrate, timeout=timeout)
 
+        # Background reader state
+        self.buffer_size = buffer_size
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.callback = None
+        self.stop_event = threading.Event()
+        self.reader_thread = None
+        self.rx_buffer = bytearray()
+
+        # Ingest counters
+        self.bytes_received = 0
+        self.bytes_dropped = 0
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_per_second = 0.0
+        self._fps_count = 0
+        self._fps_start = time.monotonic()
+
     def activate_shell_mode(self):
         """
         Activate UART shell mode
@@ -35,6 +80,77 @@ class UwbUsbReader:
         self.serial_connection.write(b'lec\r')
         #print("Sending COMMAND: LEC")
 
+    def activate_tlv_mode(self):
+        """
+        Leave UART shell mode so the module answers binary TLV requests again.
+        Only needed when the module was left in shell mode, TLV is the power-up default.
+        """
+        self.serial_connection.write(b'quit\r')
+        time.sleep(0.2)
+        self.serial_connection.reset_input_buffer()
+
+    def request_loc_get(self):
+        """
+        Send the binary dwm_loc_get request
+        """
+        self.serial_connection.write(TLV_LOC_GET)
+
+    def read_tlv_position(self):
+        """
+        Requests and reads one binary position frame.
+        Returns:
+            UwbFrame: The decoded frame, or None on timeout or error.
+        """
+        return self._read_tlv_frame()[0]
+
+    def _read_tlv_frame(self):
+        # Returns (UwbFrame or None, bytes read), the byte count goes into the drop statistics
+        self.request_loc_get()
+        read = self.serial_connection.read
+        frame = bytearray(read(5))
+        size = len(frame)
+        self.bytes_received += size
+        if size < 5 or frame[0] != TLV_TYPE_RET_VAL:
+            self.serial_connection.reset_input_buffer()
+            return None, size
+        if frame[2] != 0:
+            return None, size
+        # Only a POS_XYZ TLV has its length in frame[4], anything else is out of step
+        if frame[3] != TLV_TYPE_POS_XYZ:
+            self.serial_connection.reset_input_buffer()
+            return None, size
+        position = read(frame[4])
+        anchors_header = read(2)
+        size += len(position) + len(anchors_header)
+        frame += position
+        if len(anchors_header) == 2 and anchors_header[0] in (TLV_TYPE_RNG_AN_DIST, TLV_TYPE_RNG_AN_POS_DIST):
+            anchors = read(anchors_header[1])
+            size += len(anchors)
+            frame += anchors_header
+            frame += anchors
+        self.bytes_received += size - 5
+        return decode_loc_get(frame, now_ns()), size
+
+    def read_position(self):
+        """
+        Reads one position fix with the transport selected at construction.
+        Returns:
+            UwbFrame: The frame in meters, or None if no fix was read.
+        """
+        if self.mode == 'tlv':
+            return self.read_tlv_position()
+
+        if self.serial_connection.inWaiting() == 0:
+            return None
+        line = self.serial_connection.readline()
+        if line.startswith(b'dwm>'):
+            self.request_lec()
+            return None
+        frame = parse_frame(line, now_ns())
+        if frame is None or not frame.has_pos:
+            return None
+        return frame
+
     def read_data(self):
         """
         Reads a line of data from the serial connection.
@@ -46,8 +162,147 @@ class UwbUsbReader:
             return data
         return None
 
+    def start_reader(self, callback=None):
+        """
+        Starts the background reader thread. The thread blocks on the port instead of
+        polling, reads everything that is waiting in one call and splits it into frames.
+        Args:
+            callback (callable, optional): Called as callback(frame) with a UwbFrame from
+                the reader thread for every complete frame. When omitted, frames are put on
+                frame_queue and can be taken with get_frame().
+        """
+        if self.reader_thread is not None and self.reader_thread.is_alive():
+            return
+        self.callback = callback
+        self.stop_event.clear()
+        self.reader_thread = threading.Thread(target=self._reader_loop, daemon=True)
+        self.reader_thread.start()
+
+    def stop_reader(self):
+        """Stops the background reader thread."""
+        self.stop_event.set()
+        if self.reader_thread is not None and self.reader_thread is not threading.current_thread():
+            self.reader_thread.join(timeout=self.timeout + 1)
+        self.reader_thread = None
+
+    def get_frame(self, timeout=None):
+        """
+        Waits for the next frame from the background reader.
+        Args:
+            timeout (float, optional): Seconds to wait. Waits forever when None.
+        Returns:
+            UwbFrame: The next frame, stamped with timebase.now_ns() at reception,
+            or None if the timeout expired.
+        """
+        try:
+            return self.frame_queue.get(timeout=timeout)[0]
+        except queue.Empty:
+            return None
+
+    def get_stats(self):
+        """
+        Returns the ingest counters of the background reader.
+        Returns:
+            dict: frames per second, received/dropped frames and bytes.
+        """
+        return {
+            'frames_per_second': self.frames_per_second,
+            'frames_received': self.frames_received,
+            'frames_dropped': self.frames_dropped,
+            'bytes_received': self.bytes_received,
+            'bytes_dropped': self.bytes_dropped,
+        }
+
+    def _reader_loop(self):
+        if self.mode == 'tlv':
+            self._tlv_reader_loop()
+            return
+        while not self.stop_event.is_set():
+            try:
+                # Blocks for up to self.timeout until at least one byte arrives,
+                # then picks up everything else already waiting
+                chunk = self.serial_connection.read(max(1, self.serial_connection.in_waiting))
+            except (serial.SerialException, OSError, TypeError) as e:
+                if not self.stop_event.is_set():
+                    print(f"Serial read error: {e}")
+                break
+            if chunk:
+                self.bytes_received += len(chunk)
+                self._ingest(chunk)
+            self._update_fps()
+
+    def _tlv_reader_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                position, size = self._read_tlv_frame()
+            except (serial.SerialException, OSError, TypeError) as e:
+                if not self.stop_event.is_set():
+                    print(f"Serial read error: {e}")
+                break
+            if position is not None:
+                self._deliver(position, size)
+            self._update_fps()
+            self.stop_event.wait(self.tlv_interval)
+
+    def _ingest(self, chunk):
+        buffer = self.rx_buffer
+        buffer += chunk
+
+        # The shell prompt is not newline terminated, answer it straight away
+        prompt_index = buffer.find(b'dwm>')
+        if prompt_index != -1:
+            del buffer[prompt_index:prompt_index + 4]
+            self.request_lec()
+
+        start = 0
+        end = buffer.find(b'\n')
+        while end != -1:
+            line = bytes(buffer[start:end])
+            if line.startswith(FRAME_PREFIXES):
+                frame = parse_frame(line, now_ns())
+                if frame is not None:
+                    self._deliver(frame, len(line))
+            start = end + 1
+            end = buffer.find(b'\n', start)
+        if start:
+            del buffer[:start]
+
+        # A partial line longer than the buffer can never complete, drop the oldest bytes
+        if len(buffer) > self.buffer_size:
+            overflow = len(buffer) - self.buffer_size
+            del buffer[:overflow]
+            self.bytes_dropped += overflow
+
+    def _deliver(self, frame, frame_bytes):
+        self.frames_received += 1
+        self._fps_count += 1
+        if self.callback is not None:
+            self.callback(frame)
+            return
+        while True:
+            try:
+                self.frame_queue.put_nowait((frame, frame_bytes))
+                return
+            except queue.Full:
+                # Consumer is behind, keep the newest frames
+                try:
+                    _, dropped_bytes = self.frame_queue.get_nowait()
+                    self.frames_dropped += 1
+                    self.bytes_dropped += dropped_bytes
+                except queue.Empty:
+                    pass
+
+    def _update_fps(self):
+        now = time.monotonic()
+        elapsed = now - self._fps_start
+        if elapsed >= 1.0:
+            self.frames_per_second = self._fps_count / elapsed
+            self._fps_count = 0
+            self._fps_start = now
+
     def close(self):
         """Closes the serial connection."""
+        self.stop_reader()
         if self.serial_connection.is_open:
             self.serial_connection.close()
             print("Serial connection closed.")
@@ -67,7 +322,7 @@ class UwbUsbReader:
 
 # Example usage
 if __name__ == "__main__":
-    serial_port = "COM7"
+    serial_port = os.environ.get("UWB_PORT", "COM7")
     baud_rate = 115200
     reader = UwbUsbReader(serial_port)
     # Wait a moment for the connection to be established
@@ -80,31 +335,17 @@ if __name__ == "__main__":
 
     pos_x, pos_y, pos_z = 0, 0, 0
 
+    reader.start_reader()
+
     try:
         while True:
-            data = reader.read_data()
-
-            if data == "dwm>":
-                reader.request_lec()
-            elif data is None:
+            frame = reader.get_frame(timeout=1)
+            if frame is None:
                 continue
 
-            #print("data:", data)
-            data_split = data.split(",")
-            if data_split[0] == "DIST":
-                print("Data:", data_split)
-                # Check if 'POS' exists in the data list
-                if 'POS' in data_split:
-                    # Find the index of 'POS'
-                    pos_index = data_split.index('POS')
-                    #print("Index:", pos_index)
-                    
-                    # Extract position data: X, Y, Z, and quality
-                    pos_x = float(data_split[pos_index + 1])
-                    pos_y = float(data_split[pos_index + 2])
-                    pos_z = float(data_split[pos_index + 3])
-                else:
-                    pass
+            print("Data:", frame)
+            if frame.has_pos:
+                pos_x, pos_y, pos_z = frame.x, frame.y, frame.z
             
             print(f"X: {pos_x} meters, Y: {pos_y} meters, Z: {pos_z} meters")
                 